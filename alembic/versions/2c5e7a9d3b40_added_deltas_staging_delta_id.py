@@ -0,0 +1,26 @@
+"""Added deltas_staging delta_id column
+
+Revision ID: 2c5e7a9d3b40
+Revises: 8d2f6a4c1e93
+Create Date: 2023-12-21 10:15:42.308114
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2c5e7a9d3b40'
+down_revision: Union[str, None] = '8d2f6a4c1e93'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('deltas_staging', sa.Column('delta_id', sa.Uuid(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('deltas_staging', 'delta_id')
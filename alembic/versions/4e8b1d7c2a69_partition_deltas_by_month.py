@@ -0,0 +1,151 @@
+"""Partition deltas by month
+
+Revision ID: 4e8b1d7c2a69
+Revises: 7a1c4e2f9b58
+Create Date: 2023-12-22 15:12:48.093417
+
+"""
+import datetime
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4e8b1d7c2a69'
+down_revision: Union[str, None] = '7a1c4e2f9b58'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+DELTA_TABLE_NAME = "deltas"
+DELTA_INDEX_NAME = "ix_deltas_rep_dt"
+# Создается миграцией `7a1c4e2f9b58` только для режима загрузки `replace`
+UNIQUE_DELTA_INDEX_NAME = "ux_deltas_rep_dt"
+DEFAULT_PARTITION_NAME = f"{DELTA_TABLE_NAME}_default"
+# Кол-во месяцев после текущего, для которых сразу создаются партиции
+PARTITION_AHEAD_MONTHS = 12
+
+
+def add_months(month: datetime.date, count: int) -> datetime.date:
+    index = month.year * 12 + month.month - 1 + count
+    return datetime.date(index // 12, index % 12 + 1, 1)
+
+
+def recreate_deltas(suffix: str, definition: str) -> str:
+    """
+    Пересоздание `deltas` по `definition` (колонки и ограничения, а также параметры
+    таблицы после скобок) с переносом записей. Прежняя таблица переименовывается
+    с `suffix` и удаляется (вместе с партициями) после переноса.
+    """
+
+    old_name = f"{DELTA_TABLE_NAME}_{suffix}"
+    op.execute(f"ALTER TABLE {DELTA_TABLE_NAME} RENAME TO {old_name}")
+    op.execute(
+        f"ALTER TABLE {old_name}"
+        f" RENAME CONSTRAINT {DELTA_TABLE_NAME}_pkey TO {old_name}_pkey"
+    )
+    op.execute(f"ALTER INDEX {DELTA_INDEX_NAME} RENAME TO ix_{old_name}_rep_dt")
+    op.execute(f"ALTER INDEX IF EXISTS {UNIQUE_DELTA_INDEX_NAME} RENAME TO ux_{old_name}_rep_dt")
+    op.execute(f"CREATE TABLE {DELTA_TABLE_NAME} {definition}")
+
+    return old_name
+
+
+def partition_deltas_by_month() -> None:
+    """
+    Пересоздание `deltas` секционированной по месяцам `rep_dt` (`PARTITION BY RANGE`).
+
+    Партиции создаются для месяцев существующих записей и `PARTITION_AHEAD_MONTHS`
+    месяцев вперед, остальные записи попадают в партицию по умолчанию.
+    Первичный ключ секционированной таблицы должен включать `rep_dt`.
+    """
+
+    bind = op.get_bind()
+    min_rep_dt, = bind.execute(sa.text(f"SELECT min(rep_dt) FROM {DELTA_TABLE_NAME}")).one()
+
+    old_name = recreate_deltas(
+        "unpartitioned",
+        f"""(
+            id uuid NOT NULL DEFAULT uuid_generate_v7(),
+            rep_dt date NOT NULL,
+            delta double precision NOT NULL,
+            CONSTRAINT {DELTA_TABLE_NAME}_pkey PRIMARY KEY (rep_dt, id)
+        ) PARTITION BY RANGE (rep_dt)""",
+    )
+    op.execute(f"CREATE TABLE {DEFAULT_PARTITION_NAME} PARTITION OF {DELTA_TABLE_NAME} DEFAULT")
+
+    month = datetime.date.today().replace(day=1)
+    if min_rep_dt is not None:
+        month = min(month, min_rep_dt.replace(day=1))
+    last_month = add_months(datetime.date.today().replace(day=1), PARTITION_AHEAD_MONTHS)
+    while month <= last_month:
+        next_month = add_months(month, 1)
+        op.execute(
+            f"CREATE TABLE {DELTA_TABLE_NAME}_y{month.year:04d}m{month.month:02d}"
+            f" PARTITION OF {DELTA_TABLE_NAME}"
+            f" FOR VALUES FROM ('{month.isoformat()}') TO ('{next_month.isoformat()}')"
+        )
+        month = next_month
+
+    move_deltas(old_name)
+
+
+def unpartition_deltas() -> None:
+    """Пересоздание `deltas` обычной таблицей (со всеми партициями)."""
+
+    old_name = recreate_deltas(
+        "partitioned",
+        f"""(
+            id uuid NOT NULL DEFAULT uuid_generate_v7(),
+            rep_dt date NOT NULL,
+            delta double precision NOT NULL,
+            CONSTRAINT {DELTA_TABLE_NAME}_pkey PRIMARY KEY (id)
+        )""",
+    )
+    move_deltas(old_name)
+
+
+def move_deltas(old_name: str) -> None:
+    # Уникальный индекс пересоздается, только если он был у прежней таблицы
+    unique = op.get_bind().execute(
+        sa.text(f"SELECT to_regclass('ux_{old_name}_rep_dt') IS NOT NULL")).scalar()
+
+    op.execute(
+        f"""
+        INSERT INTO {DELTA_TABLE_NAME} (id, rep_dt, delta)
+        SELECT id, rep_dt, delta FROM {old_name};
+        """
+    )
+    # Партиции удаляются вместе с секционированной таблицей
+    op.execute(f"DROP TABLE {old_name}")
+
+    # Индекс на секционированной таблице создается и на всех ее партициях
+    op.create_index(
+        DELTA_INDEX_NAME, DELTA_TABLE_NAME, ['rep_dt'],
+        unique=False, postgresql_include=['delta'],
+    )
+    if unique:
+        op.create_index(
+            UNIQUE_DELTA_INDEX_NAME, DELTA_TABLE_NAME, ['rep_dt'],
+            unique=True, postgresql_include=['delta'],
+        )
+
+
+def is_deltas_partitioned() -> bool:
+    return op.get_bind().execute(sa.text(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table"
+        f" WHERE partrelid = to_regclass('{DELTA_TABLE_NAME}'))"
+    )).scalar()
+
+
+def upgrade() -> None:
+    # Таблица уже секционирована прежней версией миграции `5b8e3f1a6c27`
+    # (по переменной окружения `DB_PARTITION_DELTAS`)
+    if not is_deltas_partitioned():
+        partition_deltas_by_month()
+
+
+def downgrade() -> None:
+    unpartition_deltas()
@@ -0,0 +1,83 @@
+"""Deltas rep_dt index and time ordered ids
+
+Revision ID: 5b8e3f1a6c27
+Revises: e4a9b07c3d15
+Create Date: 2023-12-18 16:05:12.470913
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b8e3f1a6c27'
+down_revision: Union[str, None] = 'e4a9b07c3d15'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+DELTA_TABLE_NAME = "deltas"
+DELTA_INDEX_NAME = "ix_deltas_rep_dt"
+
+
+def create_uuid_v7_function() -> None:
+    """
+    Создание функции `uuid_generate_v7()` (в PostgreSQL до 18 версии ее нет):
+    UUID v4 с заменой первых 48 бит временем в мс и номера версии на 7.
+    """
+
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION uuid_generate_v7() RETURNS uuid
+        AS $$
+            SELECT encode(
+                set_bit(
+                    set_bit(
+                        overlay(
+                            uuid_send(gen_random_uuid())
+                            PLACING substring(
+                                int8send(floor(extract(epoch FROM clock_timestamp()) * 1000)::bigint)
+                                FROM 3
+                            )
+                            FROM 1 FOR 6
+                        ),
+                        52, 1
+                    ),
+                    53, 1
+                ),
+                'hex'
+            )::uuid
+        $$
+        LANGUAGE sql VOLATILE;
+        """
+    )
+
+
+def upgrade() -> None:
+    create_uuid_v7_function()
+
+    # Новые id возрастают - вставки идут в конец индекса первичного ключа
+    op.alter_column(
+        DELTA_TABLE_NAME, 'id',
+        existing_type=sa.Uuid(),
+        server_default=sa.text('uuid_generate_v7()'),
+    )
+
+    op.create_index(
+        DELTA_INDEX_NAME, DELTA_TABLE_NAME, ['rep_dt'],
+        unique=False, postgresql_include=['delta'],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(DELTA_INDEX_NAME, table_name=DELTA_TABLE_NAME)
+
+    op.alter_column(
+        DELTA_TABLE_NAME, 'id',
+        existing_type=sa.Uuid(),
+        server_default=sa.text('gen_random_uuid()'),
+    )
+
+    op.execute("DROP FUNCTION IF EXISTS uuid_generate_v7()")
@@ -0,0 +1,66 @@
+"""Deltas unique rep_dt index
+
+Revision ID: 7a1c4e2f9b58
+Revises: 2c5e7a9d3b40
+Create Date: 2023-12-22 11:40:27.615309
+
+"""
+import os
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7a1c4e2f9b58'
+down_revision: Union[str, None] = '2c5e7a9d3b40'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+DELTA_TABLE_NAME = "deltas"
+DELTA_LAGS_TABLE_NAME = "delta_lags"
+UNIQUE_DELTA_INDEX_NAME = "ux_deltas_rep_dt"
+# Уникальный индекс нужен только режиму загрузки `replace` (`DB_INGEST_MODE`),
+# в режиме `append` записи с одинаковым `rep_dt` допустимы
+INGEST_MODE_REPLACE = "replace"
+
+
+def remove_duplicates() -> int:
+    """
+    Удаление дубликатов `rep_dt` с сохранением последней загруженной записи даты
+    (как `db.crud.compaction.compact_deltas`). Возвращает кол-во удаленных записей.
+    """
+
+    return op.get_bind().execute(sa.text(
+        f"""
+        DELETE FROM {DELTA_TABLE_NAME} AS d
+        USING (
+            SELECT tableoid, ctid, row_number() OVER (
+                PARTITION BY rep_dt
+                ORDER BY substring(id::text, 15, 1) = '7' DESC, id DESC, ctid DESC
+            ) AS position
+            FROM {DELTA_TABLE_NAME}
+        ) AS ranked
+        WHERE d.tableoid = ranked.tableoid AND d.ctid = ranked.ctid AND ranked.position > 1
+        """
+    )).rowcount
+
+
+def upgrade() -> None:
+    if os.getenv("DB_INGEST_MODE", "append") != INGEST_MODE_REPLACE:
+        return
+
+    if remove_duplicates():
+        # Материализованные лаги полностью пересчитываются при запуске сервиса
+        op.execute(f"DELETE FROM {DELTA_LAGS_TABLE_NAME}")
+
+    op.create_index(
+        UNIQUE_DELTA_INDEX_NAME, DELTA_TABLE_NAME, ['rep_dt'],
+        unique=True, postgresql_include=['delta'], if_not_exists=True,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(UNIQUE_DELTA_INDEX_NAME, table_name=DELTA_TABLE_NAME, if_exists=True)
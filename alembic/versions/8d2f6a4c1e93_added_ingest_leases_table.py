@@ -0,0 +1,32 @@
+"""Added ingest leases table
+
+Revision ID: 8d2f6a4c1e93
+Revises: 5b8e3f1a6c27
+Create Date: 2023-12-19 12:34:08.215630
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8d2f6a4c1e93'
+down_revision: Union[str, None] = '5b8e3f1a6c27'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('ingest_leases',
+    sa.Column('worker_id', sa.String(), nullable=False),
+    sa.Column('instance_id', sa.String(length=32), nullable=False),
+    sa.Column('acquired_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+    sa.Column('expires_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('worker_id')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('ingest_leases')
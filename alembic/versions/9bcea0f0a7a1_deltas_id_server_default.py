@@ -0,0 +1,35 @@
+"""Deltas id server default
+
+Revision ID: 9bcea0f0a7a1
+Revises: 14a1209d1fe1
+Create Date: 2023-12-04 10:21:47.318512
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9bcea0f0a7a1'
+down_revision: Union[str, None] = '14a1209d1fe1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Генерация id на стороне БД для загрузки записей через COPY
+    op.alter_column(
+        'deltas', 'id',
+        existing_type=sa.Uuid(),
+        server_default=sa.text('gen_random_uuid()'),
+    )
+
+
+def downgrade() -> None:
+    op.alter_column(
+        'deltas', 'id',
+        existing_type=sa.Uuid(),
+        server_default=None,
+    )
@@ -0,0 +1,44 @@
+"""Added ingest progress and deltas staging tables
+
+Revision ID: c71e0d4a5b92
+Revises: 3f6d2b9c81e4
+Create Date: 2023-12-13 11:40:05.912843
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c71e0d4a5b92'
+down_revision: Union[str, None] = '3f6d2b9c81e4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('ingest_progress',
+    sa.Column('sha256', sa.String(length=64), nullable=False),
+    sa.Column('file_name', sa.String(), nullable=False),
+    sa.Column('committed_rows', sa.Integer(), server_default=sa.text('0'), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+    sa.PrimaryKeyConstraint('sha256')
+    )
+    # UNLOGGED - загрузка частей без записи в WAL (таблица очищается при сбое сервера)
+    op.create_table('deltas_staging',
+    sa.Column('id', sa.BigInteger(), sa.Identity(always=False), nullable=False),
+    sa.Column('sha256', sa.String(length=64), nullable=False),
+    sa.Column('rep_dt', sa.Date(), nullable=False),
+    sa.Column('delta', sa.Float(decimal_return_scale=None), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    prefixes=['UNLOGGED'],
+    )
+    op.create_index(op.f('ix_deltas_staging_sha256'), 'deltas_staging', ['sha256'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_deltas_staging_sha256'), table_name='deltas_staging')
+    op.drop_table('deltas_staging')
+    op.drop_table('ingest_progress')
@@ -0,0 +1,64 @@
+"""Added delta lags table replacing deltalag view
+
+Revision ID: e4a9b07c3d15
+Revises: c71e0d4a5b92
+Create Date: 2023-12-15 10:21:47.318205
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e4a9b07c3d15'
+down_revision: Union[str, None] = 'c71e0d4a5b92'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+DELTA_LAG_VIEW_NAME = "deltalag"
+# Лаг представления `deltalag` - материализуется сразу
+DELTA_LAG_VIEW_LAG = 2
+
+
+def upgrade() -> None:
+    op.create_table('delta_lags',
+    sa.Column('lag', sa.Integer(), nullable=False),
+    sa.Column('rep_dt', sa.Date(), nullable=False),
+    sa.Column('delta_id', sa.Uuid(), nullable=False),
+    sa.Column('delta', sa.Float(decimal_return_scale=None), nullable=False),
+    sa.Column('delta_lag', sa.Float(decimal_return_scale=None), nullable=True),
+    sa.PrimaryKeyConstraint('lag', 'rep_dt', 'delta_id')
+    )
+    # Остальные лаги `DB_LAG_VIEW_LAGS` материализуются обработчиком файлов при запуске
+    op.execute(
+        f"""
+        INSERT INTO delta_lags (lag, rep_dt, delta_id, delta, delta_lag)
+        SELECT
+            {DELTA_LAG_VIEW_LAG},
+            rep_dt,
+            id,
+            delta,
+            LAG(delta, -{DELTA_LAG_VIEW_LAG}) OVER (ORDER BY rep_dt, id)
+        FROM deltas;
+        """
+    )
+    op.execute(f"DROP VIEW IF EXISTS {DELTA_LAG_VIEW_NAME}")
+
+
+def downgrade() -> None:
+    op.execute(
+        f"""
+        CREATE VIEW {DELTA_LAG_VIEW_NAME}
+        AS
+        SELECT
+            rep_dt,
+            delta,
+            LAG(delta, -{DELTA_LAG_VIEW_LAG}) OVER (ORDER BY rep_dt) AS DeltaLag
+        FROM
+            deltas;
+        """
+    )
+    op.drop_table('delta_lags')
@@ -0,0 +1,99 @@
+"""
+Бенчмарк загрузки записей в таблицу `deltas` (INSERT ... unnest против COPY).
+
+Требует запущенный PostgreSQL (`docker-compose up`) с примененными миграциями.
+Записи пишутся в диапазон дат начиная с 3000-01-01 и удаляются после каждого замера.
+
+Запуск:
+    python benchmarks/bench_bulk_load.py --rows 1000 10000 100000 1000000
+"""
+import argparse
+import asyncio
+import os
+import pathlib
+import sys
+import time
+
+import numpy as np
+from dotenv import load_dotenv
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1] / "src" / "delta_service"))
+
+from db.events import get_database_session  # noqa: E402
+from db.crud.delta import (  # noqa: E402
+    put_delta_batches,
+    LOAD_STRATEGY_INSERT,
+    LOAD_STRATEGY_COPY,
+    DEFAULT_LOAD_CHUNK_SIZE,
+)
+from models.db.entities import DeltaBatch  # noqa: E402
+
+
+BENCH_START_DATE = np.datetime64("3000-01-01")
+
+
+def make_batch(rows: int) -> DeltaBatch:
+    rng = np.random.default_rng(0)
+    return DeltaBatch(
+        rep_dt=BENCH_START_DATE + np.arange(rows),
+        delta=rng.normal(size=rows),
+    )
+
+
+async def cleanup(engine: AsyncEngine) -> None:
+    async with engine.begin() as conn:
+        await conn.execute(
+            text("DELETE FROM deltas WHERE rep_dt >= :start"),
+            {"start": BENCH_START_DATE.item()},
+        )
+
+
+async def measure(engine: AsyncEngine, batch: DeltaBatch, strategy: str, chunk_size: int) -> float:
+    """Возвращает скорость загрузки пачки (строк/сек.)."""
+
+    session = await get_database_session(engine)
+    started = time.perf_counter()
+    await put_delta_batches(
+        session, batches=[batch], strategy=strategy, chunk_size=chunk_size)
+    elapsed = time.perf_counter() - started
+    await cleanup(engine)
+
+    return len(batch) / elapsed
+
+
+async def run(args: argparse.Namespace) -> None:
+    engine = create_async_engine(args.dsn)
+    await cleanup(engine)
+
+    print(f"{'rows':>10} {'insert, rows/s':>16} {'copy, rows/s':>16}")
+    try:
+        for rows in args.rows:
+            batch = make_batch(rows)
+            insert_rate = await measure(engine, batch, LOAD_STRATEGY_INSERT, args.chunk_size)
+            copy_rate = await measure(engine, batch, LOAD_STRATEGY_COPY, args.chunk_size)
+            print(f"{rows:>10} {insert_rate:>16.0f} {copy_rate:>16.0f}")
+    finally:
+        await engine.dispose()
+
+
+def main() -> None:
+    load_dotenv()
+    default_dsn = (
+        f"postgresql+asyncpg://{os.getenv('DB_USER')}:{os.getenv('DB_PASSWORD')}"
+        f"@127.0.0.1:5432/{os.getenv('DB_NAME')}"
+    )
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--rows", type=int, nargs="+", default=[1_000, 10_000, 100_000, 1_000_000])
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_LOAD_CHUNK_SIZE)
+    parser.add_argument("--dsn", default=default_dsn)
+    args = parser.parse_args()
+
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
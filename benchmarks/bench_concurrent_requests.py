@@ -0,0 +1,123 @@
+"""
+Нагрузочный тест эндпоинтов: `--clients` одновременных клиентов в течение `--duration` сек.
+
+Сравнивает пропускную способность запуска через `python app.py` (сервер разработки Flask,
+новый event loop на каждый запрос) и через ASGI сервер (`uvicorn asgi:app`):
+сервер запускается отдельно, тест указывает на его URL.
+
+Требует запущенный сервис с данными в БД (`docker-compose up`, миграции, загруженные файлы).
+Клиент - простой HTTP/1.1 на asyncio (новое соединение на каждый запрос), без зависимостей.
+
+Запуск:
+    python benchmarks/bench_concurrent_requests.py --url "http://127.0.0.1:8000/delta?lag=2&limit=1000" --clients 64
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from dataclasses import dataclass, field
+from typing import List
+from urllib.parse import urlsplit
+
+
+@dataclass
+class LoadStats:
+    latencies: List[float] = field(default_factory=list)
+    errors: int = 0
+    bytes_received: int = 0
+
+
+async def fetch(host: str, port: int, target: str) -> bytes:
+    """Выполняет GET запрос и возвращает тело ответа (ошибка - при статусе не 2xx/304)."""
+
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        writer.write(
+            f"GET {target} HTTP/1.1\r\nHost: {host}:{port}\r\nConnection: close\r\n\r\n"
+            .encode("latin-1")
+        )
+        await writer.drain()
+        response = await reader.read()
+    finally:
+        writer.close()
+
+    status_line, _, _ = response.partition(b"\r\n")
+    status = int(status_line.split(b" ")[1])
+    if not (200 <= status < 300 or status == 304):
+        raise RuntimeError(f"HTTP {status}")
+
+    return response
+
+
+async def client(host: str, port: int, target: str, deadline: float, stats: LoadStats) -> None:
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            response = await fetch(host, port, target)
+        except (OSError, RuntimeError, IndexError, ValueError):
+            stats.errors += 1
+            continue
+        stats.latencies.append(time.perf_counter() - started)
+        stats.bytes_received += len(response)
+
+
+async def run(args: argparse.Namespace) -> dict:
+    url = urlsplit(args.url)
+    target = url.path + (f"?{url.query}" if url.query else "")
+    host, port = url.hostname, url.port or 80
+
+    # Прогрев (кэш ответов, пул соединений, индекс в памяти)
+    await fetch(host, port, target)
+
+    stats = LoadStats()
+    started = time.perf_counter()
+    deadline = started + args.duration
+    await asyncio.gather(*(
+        client(host, port, target, deadline, stats) for _ in range(args.clients)))
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(stats.latencies)
+    quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+
+    return {
+        "url": args.url,
+        "clients": args.clients,
+        "requests": len(latencies),
+        "errors": stats.errors,
+        "rps": len(latencies) / elapsed,
+        "mb_per_sec": stats.bytes_received / elapsed / 1024 / 1024,
+        "p50_ms": quantiles[49] * 1000 if quantiles else None,
+        "p95_ms": quantiles[94] * 1000 if quantiles else None,
+        "max_ms": latencies[-1] * 1000 if latencies else None,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--url", default="http://127.0.0.1:8000/delta?lag=2&limit=1000")
+    parser.add_argument("--clients", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--json", action="store_true", help="вывести результат в JSON")
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args))
+
+    if args.json:
+        print(json.dumps(result))
+        return
+
+    print(
+        f"{result['clients']} clients: {result['requests']} requests,"
+        f" {result['errors']} errors, {result['rps']:.1f} req/s,"
+        f" {result['mb_per_sec']:.2f} MB/s"
+    )
+    if result["requests"]:
+        print(
+            f"latency p50 {result['p50_ms']:.1f} ms, p95 {result['p95_ms']:.1f} ms,"
+            f" max {result['max_ms']:.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
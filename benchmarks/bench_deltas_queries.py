@@ -0,0 +1,232 @@
+"""
+Бенчмарк планов запросов чтения `deltas` и скорости загрузки на большой таблице.
+
+Заполняет таблицу `--rows` записями (по умолчанию 10 млн, `--rows-per-day` записей на дату),
+выполняет `EXPLAIN (ANALYZE, BUFFERS)` запросов эндпоинта `/delta` и замеряет загрузку
+еще одной пачки в уже заполненную таблицу. Сравнение до и после миграции
+`5b8e3f1a6c27` (индекс `rep_dt`, UUID v7) и `4e8b1d7c2a69` (секционирование) показывает выигрыш.
+
+Требует запущенный PostgreSQL (`docker-compose up`) с примененными миграциями.
+Записи пишутся в диапазон дат начиная с 3002-01-01 и удаляются после замера (кроме `--keep`).
+
+Запуск:
+    python benchmarks/bench_deltas_queries.py --rows 10000000 --rows-per-day 1000
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import pathlib
+import sys
+import time
+from typing import Any, Dict, Iterator, Sequence
+
+import numpy as np
+from dotenv import load_dotenv
+from sqlalchemy import text, select, Select
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1] / "src" / "delta_service"))
+
+from db.events import get_database_session  # noqa: E402
+from db.crud.delta import (  # noqa: E402
+    put_delta_batches,
+    _build_delta_lag_query,
+    LOAD_STRATEGY_COPY,
+    LOAD_STRATEGY_INSERT,
+)
+from db.crud.delta_lags import DEFAULT_LAG_VIEW_LAGS  # noqa: E402
+from db.crud.partitions import ensure_delta_partitions  # noqa: E402
+from models.db.entities import DeltaBatch, DeltaCursor  # noqa: E402
+from models.db.tables import Delta, DeltaLag  # noqa: E402
+
+
+BENCH_START_DATE = datetime.date(3002, 1, 1)
+FILL_BATCH_ROWS = 1_000_000
+
+
+def iter_batches(rows: int, rows_per_day: int, offset: int = 0) -> Iterator[DeltaBatch]:
+    """Пачки синтетических записей: `rows_per_day` записей на каждую дату подряд."""
+
+    rng = np.random.default_rng(offset)
+    start = np.datetime64(BENCH_START_DATE)
+
+    for batch_start in range(offset, offset + rows, FILL_BATCH_ROWS):
+        positions = np.arange(batch_start, min(batch_start + FILL_BATCH_ROWS, offset + rows))
+        yield DeltaBatch(
+            rep_dt=start + positions // rows_per_day,
+            delta=rng.normal(size=len(positions)),
+        )
+
+
+def get_bench_date(row: int, rows_per_day: int) -> datetime.date:
+    return BENCH_START_DATE + datetime.timedelta(days=row // rows_per_day)
+
+
+async def cleanup(engine: AsyncEngine, partitions: Sequence[str] = ()) -> None:
+    async with engine.begin() as conn:
+        for table in (Delta.__tablename__, DeltaLag.__tablename__):
+            await conn.execute(
+                text(f"DELETE FROM {table} WHERE rep_dt >= :start"),
+                {"start": BENCH_START_DATE},
+            )
+        for partition in partitions:
+            await conn.execute(text(f"DROP TABLE IF EXISTS {partition}"))
+
+
+async def fill(engine: AsyncEngine, rows: int, rows_per_day: int) -> float:
+    """Заполняет таблицу (без пересчета материализованных лагов), возвращает строк/сек."""
+
+    session = await get_database_session(engine)
+    started = time.perf_counter()
+    await put_delta_batches(
+        session,
+        batches=iter_batches(rows, rows_per_day),
+        strategy=LOAD_STRATEGY_COPY,
+        lags=(),
+    )
+    elapsed = time.perf_counter() - started
+
+    async with engine.begin() as conn:
+        await conn.execute(text(f"ANALYZE {Delta.__tablename__}"))
+
+    return rows / elapsed
+
+
+async def explain(engine: AsyncEngine, stmt: Select) -> Dict[str, Any]:
+    """Выполняет `EXPLAIN (ANALYZE, BUFFERS)` запроса и возвращает сводку плана."""
+
+    sql = str(stmt.compile(
+        dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+
+    async with engine.connect() as conn:
+        result = await conn.execute(
+            text(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}"))
+        plan = result.scalar()
+
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    plan = plan[0]
+
+    node_types = []
+    nodes = [plan["Plan"]]
+    while nodes:
+        node = nodes.pop()
+        node_types.append(node["Node Type"])
+        nodes.extend(node.get("Plans", []))
+
+    return {
+        "planning_ms": plan["Planning Time"],
+        "execution_ms": plan["Execution Time"],
+        "shared_buffers": (
+            plan["Plan"].get("Shared Hit Blocks", 0) + plan["Plan"].get("Shared Read Blocks", 0)),
+        "seq_scan": "Seq Scan" in node_types,
+        "nodes": sorted(set(node_types)),
+    }
+
+
+async def measure_load(
+    engine: AsyncEngine,
+    rows: int,
+    rows_per_day: int,
+    offset: int,
+    strategy: str,
+) -> float:
+    """Загружает пачку в уже заполненную таблицу (с пересчетом лагов), возвращает строк/сек."""
+
+    session = await get_database_session(engine)
+    started = time.perf_counter()
+    await put_delta_batches(
+        session,
+        batches=iter_batches(rows, rows_per_day, offset=offset),
+        strategy=strategy,
+        lags=DEFAULT_LAG_VIEW_LAGS,
+    )
+
+    return rows / (time.perf_counter() - started)
+
+
+async def run(args: argparse.Namespace) -> None:
+    engine = create_async_engine(args.dsn)
+    await cleanup(engine)
+
+    middle = args.rows // 2
+    middle_date = get_bench_date(middle, args.rows_per_day)
+    queries = {
+        "page (after + limit)": _build_delta_lag_query(
+            lag=2,
+            after=DeltaCursor(rep_dt=middle_date, id=None),
+            limit=1_000,
+            date_from=None,
+            date_to=None,
+        ),
+        "month range": _build_delta_lag_query(
+            lag=2,
+            after=None,
+            limit=None,
+            date_from=middle_date,
+            date_to=middle_date + datetime.timedelta(days=30),
+        ),
+        "first rows ordered": (
+            select(Delta.rep_dt, Delta.delta).order_by(Delta.rep_dt.asc()).limit(10_000)),
+    }
+
+    # Для секционированной таблицы - помесячные партиции на весь диапазон замера
+    partitions = await ensure_delta_partitions(
+        await get_database_session(engine),
+        BENCH_START_DATE,
+        get_bench_date(args.rows + 2 * args.load_rows, args.rows_per_day),
+    )
+
+    try:
+        fill_rate = await fill(engine, args.rows, args.rows_per_day)
+        print(f"fill: {args.rows} rows, {fill_rate:.0f} rows/s")
+
+        print(f"{'query':>22} {'plan, ms':>10} {'exec, ms':>10} {'buffers':>10} {'seq scan':>9}")
+        for name, stmt in queries.items():
+            summary = await explain(engine, stmt)
+            print(
+                f"{name:>22} {summary['planning_ms']:>10.2f} {summary['execution_ms']:>10.2f}"
+                f" {summary['shared_buffers']:>10} {str(summary['seq_scan']):>9}"
+            )
+            if args.verbose:
+                print(f"{'':>22} {', '.join(summary['nodes'])}")
+
+        copy_rate = await measure_load(
+            engine, args.load_rows, args.rows_per_day, args.rows, LOAD_STRATEGY_COPY)
+        insert_rate = await measure_load(
+            engine, args.load_rows, args.rows_per_day, args.rows + args.load_rows,
+            LOAD_STRATEGY_INSERT)
+        print(
+            f"load into filled table: {args.load_rows} rows,"
+            f" copy {copy_rate:.0f} rows/s, insert {insert_rate:.0f} rows/s"
+        )
+    finally:
+        if not args.keep:
+            await cleanup(engine, partitions)
+        await engine.dispose()
+
+
+def main() -> None:
+    load_dotenv()
+    default_dsn = (
+        f"postgresql+asyncpg://{os.getenv('DB_USER')}:{os.getenv('DB_PASSWORD')}"
+        f"@127.0.0.1:5432/{os.getenv('DB_NAME')}"
+    )
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--rows-per-day", type=int, default=1_000)
+    parser.add_argument("--load-rows", type=int, default=100_000)
+    parser.add_argument("--keep", action="store_true", help="не удалять записи после замера")
+    parser.add_argument("--verbose", action="store_true", help="выводить узлы планов")
+    parser.add_argument("--dsn", default=default_dsn)
+    args = parser.parse_args()
+
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
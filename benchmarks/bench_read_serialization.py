@@ -0,0 +1,119 @@
+"""
+Бенчмарк сборки JSON ответа `/delta` из полученных записей.
+
+Сравнивает прежний путь через pandas (`merge_records_to_data_frame` -> `fillna`
+-> `to_dict` -> `asdict`) с колоночным (`records_to_columns` -> `columns_to_dict`)
+и с колонками из индекса в памяти (`DeltaSeriesIndex.get_delta_columns`).
+Получение записей из БД в замер не входит; JSON всех путей сверяется.
+
+Запуск:
+    python benchmarks/bench_read_serialization.py --rows 1000 100000 1000000
+"""
+import argparse
+import pathlib
+import sys
+import time
+import warnings
+from dataclasses import asdict
+from typing import Callable, List
+
+import numpy as np
+from flask import Flask
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1] / "src" / "delta_service"))
+
+from models.api.schemas import DeltaGetDataFrameResponse  # noqa: E402
+from models.db.entities import DeltaBatch, DeltaRecordWithLag  # noqa: E402
+from util.convertors import (  # noqa: E402
+    merge_records_to_data_frame,
+    records_to_columns,
+    columns_to_dict,
+    format_http_date,
+)
+from util.series_index import DeltaSeriesIndex  # noqa: E402
+
+
+DELTA_LAG_COLUMNS = ("Rep_dt", "Delta", "DeltaLag")
+LAG = 2
+
+
+def make_index(rows: int) -> DeltaSeriesIndex:
+    rng = np.random.default_rng(0)
+    index = DeltaSeriesIndex()
+    index.replace([DeltaBatch(
+        rep_dt=np.datetime64("2000-01-01") + np.arange(rows),
+        delta=rng.normal(size=rows),
+    )])
+    return index
+
+
+def data_frame_path(app: Flask, records: List[DeltaRecordWithLag]) -> str:
+    data_df = merge_records_to_data_frame(records, record_type=DeltaRecordWithLag)
+    response = DeltaGetDataFrameResponse(records=data_df.to_dict())
+    return app.json.dumps(asdict(response))
+
+
+def columns_path(app: Flask, records: List[DeltaRecordWithLag]) -> str:
+    columns = records_to_columns(records, record_type=DeltaRecordWithLag)
+    return serialize_columns(app, columns)
+
+
+def index_path(app: Flask, index: DeltaSeriesIndex) -> str:
+    columns = dict(zip(DELTA_LAG_COLUMNS, index.get_delta_columns(lag=LAG)))
+    return serialize_columns(app, columns)
+
+
+def serialize_columns(app: Flask, columns: dict) -> str:
+    """Сериализация колонок, как в `blueprints.delta._make_records_response`."""
+
+    columns["Rep_dt"] = [format_http_date(value) for value in columns["Rep_dt"]]
+    response = DeltaGetDataFrameResponse(records=columns_to_dict(columns))
+    return app.json.dumps(dict(vars(response)))
+
+
+def measure(func: Callable, *args, repeat: int) -> float:
+    """Возвращает лучшее время выполнения из `repeat` запусков."""
+
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - started)
+
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[1_000, 100_000, 1_000_000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    # `fillna("")` по float колонке - поведение прежнего пути
+    warnings.simplefilter("ignore", FutureWarning)
+
+    app = Flask(__name__)
+    print(
+        f"{'rows':>10} {'pandas, s':>10} {'columns, s':>11} {'speedup':>8}"
+        f" {'index, s':>9} {'speedup':>8}"
+    )
+    with app.app_context():
+        for rows in args.rows:
+            index = make_index(rows)
+            records = index.get_delta_data(lag=LAG)
+
+            expected = data_frame_path(app, records)
+            if columns_path(app, records) != expected or index_path(app, index) != expected:
+                raise AssertionError(f"Responses differ for {rows} rows")
+
+            df_sec = measure(data_frame_path, app, records, repeat=args.repeat)
+            col_sec = measure(columns_path, app, records, repeat=args.repeat)
+            idx_sec = measure(index_path, app, index, repeat=args.repeat)
+            print(
+                f"{rows:>10} {df_sec:>10.4f} {col_sec:>11.4f} {df_sec / col_sec:>7.1f}x"
+                f" {idx_sec:>9.4f} {df_sec / idx_sec:>7.1f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
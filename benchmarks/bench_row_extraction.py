@@ -0,0 +1,92 @@
+"""
+Бенчмарк извлечения строк из распарсенного `.xlsx` файла.
+
+Сравнивает построчный путь (`iterrows` -> `XlsxFileRow` -> `DeltaRecord` -> dict
+параметров `INSERT`) с колоночным (`DeltaBatch` -> массивы параметров `unnest`).
+Парсинг самого файла одинаков для обоих путей и в замер не входит.
+
+Запуск:
+    python benchmarks/bench_row_extraction.py --rows 10000 100000 1000000
+"""
+import argparse
+import pathlib
+import sys
+import time
+import datetime
+from dataclasses import dataclass
+from typing import Callable, List
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1] / "src" / "delta_service"))
+
+from models.db.entities import DeltaRecord  # noqa: E402
+from util.convertors import data_frame_to_delta_batch  # noqa: E402
+
+
+@dataclass
+class XlsxFileRow:
+    """Построчная репрезентация из прежней реализации `XlsxFileHandler`."""
+
+    __slots__ = ("rep_dt", "delta")
+
+    rep_dt: datetime.date
+    delta: float
+
+
+def make_data_frame(rows: int) -> pd.DataFrame:
+    """Синтетический фрейм в том виде, в котором его отдает `parse_xlsx_as_data_frame`."""
+
+    rng = np.random.default_rng(0)
+    # Даты повторяются по кругу, чтобы не выходить за границы `datetime64[ns]`
+    rep_dt = np.datetime64("2000-01-01") + np.arange(rows) % 36_500
+    return pd.DataFrame({
+        "Rep_dt": pd.to_datetime(rep_dt),
+        "Delta": rng.normal(size=rows),
+    })
+
+
+def row_path(data: pd.DataFrame) -> List[dict]:
+    rows = [
+        XlsxFileRow(rep_dt=row["Rep_dt"], delta=row["Delta"])
+        for _, row in data.iterrows()
+    ]
+    records = [DeltaRecord(rep_dt=row.rep_dt, delta=row.delta) for row in rows]
+    return [{"rep_dt": rec.rep_dt, "delta": rec.delta} for rec in records]
+
+
+def columnar_path(data: pd.DataFrame) -> dict:
+    batch = data_frame_to_delta_batch(data)
+    return {"rep_dt": batch.rep_dt.tolist(), "delta": batch.delta.tolist()}
+
+
+def measure(func: Callable, data: pd.DataFrame, repeat: int) -> float:
+    """Возвращает лучшее время выполнения из `repeat` запусков."""
+
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(data)
+        best = min(best, time.perf_counter() - started)
+
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--rows", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'rows':>10} {'row path, s':>12} {'columnar, s':>12} {'speedup':>8}")
+    for rows in args.rows:
+        data = make_data_frame(rows)
+        row_sec = measure(row_path, data, args.repeat)
+        col_sec = measure(columnar_path, data, args.repeat)
+        print(f"{rows:>10} {row_sec:>12.4f} {col_sec:>12.4f} {row_sec / col_sec:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
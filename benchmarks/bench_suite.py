@@ -0,0 +1,473 @@
+"""
+Набор бенчмарков горячих путей загрузки и чтения с машиночитаемым результатом (JSON).
+
+Для каждого `--rows` генерирует синтетический `.xlsx` файл (`synthetic_workbooks.py`)
+в каждом из форматов `--date-formats` x `--delta-formats` и замеряет:
+- `sniff` - проверку файла до парсинга (`util.xlsx_sniffer`),
+- `parse.streaming`, `parse.pandas` - парсинг файла каждым из парсеров,
+- `convert.data_frame`, `convert.rows` - сборку колоночной пачки из фрейма pandas
+  и из строк потокового парсера (только для первого формата),
+и с БД (кроме `--no-db`, только для первого формата):
+- `put.records` (`put_delta_data`), `put.insert`, `put.copy` - загрузку записей в `deltas`,
+- `endpoint.*` - задержку эндпоинтов `/delta` и `/delta-lag-view` (`--requests` запросов
+  через тестовый клиент Flask, без кэша ответов и индекса в памяти).
+
+Для стадий без БД - лучшее время из `--repeat` запусков и строк/сек.,
+для эндпоинтов - p50/p95/среднее. С `--baseline` сравнивает результат с прошлым
+и завершается с кодом `1`, если скорость упала (или задержка p95 выросла) больше `--tolerance`.
+
+Требует запущенный PostgreSQL (`docker-compose up`) с примененными миграциями
+и переменные окружения сервиса (`.env`). Записи пишутся в диапазон дат начиная
+с 3003-01-01 и удаляются после замера. `/delta-lag-view` читает всю таблицу.
+
+Запуск:
+    python benchmarks/bench_suite.py --rows 10000 100000 --output bench.json
+    python benchmarks/bench_suite.py --rows 10000 100000 --baseline bench.json
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import pathlib
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import warnings
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+
+import numpy as np
+import openpyxl
+import pandas as pd
+from dotenv import load_dotenv
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1] / "src" / "delta_service"))
+
+from app import create_app  # noqa: E402
+from db.events import get_database_session, connect_to_database, disconnect_from_database  # noqa: E402
+from db.crud.compaction import has_unique_rep_dt  # noqa: E402
+from db.crud.delta import (  # noqa: E402
+    put_delta_data,
+    put_delta_batches,
+    LOAD_STRATEGY_INSERT,
+    LOAD_STRATEGY_COPY,
+)
+from db.crud.partitions import ensure_delta_partitions  # noqa: E402
+from models.db.entities import DeltaBatch, DeltaRecord  # noqa: E402
+from models.db.tables import Delta, DeltaLag  # noqa: E402
+from settings.settings import Settings, get_settings  # noqa: E402
+from util.convertors import data_frame_to_delta_batch  # noqa: E402
+from util.parsers import (  # noqa: E402
+    parse_xlsx_file,
+    parse_xlsx_as_data_frame,
+    iter_xlsx_chunks,
+    PARSER_MODES,
+)
+from util.xlsx_sniffer import sniff_xlsx_file  # noqa: E402
+from synthetic_workbooks import write_workbook, DATE_FORMATS, DELTA_FORMATS  # noqa: E402
+
+
+SUITE_VERSION = 1
+BENCH_START_DATE = datetime.date(3003, 1, 1)
+PAGE_LIMIT = 1_000
+
+# Метрика результата, по которой ищется регрессия: (ключ, больше - лучше)
+THROUGHPUT_METRIC = ("rows_per_sec", True)
+LATENCY_METRIC = ("p95_ms", False)
+
+Result = Dict[str, Any]
+
+
+def measure(func: Callable[[], Any], repeat: int) -> Tuple[float, Any]:
+    """Возвращает лучшее время выполнения из `repeat` запусков и результат последнего."""
+
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - started)
+
+    return best, result
+
+
+def throughput_result(name: str, variant: str, rows: int, seconds: float) -> Result:
+    return {
+        "name": name,
+        "variant": variant,
+        "rows": rows,
+        "seconds": seconds,
+        "rows_per_sec": rows / seconds if seconds else None,
+    }
+
+
+def error_result(name: str, variant: str, rows: int, error: Exception) -> Result:
+    return {"name": name, "variant": variant, "rows": rows, "error": str(error)}
+
+
+def get_workbook(
+    workdir: pathlib.Path,
+    rows: int,
+    date_format: str,
+    delta_format: str,
+    rows_per_day: int,
+) -> pathlib.Path:
+    """Синтетический файл (генерируется один раз для набора параметров)."""
+
+    path = workdir / f"deltas-{rows}-{date_format}-{delta_format}-{rows_per_day}.xlsx"
+    if not path.exists():
+        write_workbook(
+            path,
+            rows=rows,
+            date_format=date_format,
+            delta_format=delta_format,
+            rows_per_day=rows_per_day,
+        )
+
+    return path
+
+
+def run_parse_stages(
+    file: pathlib.Path,
+    variant: str,
+    rows: int,
+    args: argparse.Namespace,
+    with_convert: bool,
+) -> List[Result]:
+    results = []
+
+    seconds, _ = measure(lambda: sniff_xlsx_file(file), args.repeat)
+    results.append(throughput_result("sniff", variant, rows, seconds))
+
+    for parser_mode in PARSER_MODES:
+        name = f"parse.{parser_mode}"
+        try:
+            seconds, batches = measure(
+                lambda: parse_xlsx_file(file, parser_mode=parser_mode, chunk_size=args.chunk_size),
+                args.repeat,
+            )
+        except ValueError as e:
+            # Формат, который парсер не поддерживает, - результат, а не сбой набора
+            results.append(error_result(name, variant, rows, e))
+            continue
+
+        parsed_rows = sum(len(batch) for batch in batches)
+        if parsed_rows != rows:
+            results.append(error_result(
+                name, variant, rows, ValueError(f"Parsed {parsed_rows} rows instead of {rows}")))
+            continue
+        results.append(throughput_result(name, variant, rows, seconds))
+
+    if not with_convert:
+        return results
+
+    data = parse_xlsx_as_data_frame(file)
+    try:
+        seconds, _ = measure(lambda: data_frame_to_delta_batch(data), args.repeat)
+        results.append(throughput_result("convert.data_frame", variant, rows, seconds))
+    except ValueError as e:
+        results.append(error_result("convert.data_frame", variant, rows, e))
+
+    chunk_rows = [row for chunk in iter_xlsx_chunks(file, chunk_size=rows or 1) for row in chunk]
+    seconds, _ = measure(lambda: DeltaBatch.from_rows(chunk_rows), args.repeat)
+    results.append(throughput_result("convert.rows", variant, rows, seconds))
+
+    return results
+
+
+def make_bench_batch(rows: int, rows_per_day: int) -> DeltaBatch:
+    rng = np.random.default_rng(0)
+    return DeltaBatch(
+        rep_dt=np.datetime64(BENCH_START_DATE) + np.arange(rows) // rows_per_day,
+        delta=rng.normal(size=rows),
+    )
+
+
+async def cleanup(engine: AsyncEngine, partitions: Sequence[str] = ()) -> None:
+    async with engine.begin() as conn:
+        for table in (Delta.__tablename__, DeltaLag.__tablename__):
+            await conn.execute(
+                text(f"DELETE FROM {table} WHERE rep_dt >= :start"),
+                {"start": BENCH_START_DATE},
+            )
+        for partition in partitions:
+            await conn.execute(text(f"DROP TABLE IF EXISTS {partition}"))
+
+
+async def run_put_stages(
+    engine: AsyncEngine,
+    batch: DeltaBatch,
+    variant: str,
+    args: argparse.Namespace,
+) -> List[Result]:
+    """Замеряет загрузку записей; записи последнего замера остаются для эндпоинтов."""
+
+    rows = len(batch)
+    records = [
+        DeltaRecord(rep_dt=rep_dt, delta=delta)
+        for rep_dt, delta in zip(batch.rep_dt.tolist(), batch.delta.tolist())
+    ]
+    loaders = {
+        "put.records": lambda session: put_delta_data(session, records),
+        "put.insert": lambda session: put_delta_batches(
+            session, batches=[batch], strategy=LOAD_STRATEGY_INSERT),
+        "put.copy": lambda session: put_delta_batches(
+            session, batches=[batch], strategy=LOAD_STRATEGY_COPY),
+    }
+
+    results = []
+    for name, load in loaders.items():
+        best = float("inf")
+        for _ in range(args.repeat):
+            await cleanup(engine)
+            session = await get_database_session(engine)
+            started = time.perf_counter()
+            await load(session)
+            best = min(best, time.perf_counter() - started)
+        results.append(throughput_result(name, variant, rows, best))
+
+    return results
+
+
+def run_endpoint_stages(
+    settings: Settings,
+    rows: int,
+    rows_per_day: int,
+    variant: str,
+    args: argparse.Namespace,
+) -> List[Result]:
+    """Замеряет задержку эндпоинтов на загруженных записях (тестовый клиент Flask)."""
+
+    date_to = BENCH_START_DATE + datetime.timedelta(days=(rows - 1) // rows_per_day)
+    lag = settings.DB.LAG_VIEW_LAGS[0]
+    targets = {
+        "endpoint.delta_range": f"/delta?lag={lag}&from={BENCH_START_DATE}&to={date_to}",
+        "endpoint.delta_page": (
+            f"/delta?lag={lag}&after={BENCH_START_DATE - datetime.timedelta(days=1)}"
+            f"&limit={PAGE_LIMIT}"
+        ),
+        "endpoint.delta_lag_view": f"/delta-lag-view?lag={lag}",
+    }
+
+    connect_to_database(settings)
+    try:
+        client = create_app(settings).test_client()
+        results = []
+        for name, target in targets.items():
+            # Прогрев (пул соединений)
+            client.get(target)
+
+            latencies, size = [], 0
+            for _ in range(args.requests):
+                started = time.perf_counter()
+                response = client.get(target)
+                latencies.append(time.perf_counter() - started)
+                if response.status_code != 200:
+                    raise RuntimeError(f"{target}: HTTP {response.status_code}")
+                size = len(response.data)
+
+            quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+            results.append({
+                "name": name,
+                "variant": variant,
+                "rows": rows,
+                "target": target,
+                "requests": len(latencies),
+                "response_bytes": size,
+                "mean_ms": statistics.fmean(latencies) * 1000,
+                "p50_ms": quantiles[49] * 1000,
+                "p95_ms": quantiles[94] * 1000,
+            })
+    finally:
+        disconnect_from_database(settings)
+
+    return results
+
+
+async def run_database_stages(
+    settings: Settings,
+    rows: int,
+    variant: str,
+    args: argparse.Namespace,
+) -> List[Result]:
+    engine = create_async_engine(settings.DB.CONN_STR)
+    batch = make_bench_batch(rows, args.rows_per_day)
+    partitions = []
+
+    try:
+        if args.rows_per_day > 1 and await has_unique_rep_dt(await get_database_session(engine)):
+            raise RuntimeError(
+                "Table deltas has unique rep_dt index, run with \"--rows-per-day 1\"")
+
+        await cleanup(engine)
+        partitions = await ensure_delta_partitions(
+            await get_database_session(engine),
+            BENCH_START_DATE,
+            batch.rep_dt[-1].item(),
+        )
+
+        results = await run_put_stages(engine, batch, variant, args)
+        # Эндпоинты - в своем event loop-е (`DatabaseLoop`) на записях последней загрузки
+        results += await asyncio.to_thread(
+            run_endpoint_stages, settings, rows, args.rows_per_day, variant, args)
+    finally:
+        await cleanup(engine, partitions)
+        await engine.dispose()
+
+    return results
+
+
+def get_environment() -> Dict[str, Any]:
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "openpyxl": openpyxl.__version__,
+    }
+
+
+def find_regressions(
+    results: Sequence[Result],
+    baseline: Sequence[Result],
+    tolerance: float,
+) -> List[str]:
+    """Сравнивает результаты с прошлыми (по имени, формату и кол-ву строк)."""
+
+    previous = {(result["name"], result["variant"], result["rows"]): result for result in baseline}
+    regressions = []
+
+    for result in results:
+        old = previous.get((result["name"], result["variant"], result["rows"]))
+        if old is None or "error" in result or "error" in old:
+            continue
+
+        metric, higher_is_better = (
+            THROUGHPUT_METRIC if "rows_per_sec" in result else LATENCY_METRIC)
+        new_value, old_value = result.get(metric), old.get(metric)
+        if not new_value or not old_value:
+            continue
+
+        change = new_value / old_value - 1
+        if (-change if higher_is_better else change) > tolerance:
+            regressions.append(
+                f"{result['name']} [{result['variant']}, {result['rows']} rows]:"
+                f" {metric} {old_value:.2f} -> {new_value:.2f} ({change:+.0%})"
+            )
+
+    return regressions
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    variants = [
+        (date_format, delta_format)
+        for date_format in args.date_formats
+        for delta_format in args.delta_formats
+    ]
+    settings = None
+    if not args.no_db:
+        settings = get_settings()
+        settings.DB.CONN_STR = args.dsn or settings.DB.CONN_STR
+        settings.APP.RESPONSE_CACHE_ENABLED = False
+        settings.APP.DELTA_INDEX_ENABLED = False
+        settings.APP.METRICS_ENABLED = False
+
+    workdir = args.workdir or pathlib.Path(tempfile.gettempdir()) / "delta-service-bench"
+    results = []
+
+    for rows in args.rows:
+        for num, (date_format, delta_format) in enumerate(variants):
+            variant = f"{date_format}/{delta_format}"
+            file = get_workbook(workdir, rows, date_format, delta_format, args.rows_per_day)
+            print(f"{rows} rows, {variant}: {file}", file=sys.stderr)
+
+            results += run_parse_stages(file, variant, rows, args, with_convert=num == 0)
+            if settings is not None and num == 0:
+                results += asyncio.run(run_database_stages(settings, rows, variant, args))
+
+    return {
+        "suite_version": SUITE_VERSION,
+        "started_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "environment": get_environment(),
+        "params": {
+            "rows": args.rows,
+            "date_formats": args.date_formats,
+            "delta_formats": args.delta_formats,
+            "rows_per_day": args.rows_per_day,
+            "chunk_size": args.chunk_size,
+            "repeat": args.repeat,
+            "requests": args.requests,
+            "database": settings is not None,
+        },
+        "results": results,
+    }
+
+
+def print_summary(report: Dict[str, Any]) -> None:
+    for result in report["results"]:
+        label = f"{result['name']:>24} {result['variant']:>16} {result['rows']:>10}"
+        if "error" in result:
+            print(f"{label}  error: {result['error']}", file=sys.stderr)
+        elif "rows_per_sec" in result:
+            print(
+                f"{label}  {result['seconds']:>9.4f} s {result['rows_per_sec']:>12.0f} rows/s",
+                file=sys.stderr,
+            )
+        else:
+            print(
+                f"{label}  p50 {result['p50_ms']:>8.1f} ms  p95 {result['p95_ms']:>8.1f} ms",
+                file=sys.stderr,
+            )
+
+
+def main() -> None:
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument(
+        "--date-formats", nargs="+", choices=tuple(DATE_FORMATS), default=["date", "dotted"])
+    parser.add_argument(
+        "--delta-formats", nargs="+", choices=tuple(DELTA_FORMATS), default=["number", "comma"])
+    parser.add_argument("--rows-per-day", type=int, default=1)
+    parser.add_argument("--chunk-size", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--requests", type=int, default=20, help="requests per endpoint")
+    parser.add_argument("--no-db", action="store_true", help="skip database stages")
+    parser.add_argument("--dsn", default=None, help="database URL (default from .env)")
+    parser.add_argument("--workdir", type=pathlib.Path, default=None, help="generated workbooks dir")
+    parser.add_argument("--output", type=pathlib.Path, default=None, help="JSON report file (default stdout)")
+    parser.add_argument("--baseline", type=pathlib.Path, default=None, help="previous JSON report")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression")
+    args = parser.parse_args()
+
+    if min(args.rows) <= 0 or args.repeat <= 0 or args.requests <= 0 or args.rows_per_day <= 0:
+        parser.error("rows, repeat, requests and rows per day must be positive")
+
+    # Предупреждения pandas о форматах дат не относятся к замеру
+    warnings.simplefilter("ignore", UserWarning)
+
+    report = run(args)
+    print_summary(report)
+
+    output = json.dumps(report, indent=2)
+    if args.output is not None:
+        args.output.write_text(output + "\n")
+    else:
+        print(output)
+
+    if args.baseline is not None:
+        baseline = json.loads(args.baseline.read_text())
+        regressions = find_regressions(report["results"], baseline["results"], args.tolerance)
+        for regression in regressions:
+            print(f"regression: {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
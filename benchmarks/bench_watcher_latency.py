@@ -0,0 +1,137 @@
+"""
+Бенчмарк задержки "файл положен в директорию -> записи закоммичены в БД"
+для способов обнаружения файлов `inotify` и `poll`.
+
+Требует запущенный PostgreSQL (`docker-compose up`) с примененными миграциями.
+Каждый файл содержит одну запись с уникальной датой начиная с 3001-01-01,
+записи удаляются после замера.
+
+Запуск:
+    python benchmarks/bench_watcher_latency.py --drops 10 --interval 5
+"""
+import argparse
+import asyncio
+import datetime
+import os
+import pathlib
+import statistics
+import sys
+import tempfile
+import time
+from typing import List
+
+import openpyxl
+from dotenv import load_dotenv
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1] / "src" / "delta_service"))
+
+from db.events import create_database_engine  # noqa: E402
+from settings.settings import DatabaseSettings  # noqa: E402
+from xlsx_file_handler import (  # noqa: E402
+    XlsxFileHandler,
+    WATCH_MODE_INOTIFY,
+    WATCH_MODE_POLL,
+)
+
+
+BENCH_START_DATE = datetime.date(3001, 1, 1)
+COMMIT_CHECK_INTERVAL_SEC = 0.005
+
+
+def write_workbook(path: pathlib.Path, rep_dt: datetime.date) -> None:
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.append(["Rep_dt", "Delta"])
+    sheet.append([rep_dt, 1.0])
+    workbook.save(path)
+
+
+async def wait_committed(engine: AsyncEngine, rep_dt: datetime.date, timeout: float) -> None:
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        async with engine.connect() as conn:
+            found = await conn.scalar(
+                text("SELECT count(*) FROM deltas WHERE rep_dt = :rep_dt"),
+                {"rep_dt": rep_dt},
+            )
+        if found:
+            return
+        await asyncio.sleep(COMMIT_CHECK_INTERVAL_SEC)
+
+    raise TimeoutError(f"Record {rep_dt} was not committed in {timeout} sec")
+
+
+async def cleanup(engine: AsyncEngine) -> None:
+    async with engine.begin() as conn:
+        await conn.execute(
+            text("DELETE FROM deltas WHERE rep_dt >= :start"), {"start": BENCH_START_DATE})
+
+
+async def measure_mode(args: argparse.Namespace, mode: str, engine: AsyncEngine) -> List[float]:
+    """Возвращает задержки (сек.) для `args.drops` файлов."""
+
+    latencies = []
+    staging_dir = pathlib.Path(tempfile.mkdtemp())
+    input_dir = pathlib.Path(tempfile.mkdtemp())
+
+    handler = XlsxFileHandler(
+        db_engine=create_database_engine(DatabaseSettings(CONN_STR=args.dsn)),
+        failed_xlsx_dir=staging_dir / "failed",
+        scan_dir_interval_sec=args.interval,
+        watch_mode=mode,
+    )
+    handler.start_scan(input_dir)
+    try:
+        for i in range(args.drops):
+            rep_dt = BENCH_START_DATE + datetime.timedelta(days=i)
+            prepared = staging_dir / f"drop_{i}.xlsx"
+            write_workbook(prepared, rep_dt)
+
+            started = time.perf_counter()
+            # Атомарное появление готового файла в директории
+            os.replace(prepared, input_dir / prepared.name)
+            await wait_committed(engine, rep_dt, timeout=args.interval * 2 + 30)
+            latencies.append(time.perf_counter() - started)
+    finally:
+        handler.stop_scan()
+        await cleanup(engine)
+
+    return latencies
+
+
+async def run(args: argparse.Namespace) -> None:
+    engine = create_async_engine(args.dsn)
+    await cleanup(engine)
+
+    print(f"{'mode':>8} {'mean, s':>9} {'p50, s':>9} {'max, s':>9}")
+    try:
+        for mode in (WATCH_MODE_INOTIFY, WATCH_MODE_POLL):
+            latencies = await measure_mode(args, mode, engine)
+            print(
+                f"{mode:>8} {statistics.mean(latencies):>9.3f}"
+                f" {statistics.median(latencies):>9.3f} {max(latencies):>9.3f}"
+            )
+    finally:
+        await engine.dispose()
+
+
+def main() -> None:
+    load_dotenv()
+    default_dsn = (
+        f"postgresql+asyncpg://{os.getenv('DB_USER')}:{os.getenv('DB_PASSWORD')}"
+        f"@127.0.0.1:5432/{os.getenv('DB_NAME')}"
+    )
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--drops", type=int, default=10)
+    parser.add_argument("--interval", type=int, default=5, help="poll interval, sec.")
+    parser.add_argument("--dsn", default=default_dsn)
+    args = parser.parse_args()
+
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Генератор синтетических `.xlsx` файлов для бенчмарков (в формате файлов сервиса).
+
+Лист с заголовком `Rep_dt`, `Delta` и `--rows` записями: даты подряд начиная
+с `--start-date` (`--rows-per-day` записей на дату), дельты - нормальное распределение
+с фиксированным `--seed`, поэтому файлы с одинаковыми параметрами совпадают по содержимому.
+
+Форматы `Rep_dt` (`--date-format`):
+`date` - ячейки даты, `datetime` - ячейки даты со временем, `serial` - число (дата Excel
+без формата ячейки), `iso` - текст `2000-01-31`, `dotted` - текст `31.01.2000`.
+Форматы `Delta` (`--delta-format`): `number` - число, `comma` - текст с десятичной запятой.
+
+Запуск:
+    python benchmarks/synthetic_workbooks.py deltas.xlsx --rows 100000 --date-format dotted --delta-format comma
+"""
+import argparse
+import datetime
+import pathlib
+from typing import Any, Callable, Dict
+
+import numpy as np
+import openpyxl
+from openpyxl.utils.datetime import to_excel
+
+
+DATE_FORMATS: Dict[str, Callable[[datetime.date], Any]] = {
+    "date": lambda value: value,
+    "datetime": lambda value: datetime.datetime.combine(value, datetime.time()),
+    "serial": lambda value: int(to_excel(value)),
+    "iso": lambda value: value.isoformat(),
+    "dotted": lambda value: value.strftime("%d.%m.%Y"),
+}
+DELTA_FORMATS: Dict[str, Callable[[float], Any]] = {
+    "number": lambda value: value,
+    "comma": lambda value: repr(value).replace(".", ","),
+}
+
+DEFAULT_START_DATE = datetime.date(2000, 1, 1)
+
+
+def write_workbook(
+    path: pathlib.Path,
+    rows: int,
+    date_format: str = "date",
+    delta_format: str = "number",
+    rows_per_day: int = 1,
+    start_date: datetime.date = DEFAULT_START_DATE,
+    seed: int = 0,
+) -> pathlib.Path:
+    """Записывает синтетический `.xlsx` файл (потоково, в write-only режиме openpyxl)."""
+
+    if date_format not in DATE_FORMATS:
+        raise ValueError(f"Unknown date format \"{date_format}\", expected one of {tuple(DATE_FORMATS)}")
+    if delta_format not in DELTA_FORMATS:
+        raise ValueError(f"Unknown delta format \"{delta_format}\", expected one of {tuple(DELTA_FORMATS)}")
+    if rows_per_day <= 0:
+        raise ValueError("Rows per day must be positive")
+
+    format_date = DATE_FORMATS[date_format]
+    format_delta = DELTA_FORMATS[delta_format]
+    delta = np.random.default_rng(seed).normal(size=rows).round(6).tolist()
+
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(["Rep_dt", "Delta"])
+    for row in range(rows):
+        rep_dt = start_date + datetime.timedelta(days=row // rows_per_day)
+        sheet.append([format_date(rep_dt), format_delta(delta[row])])
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    workbook.save(path)
+
+    return path
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("path", type=pathlib.Path)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--date-format", choices=tuple(DATE_FORMATS), default="date")
+    parser.add_argument("--delta-format", choices=tuple(DELTA_FORMATS), default="number")
+    parser.add_argument("--rows-per-day", type=int, default=1)
+    parser.add_argument(
+        "--start-date", type=datetime.date.fromisoformat, default=DEFAULT_START_DATE)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    write_workbook(
+        args.path,
+        rows=args.rows,
+        date_format=args.date_format,
+        delta_format=args.delta_format,
+        rows_per_day=args.rows_per_day,
+        start_date=args.start_date,
+        seed=args.seed,
+    )
+    print(f"{args.path}: {args.rows} rows, {args.path.stat().st_size / 1024 / 1024:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,47 +1,191 @@
+from typing import List, Union, Type
+from dataclasses import dataclass
+
 from flask import Flask
 
-from blueprints import delta
+from blueprints import delta, metrics
 from xlsx_file_handler import XlsxFileHandler
-from db.events import connect_to_database
+from db.events import (
+    connect_to_database,
+    disconnect_from_database,
+    create_database_engine,
+)
+from db.notify import NotificationListener, DELTAS_CHANGED_CHANNEL, INSTANCE_ID
+from db.crud.delta import INGEST_MODE_REPLACE
+from db.delta_index import DeltaIndexLoader
 from settings.settings import Settings, get_settings
+from util.cache import ResponseCache
+from util.series_index import DeltaSeriesIndex
+from models.db.entities import DeltaBatch
+
 
+def create_app(settings: Settings, app_class: Type[Flask] = Flask) -> Flask:
+    """
+    Фабрика приложения Flask
 
-def create_app(settings: Settings) -> Flask:
-    """Фабрика приложения Flask"""
+    `app_class` - класс приложения (`asgi.AsgiFlask` для запуска ASGI сервером).
+    """
 
-    app = Flask(settings.APP.SERVICE_NAME)
+    app = app_class(settings.APP.SERVICE_NAME)
 
     # Update flask app config with settings
     # mainly for usage in blueprints
     app.config["APP_SETTINGS"] = settings
+
+    # Кэш ответов эндпоинтов, инвалидируется загрузкой новых данных
+    if settings.APP.RESPONSE_CACHE_ENABLED and settings.APP.RESPONSE_CACHE is None:
+        settings.APP.RESPONSE_CACHE = ResponseCache(
+            max_entries=settings.APP.RESPONSE_CACHE_MAX_ENTRIES,
+            max_bytes=settings.APP.RESPONSE_CACHE_MAX_MB * 1024 * 1024,
+        )
+
+    # Индекс ряда `deltas` в памяти, загружается `DeltaIndexLoader`
+    if settings.APP.DELTA_INDEX_ENABLED and settings.APP.DELTA_INDEX is None:
+        settings.APP.DELTA_INDEX = DeltaSeriesIndex()
     
     # Register flask routes
     app.register_blueprint(delta.delta_bp)
 
+    # Метрики сервиса (`/metrics`) и длительность обработки запросов
+    if settings.APP.METRICS_ENABLED:
+        metrics.instrument_app(app)
+        app.register_blueprint(metrics.metrics_bp)
+
     return app
 
 
 def create_xlsx_file_handler(
     settings: Settings,
+    index_loader: Union[DeltaIndexLoader, None] = None,
 ) -> XlsxFileHandler:
-    """Создает объект, ответственный за работу с `.xlsx` файлами."""
+    """
+    Создает объект, ответственный за работу с `.xlsx` файлами.
+
+    Обработчик работает в своем потоке со своим event loop-ом,
+    поэтому получает отдельный движок (и пул соединений) БД.
+    Загруженные данные добавляются в индекс `index_loader` (если он задан),
+    после чего инвалидируется кэш ответов (если он создан).
+    """
+
+    cache = settings.APP.RESPONSE_CACHE
+
+    def on_ingest(batches: Union[List[DeltaBatch], None]) -> None:
+        if index_loader is not None:
+            index_loader.apply(batches)
+        if cache is not None:
+            cache.bump_version()
 
     fh = XlsxFileHandler(
         scan_dir_interval_sec=settings.APP.XLSX_DIR_CHECK_INTERVAL_SEC,
-        db_engine=settings.DB.ENGINE,
+        watch_mode=settings.APP.XLSX_WATCH_MODE,
+        db_engine=create_database_engine(settings.DB),
+        parser_mode=settings.APP.XLSX_PARSER_MODE,
+        chunk_size=settings.APP.XLSX_CHUNK_SIZE,
+        sniff_files=settings.APP.XLSX_SNIFF_ENABLED,
+        parse_workers=settings.APP.XLSX_PARSE_WORKERS,
+        queue_size=settings.APP.XLSX_QUEUE_SIZE,
+        validate_concurrency=settings.APP.XLSX_VALIDATE_CONCURRENCY,
+        upload_concurrency=settings.APP.XLSX_UPLOAD_CONCURRENCY,
+        retry_base_delay_sec=settings.APP.XLSX_RETRY_BASE_DELAY_SEC,
+        retry_max_delay_sec=settings.APP.XLSX_RETRY_MAX_DELAY_SEC,
+        retry_memory_limit_mb=settings.APP.XLSX_RETRY_MEMORY_LIMIT_MB,
+        spill_dir=settings.APP.XLSX_SPILL_DIR,
+        staging_dir=settings.APP.XLSX_STAGING_DIR,
+        staging_max_file_mb=settings.APP.XLSX_STAGING_MAX_FILE_MB,
+        staging_max_mb=settings.APP.XLSX_STAGING_MAX_MB,
+        circuit_failure_threshold=settings.DB.CIRCUIT_FAILURE_THRESHOLD,
+        circuit_reset_sec=settings.DB.CIRCUIT_RESET_SEC,
+        load_strategy=settings.DB.LOAD_STRATEGY,
+        load_chunk_size=settings.DB.LOAD_CHUNK_SIZE,
+        copy_threshold=settings.DB.COPY_THRESHOLD,
+        commit_mode=settings.DB.LOAD_COMMIT_MODE,
+        ingest_mode=settings.DB.INGEST_MODE,
+        lag_view_lags=settings.DB.LAG_VIEW_LAGS,
+        partition_ahead_months=settings.DB.PARTITION_AHEAD_MONTHS,
+        claim_files=settings.APP.XLSX_CLAIM_ENABLED,
+        worker_id=settings.APP.XLSX_WORKER_ID,
+        claim_lease_sec=settings.APP.XLSX_CLAIM_LEASE_SEC,
+        notify_changes=settings.APP.RESPONSE_CACHE_NOTIFY,
+        on_ingest=on_ingest,
     )
 
     return fh
 
 
-if __name__ == "__main__":
-    settings = get_settings()
-    connect_to_database(settings)
+@dataclass
+class AppServices:
+    """Фоновые службы приложения, работающие вместе с HTTP сервером."""
+
+    file_handler: XlsxFileHandler
+    index_loader: Union[DeltaIndexLoader, None] = None
+    listener: Union[NotificationListener, None] = None
+
+
+def start_services(settings: Settings) -> AppServices:
+    """
+    Запускает фоновые службы: загрузку индекса в памяти, обработчик `.xlsx` файлов
+    и прослушивание уведомлений других экземпляров сервиса.
 
-    file_handler = create_xlsx_file_handler(settings)
+    Вызывается после `create_app` (которое создает кэш ответов и индекс).
+    """
+
+    # Загрузка индекса в памяти (ответы, собранные до загрузки, вытесняются из кэша)
+    index_loader = None
+    if settings.APP.DELTA_INDEX is not None:
+        index_loader = DeltaIndexLoader(
+            settings.DB,
+            settings.APP.DELTA_INDEX,
+            reconcile_sec=settings.APP.DELTA_INDEX_RECONCILE_SEC,
+            replace_dates=settings.DB.INGEST_MODE == INGEST_MODE_REPLACE,
+            on_reload=(
+                settings.APP.RESPONSE_CACHE.bump_version
+                if settings.APP.RESPONSE_CACHE is not None else None
+            ),
+        )
+        index_loader.start()
+
+    file_handler = create_xlsx_file_handler(settings, index_loader)
     # Сканирование директории и ожидание новых .xlsx файлов
     # в отдельном потоке со своим asyncio event loop
     file_handler.start_scan(directory=settings.APP.XLSX_INPUT_DIR)
 
+    # Инвалидация кэша ответов и индекса при загрузке данных другими экземплярами сервиса
+    # (собственные загрузки уже применены обработчиком файлов)
+    listener = None
+    if settings.APP.RESPONSE_CACHE_NOTIFY and (
+        settings.APP.RESPONSE_CACHE is not None or index_loader is not None
+    ):
+        listener = NotificationListener(
+            settings.DB,
+            DELTAS_CHANGED_CHANNEL,
+            lambda: file_handler.on_ingest(None),
+            ignore_payload=INSTANCE_ID,
+        )
+        listener.start()
+
+    return AppServices(
+        file_handler=file_handler, index_loader=index_loader, listener=listener)
+
+
+def stop_services(services: AppServices) -> None:
+    """Останавливает фоновые службы в порядке, обратном запуску."""
+
+    if services.listener is not None:
+        services.listener.stop()
+    services.file_handler.stop_scan()
+    if services.index_loader is not None:
+        services.index_loader.stop()
+
+
+if __name__ == "__main__":
+    settings = get_settings()
+    connect_to_database(settings)
+
     app = create_app(settings)
-    app.run(debug=settings.APP.DEBUG)
+    services = start_services(settings)
+
+    try:
+        app.run(debug=settings.APP.DEBUG)
+    finally:
+        stop_services(services)
+        disconnect_from_database(settings)
@@ -0,0 +1,244 @@
+"""
+Точка входа для запуска сервиса ASGI сервером:
+
+    uvicorn asgi:app --host 0.0.0.0 --port 8000
+
+Асинхронные эндпоинты Flask выполняются в event loop-е сервера, в нем же работает
+долгоживущий пул соединений БД. Запрос обрабатывается в пуле потоков `ASGI_WORKER_THREADS`
+(поток ждет и завершения эндпоинта в event loop-е), поэтому размер пула ограничивает
+кол-во одновременно обрабатываемых запросов, остальные ждут свободного потока.
+"""
+import asyncio
+import io
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Coroutine, Dict, List, Tuple, TypeVar, Union
+
+from flask import Flask
+from loguru import logger
+
+from app import create_app, start_services, stop_services, AppServices
+from db.events import connect_to_database_in_loop, disconnect_from_database_in_loop
+from settings.settings import Settings, get_settings
+
+
+T = TypeVar("T")
+
+Scope = Dict[str, Any]
+Message = Dict[str, Any]
+Receive = Callable[[], Awaitable[Message]]
+Send = Callable[[Message], Awaitable[None]]
+
+
+class AsgiFlask(Flask):
+    """
+    Приложение Flask, выполняющее асинхронные эндпоинты в event loop-е ASGI сервера.
+
+    По умолчанию Flask запускает каждый асинхронный эндпоинт в новом event loop-е
+    (`asgiref.AsyncToSync`), что не позволяет переиспользовать соединения пула.
+    Вызывающий поток блокируется до завершения эндпоинта.
+    """
+
+    event_loop: Union[asyncio.AbstractEventLoop, None] = None
+
+    def async_to_sync(
+        self,
+        func: Callable[..., Coroutine[Any, Any, T]],
+    ) -> Callable[..., T]:
+        loop = self.event_loop
+        if loop is None:
+            return super().async_to_sync(func)
+
+        def wrapper(*args: Any, **kwargs: Any) -> T:
+            # Контекст запроса (contextvars) переходит в задачу event loop-а
+            return asyncio.run_coroutine_threadsafe(func(*args, **kwargs), loop).result()
+
+        return wrapper
+
+
+@dataclass
+class AsgiAdapter:
+    """
+    ASGI приложение: обслуживает HTTP запросы приложением Flask (WSGI)
+    и управляет жизненным циклом подключения к БД и фоновых служб (`lifespan`).
+
+    `asgiref.WsgiToAsgi` не подходит: он выполняет все запросы в одном потоке.
+    """
+
+    settings_factory: Callable[[], Settings] = get_settings
+
+    def __post_init__(self) -> None:
+        self.settings: Union[Settings, None] = None
+        self.app: Union[AsgiFlask, None] = None
+        self.services: Union[AppServices, None] = None
+        self._executor: Union[ThreadPoolExecutor, None] = None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+        elif scope["type"] == "http":
+            await self._http(scope, receive, send)
+        else:
+            raise ValueError(f"Unsupported ASGI scope type \"{scope['type']}\"")
+
+    async def startup(self) -> None:
+        """Подключается к БД в event loop-е сервера, создает приложение и запускает службы."""
+
+        loop = asyncio.get_running_loop()
+        self.settings = self.settings_factory()
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.settings.APP.ASGI_WORKER_THREADS,
+            thread_name_prefix="asgi-worker",
+        )
+
+        connect_to_database_in_loop(self.settings)
+        app = create_app(self.settings, app_class=AsgiFlask)
+        app.event_loop = loop
+        self.app = app
+
+        self.services = await loop.run_in_executor(
+            self._executor, start_services, self.settings)
+
+    async def shutdown(self) -> None:
+        """Останавливает службы и закрывает соединения пула."""
+
+        loop = asyncio.get_running_loop()
+
+        if self.services is not None:
+            await loop.run_in_executor(self._executor, stop_services, self.services)
+            self.services = None
+
+        if self.settings is not None:
+            await disconnect_from_database_in_loop(self.settings)
+
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        self.app = None
+
+    async def _lifespan(self, receive: Receive, send: Send) -> None:
+        while True:
+            message = await receive()
+
+            if message["type"] == "lifespan.startup":
+                try:
+                    await self.startup()
+                except Exception as e:
+                    logger.exception("ASGI startup failed")
+                    await send({"type": "lifespan.startup.failed", "message": str(e)})
+                    return
+                await send({"type": "lifespan.startup.complete"})
+
+            elif message["type"] == "lifespan.shutdown":
+                try:
+                    await self.shutdown()
+                except Exception as e:
+                    logger.exception("ASGI shutdown failed")
+                    await send({"type": "lifespan.shutdown.failed", "message": str(e)})
+                    return
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _http(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if self.app is None:
+            raise RuntimeError("ASGI server must support lifespan protocol")
+
+        body = await _read_body(receive)
+        environ = _build_environ(scope, body)
+
+        loop = asyncio.get_running_loop()
+        started: List[Tuple[str, List[Tuple[str, str]]]] = []
+
+        def start_response(status: str, headers: List[Tuple[str, str]], exc_info: Any = None):
+            if exc_info is not None and started:
+                raise exc_info[1].with_traceback(exc_info[2])
+            started[:] = [(status, headers)]
+
+        response = await loop.run_in_executor(
+            self._executor, self.app.wsgi_app, environ, start_response)
+
+        try:
+            status, headers = started[0]
+            await send({
+                "type": "http.response.start",
+                "status": int(status.split(" ", 1)[0]),
+                "headers": [
+                    (name.lower().encode("latin-1"), value.encode("latin-1"))
+                    for name, value in headers
+                ],
+            })
+
+            # Тело (в т.ч. потоковое, читающее курсор БД) итерируется в пуле потоков
+            chunks = iter(response)
+            while True:
+                chunk = await loop.run_in_executor(self._executor, next, chunks, None)
+                if chunk is None:
+                    break
+                if chunk:
+                    await send({"type": "http.response.body", "body": chunk, "more_body": True})
+
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+        finally:
+            close = getattr(response, "close", None)
+            if close is not None:
+                await loop.run_in_executor(self._executor, close)
+
+
+async def _read_body(receive: Receive) -> bytes:
+    body = bytearray()
+
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            break
+        body.extend(message.get("body", b""))
+        if not message.get("more_body", False):
+            break
+
+    return bytes(body)
+
+
+def _build_environ(scope: Scope, body: bytes) -> Dict[str, Any]:
+    """Создает WSGI environ (PEP 3333) запроса по ASGI scope."""
+
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": client[0],
+        "REMOTE_PORT": str(client[1]),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+
+    for raw_name, raw_value in scope.get("headers", []):
+        name = raw_name.decode("latin-1").upper().replace("-", "_")
+        value = raw_value.decode("latin-1")
+
+        if name == "CONTENT_TYPE" or name == "CONTENT_LENGTH":
+            key = name
+        else:
+            key = f"HTTP_{name}"
+
+        if key in environ:
+            value = f"{environ[key]},{value}"
+        environ[key] = value
+
+    return environ
+
+
+# Приложение для ASGI сервера (`uvicorn asgi:app`)
+app = AsgiAdapter()
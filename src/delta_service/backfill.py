@@ -0,0 +1,340 @@
+"""
+Разовая загрузка (backfill) `.xlsx` файлов в БД без директории ожидания сервиса.
+
+Принимает директории (`.xlsx` файлы в них) и glob шаблоны (`**` - рекурсивно).
+Все листы каждой книги парсятся параллельно в пуле процессов (лист - отдельная задача),
+записи файла загружаются в БД через `COPY` одной загрузкой вместе с записью в журнале
+загруженных файлов, поэтому уже загруженные файлы пропускаются, а повторный
+запуск после сбоя догружает оставшиеся. Режим фиксации (`DB_LOAD_COMMIT_MODE`)
+и режим загрузки (`DB_INGEST_MODE`) - как у сервиса. Файлы не перемещаются.
+
+Выводит время парсинга и загрузки каждого файла и итоговую скорость (строк/сек.).
+Код возврата `1`, если хотя бы один файл загрузить не удалось.
+
+Запуск (из `src/delta_service`):
+    python backfill.py /data/history "/data/archive/**/*.xlsx" --workers 8
+"""
+import argparse
+import asyncio
+import datetime
+import glob
+import json
+import multiprocessing
+import os
+import pathlib
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, asdict
+from typing import List, Tuple, Union, Sequence
+
+import numpy as np
+from loguru import logger
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from db.crud.compaction import has_unique_rep_dt
+from db.crud.delta import put_delta_batches, LOAD_STRATEGY_COPY, INGEST_MODE_REPLACE
+from db.crud.delta_lags import sync_delta_lags
+from db.crud.ingest import is_file_ingested, FileAlreadyIngestedError
+from db.crud.partitions import ensure_delta_partitions
+from db.events import create_database_engine, get_database_session
+from models.db.entities import DeltaBatch, IngestedFileRecord
+from settings.settings import Settings, get_settings
+from util.files import hash_file
+from util.parsers import parse_xlsx_file, list_xlsx_sheets
+
+
+# Итог обработки файла
+STATUS_LOADED = "loaded"
+STATUS_SKIPPED = "skipped"
+STATUS_PARSED = "parsed"
+STATUS_FAILED = "failed"
+
+# Во сколько раз файлов в обработке (распарсенных и ожидающих загрузки) больше,
+# чем процессов парсинга: ограничивает память под записи файлов
+FILES_IN_FLIGHT_PER_WORKER = 2
+
+
+@dataclass
+class FileReport:
+    """
+    Итог обработки файла.
+
+    `parse_sec` - суммарное время парсинга листов (в процессах пула),
+    `load_sec` - время загрузки в БД.
+    """
+
+    file: str
+    status: str
+    sheets: int = 0
+    rows: int = 0
+    parse_sec: float = 0
+    load_sec: float = 0
+    error: Union[str, None] = None
+
+    @property
+    def rows_per_sec(self) -> float:
+        elapsed = self.parse_sec + self.load_sec
+        return self.rows / elapsed if elapsed else 0.0
+
+
+@dataclass
+class Backfill:
+    """
+    Загрузка файлов `files`: парсинг листов в `workers` процессах,
+    не более `upload_concurrency` одновременных загрузок в БД (`dry_run` - только парсинг).
+    """
+
+    settings: Settings
+    workers: int
+    upload_concurrency: int
+    dry_run: bool = False
+
+    async def run(self, files: Sequence[pathlib.Path]) -> List[FileReport]:
+        engine = None if self.dry_run else create_database_engine(self.settings.DB)
+        executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+        in_flight = asyncio.Semaphore(self.workers * FILES_IN_FLIGHT_PER_WORKER)
+        uploads = asyncio.Semaphore(self.upload_concurrency)
+
+        try:
+            if engine is not None:
+                await self._prepare_database(engine)
+
+            async def process(file: pathlib.Path) -> FileReport:
+                async with in_flight:
+                    report = await self._process_file(file, engine, executor, uploads)
+                _log_report(report)
+                return report
+
+            return list(await asyncio.gather(*(process(file) for file in files)))
+        finally:
+            executor.shutdown(cancel_futures=True)
+            if engine is not None:
+                await engine.dispose()
+
+    async def _prepare_database(self, engine: AsyncEngine) -> None:
+        """Материализует недостающие лаги и проверяет готовность БД к режиму загрузки."""
+
+        lags = self.settings.DB.LAG_VIEW_LAGS
+        rebuilt = await sync_delta_lags(await get_database_session(engine), lags)
+        if rebuilt:
+            logger.info(f"Materialized lags {rebuilt}")
+
+        if (
+            self.settings.DB.INGEST_MODE == INGEST_MODE_REPLACE
+            and not await has_unique_rep_dt(await get_database_session(engine))
+        ):
+            raise RuntimeError(
+                "Replace ingest mode requires unique rep_dt index,"
+                " run \"python compact_deltas.py --unique\" first"
+            )
+
+    async def _process_file(
+        self,
+        file: pathlib.Path,
+        engine: Union[AsyncEngine, None],
+        executor: ProcessPoolExecutor,
+        uploads: asyncio.Semaphore,
+    ) -> FileReport:
+        report = FileReport(file=str(file), status=STATUS_PARSED)
+        loop = asyncio.get_running_loop()
+
+        try:
+            file_hash = await asyncio.to_thread(hash_file, file)
+            if engine is not None and await is_file_ingested(
+                await get_database_session(engine), sha256=file_hash
+            ):
+                report.status = STATUS_SKIPPED
+                return report
+
+            sheets = await loop.run_in_executor(executor, list_xlsx_sheets, file)
+            report.sheets = len(sheets)
+            # Листы книги парсятся параллельно, записи идут в порядке листов
+            results = await asyncio.gather(*(
+                loop.run_in_executor(
+                    executor,
+                    _parse_sheet,
+                    file,
+                    sheet,
+                    self.settings.APP.XLSX_PARSER_MODE,
+                    self.settings.APP.XLSX_CHUNK_SIZE,
+                )
+                for sheet in sheets
+            ))
+            batches = [batch for sheet_batches, _ in results for batch in sheet_batches]
+            report.parse_sec = sum(parse_sec for _, parse_sec in results)
+            report.rows = sum(len(batch) for batch in batches)
+
+            if engine is None:
+                return report
+
+            async with uploads:
+                started = time.perf_counter()
+                await self._load(engine, file, file_hash, batches, report.rows)
+                report.load_sec = time.perf_counter() - started
+            report.status = STATUS_LOADED
+        except FileAlreadyIngestedError:
+            report.status = STATUS_SKIPPED
+        except Exception as e:
+            report.status = STATUS_FAILED
+            report.error = str(e)
+
+        return report
+
+    async def _load(
+        self,
+        engine: AsyncEngine,
+        file: pathlib.Path,
+        file_hash: str,
+        batches: List[DeltaBatch],
+        rows: int,
+    ) -> None:
+        """Загружает записи файла в БД, создавая партиции месяцев его записей."""
+
+        db_settings = self.settings.DB
+
+        if rows:
+            date_from = min(batch.rep_dt.min() for batch in batches if len(batch))
+            date_to = max(batch.rep_dt.max() for batch in batches if len(batch))
+            await ensure_delta_partitions(
+                await get_database_session(engine), _to_date(date_from), _to_date(date_to))
+
+        await put_delta_batches(
+            await get_database_session(engine),
+            batches=batches,
+            strategy=LOAD_STRATEGY_COPY,
+            chunk_size=db_settings.LOAD_CHUNK_SIZE,
+            ingested_file=IngestedFileRecord(sha256=file_hash, file_name=file.name, rows=rows),
+            commit_mode=db_settings.LOAD_COMMIT_MODE,
+            # Запущенные экземпляры сервиса обновляют кэши и индексы по уведомлению
+            notify=True,
+            lags=db_settings.LAG_VIEW_LAGS,
+            ingest_mode=db_settings.INGEST_MODE,
+        )
+
+
+def _parse_sheet(
+    file: pathlib.Path,
+    sheet: str,
+    parser_mode: str,
+    chunk_size: int,
+) -> Tuple[List[DeltaBatch], float]:
+    """Парсит лист книги в дочернем процессе. Возвращает пачки и время парсинга."""
+
+    started = time.perf_counter()
+    batches = parse_xlsx_file(
+        file, parser_mode=parser_mode, chunk_size=chunk_size, sheet=sheet, allow_empty=True)
+
+    return batches, time.perf_counter() - started
+
+
+def _to_date(value: np.datetime64) -> datetime.date:
+    return value.astype("datetime64[D]").item()
+
+
+def collect_files(paths: Sequence[str], recursive: bool = False) -> List[pathlib.Path]:
+    """
+    Собирает `.xlsx` файлы директорий и glob шаблонов `paths`
+    (без повторов, в порядке аргументов и имен файлов).
+    """
+
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            pattern = "**/*" if recursive else "*"
+            found = pathlib.Path(path).glob(pattern)
+        else:
+            found = (pathlib.Path(name) for name in glob.glob(path, recursive=True))
+
+        files.extend(sorted(
+            file for file in found
+            if file.is_file() and file.suffix.lower() == ".xlsx"
+        ))
+
+    return list(dict.fromkeys(file.resolve() for file in files))
+
+
+def _log_report(report: FileReport) -> None:
+    message = (
+        f"{report.status} \"{report.file}\": {report.sheets} sheets, {report.rows} rows,"
+        f" parse {report.parse_sec:.2f} sec, load {report.load_sec:.2f} sec,"
+        f" {report.rows_per_sec:.0f} rows/sec"
+    )
+    if report.error is not None:
+        logger.error(f"{message}: {report.error}")
+    else:
+        logger.info(message)
+
+
+def main() -> None:
+    settings = get_settings()
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("paths", nargs="+", help="directories or glob patterns of .xlsx files")
+    parser.add_argument("--recursive", action="store_true", help="search directories recursively")
+    parser.add_argument(
+        "--workers", type=int, default=os.cpu_count() or 1, help="parse processes count")
+    parser.add_argument(
+        "--upload-concurrency",
+        type=int,
+        default=settings.APP.XLSX_UPLOAD_CONCURRENCY,
+        help="files loaded to database concurrently",
+    )
+    parser.add_argument("--dry-run", action="store_true", help="parse files without loading")
+    parser.add_argument("--json", action="store_true", help="print JSON report to stdout")
+    args = parser.parse_args()
+
+    if args.workers <= 0 or args.upload_concurrency <= 0:
+        parser.error("workers and upload concurrency must be positive")
+
+    files = collect_files(args.paths, recursive=args.recursive)
+    logger.info(f"Found {len(files)} files")
+
+    backfill = Backfill(
+        settings=settings,
+        workers=args.workers,
+        upload_concurrency=args.upload_concurrency,
+        dry_run=args.dry_run,
+    )
+    started = time.perf_counter()
+    reports = asyncio.run(backfill.run(files))
+    elapsed = time.perf_counter() - started
+
+    rows = sum(report.rows for report in reports if report.status in (STATUS_LOADED, STATUS_PARSED))
+    counts = {
+        status: sum(report.status == status for report in reports)
+        for status in (STATUS_LOADED, STATUS_PARSED, STATUS_SKIPPED, STATUS_FAILED)
+    }
+    total = {
+        "files": len(reports),
+        **counts,
+        "rows": rows,
+        "elapsed_sec": elapsed,
+        "rows_per_sec": rows / elapsed if elapsed else 0.0,
+    }
+    logger.info(
+        f"Backfill finished in {elapsed:.2f} sec: {rows} rows"
+        f" ({total['rows_per_sec']:.0f} rows/sec), files {counts}"
+    )
+
+    if args.json:
+        json.dump(
+            {
+                "files": [
+                    {**asdict(report), "rows_per_sec": report.rows_per_sec} for report in reports
+                ],
+                "total": total,
+            },
+            sys.stdout,
+            indent=2,
+        )
+        sys.stdout.write("\n")
+
+    sys.exit(1 if counts[STATUS_FAILED] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,84 @@
-from typing import Dict, Union
+from typing import Dict, Union, Sequence, Callable, Any, Tuple, Hashable, Iterator
+import asyncio
 import datetime
-from dataclasses import asdict
+import itertools
+from functools import partial
 
-from flask import Blueprint, current_app, request
+from flask import Blueprint, Response, current_app, request
 
-from db.crud.delta import get_all_delta_data, get_delta_data_lag_view
-from db.events import get_database_session
-from models.api.schemas import DeltaGetDataFrameResponse
+from db.crud.delta import (
+    StreamChunk,
+    get_delta_data,
+    get_delta_data_lag_view,
+    stream_delta_data,
+    stream_delta_data_lag_view,
+)
+from db.events import run_with_database_session, iter_with_database_session
+from models.api.schemas import DeltaGetDataFrameResponse, DeltaGetPageResponse
+from models.db.entities import DeltaCursor, DeltaRecord, DeltaRecordWithLag
 from settings.settings import Settings
-from util.tables_processing import apply_df_lag
-from util.convertors import merge_records_to_data_frame
+from util.cache import ResponseCache
+from util.metrics import REGISTRY
+from util.series_index import DeltaSeriesIndex
+from util.convertors import records_to_columns, columns_to_dict, format_http_date
+from util.streaming import (
+    iter_columns_json,
+    iter_rows_ndjson,
+    iter_csv,
+    iter_arrow_ipc,
+    iter_parquet,
+)
 
 
 delta_bp = Blueprint("delta-bp", __name__)
 
 
+# Форматы ответа эндпоинтов
+RESPONSE_FORMAT_JSON = "json"
+RESPONSE_FORMAT_NDJSON = "ndjson"
+RESPONSE_FORMAT_CSV = "csv"
+RESPONSE_FORMAT_ARROW = "arrow"
+RESPONSE_FORMAT_PARQUET = "parquet"
+
+# MIME типы форматов ответа, в т.ч. для выбора формата по заголовку `Accept`
+RESPONSE_MIMETYPES = {
+    RESPONSE_FORMAT_JSON: "application/json",
+    RESPONSE_FORMAT_NDJSON: "application/x-ndjson",
+    RESPONSE_FORMAT_CSV: "text/csv",
+    RESPONSE_FORMAT_ARROW: "application/vnd.apache.arrow.stream",
+    RESPONSE_FORMAT_PARQUET: "application/vnd.apache.parquet",
+}
+RESPONSE_FORMATS = tuple(RESPONSE_MIMETYPES)
+
+# Форматы, которые всегда отдаются потоково, одним проходом по результату запроса
+ROW_STREAM_FORMATS = (
+    RESPONSE_FORMAT_NDJSON,
+    RESPONSE_FORMAT_CSV,
+    RESPONSE_FORMAT_ARROW,
+    RESPONSE_FORMAT_PARQUET,
+)
+
+# Имена колонок ответа в порядке значений в строках результата запроса
+DELTA_LAG_COLUMNS = ("Rep_dt", "Delta", "DeltaLag")
+# Колонка `id` записей (только для курсора пагинации, в ответ не выводится)
+ID_COLUMN = "Id"
+
+# Этапы обработки запроса: получение записей из БД или индекса в памяти,
+# сборка колонок ответа, сборка JSON ответа,
+# получение первой пачки строк потокового ответа
+PHASE_DB_FETCH = "db_fetch"
+PHASE_INDEX_FETCH = "index_fetch"
+PHASE_COLUMNS = "columns"
+PHASE_SERIALIZE = "serialize"
+PHASE_FIRST_CHUNK = "first_chunk"
+
+REQUEST_PHASE_SECONDS = REGISTRY.histogram(
+    "delta_http_request_phase_seconds",
+    "Time spent in request processing phases",
+    labelnames=("endpoint", "phase"),
+)
+
+
 DeltaTableDict = Dict[
     str, Dict[
         str, Union[Dict[int, float], Dict[int, datetime.date]]
@@ -25,54 +89,347 @@ DeltaTableDict = Dict[
 @delta_bp.get("/delta")
 async def get_delta() -> DeltaTableDict:
     """
-    Эндпоинт получения всех записей `delta`, 
-    в т.ч. с заданным параметром `lag`. (Реализовано средствами pandas)
+    Эндпоинт получения записей `delta` с колонкой `DeltaLag` (по БД или индексу в памяти).
+    Параметры `lag`, `from`, `to`, `after`, `limit`, `format`, `stream` описаны в README.
     """
 
-    lag = abs(int(request.args.get("lag", default=0)))
+    try:
+        response_format, stream = _get_response_mode()
+        lag = abs(int(request.args.get("lag", default=0)))
+        limit = request.args.get("limit", default=None)
+        limit = int(limit) if limit is not None else None
+        after = _get_cursor_arg("after")
+        date_from = _get_date_arg("from")
+        date_to = _get_date_arg("to")
+    except ValueError as e:
+        return f"Invalid request parameters: {e}", 400
+
+    if limit is not None and limit <= 0:
+        return "Invalid request parameters: limit must be positive", 400
     
     app_settings: Settings = current_app.config["APP_SETTINGS"]
-    db_session = await get_database_session(app_settings.DB.ENGINE)
-    
-    try:
-        delta_records = await get_all_delta_data(
-            db_session=db_session)
-    except ConnectionRefusedError:
-        return "Service connection problem occured", 500
 
-    # В целях удобства последующего предстваления записей БД в виде словаря и 
-    # дальнейшей конвертации в JSON - записи конвертируются в pandas.DataFrame
-    delta_df = merge_records_to_data_frame(delta_records)
-    lagged_delta = apply_df_lag(delta_df, lag=lag, sort_by_date=False)
-    response_data = lagged_delta.to_dict()
+    cache = app_settings.APP.RESPONSE_CACHE
+    cache_key = ("/delta", lag, limit, after, date_from, date_to, response_format, stream)
+    cached_response = _get_cached_response(cache, cache_key)
+    if cached_response is not None:
+        return cached_response
+    # Версия данных фиксируется до запроса к БД
+    cache_version = cache.version if cache is not None else 0
+
+    index = _get_delta_index(app_settings)
+
+    if stream:
+        if index is not None:
+            iter_chunks = index.iter_delta_chunks
+        else:
+            iter_chunks = partial(iter_with_database_session, app_settings.DB, stream_delta_data)
+        try:
+            response = await _make_stream_response(
+                app_settings,
+                iter_chunks,
+                endpoint="/delta",
+                response_format=response_format,
+                limit=limit,
+                lag=lag,
+                after=after,
+                date_from=date_from,
+                date_to=date_to,
+                with_id=limit is not None,
+            )
+        except ConnectionRefusedError:
+            return "Service connection problem occured", 500
+
+        return _cache_response(cache, cache_key, cache_version, response)
+
+    query = dict(lag=lag, after=after, limit=limit, date_from=date_from, date_to=date_to)
+    if index is not None:
+        # Колонки ответа берутся прямо из массивов индекса
+        get_columns = partial(_get_index_columns, index, with_id=limit is not None, **query)
+        columns_phase = PHASE_INDEX_FETCH
+    else:
+        try:
+            with REQUEST_PHASE_SECONDS.time(endpoint="/delta", phase=PHASE_DB_FETCH):
+                delta_records = await run_with_database_session(
+                    app_settings.DB, get_delta_data, **query)
+        except ConnectionRefusedError:
+            return "Service connection problem occured", 500
 
-    # Создание схемы ответа
-    response = DeltaGetDataFrameResponse(records=response_data)
+        get_columns = partial(_get_records_columns, delta_records)
+        columns_phase = PHASE_COLUMNS
 
-    return asdict(response)
+    # Сборка ответа - в отдельном потоке, чтобы не блокировать event loop (ASGI сервера)
+    response = await asyncio.to_thread(
+        _make_records_response,
+        get_columns,
+        endpoint="/delta",
+        columns_phase=columns_phase,
+        limit=limit,
+    )
+
+    return _cache_response(cache, cache_key, cache_version, response)
 
 
 @delta_bp.get("/delta-lag-view")
 async def get_delta_lag_view() -> DeltaTableDict:
     """
-    Эндпоинт получения всех записей представления `deltalag`, 
+    Эндпоинт получения записей с материализованной колонкой `DeltaLag` (таблица `delta_lags`).
+    `lag` - один из `DB_LAG_VIEW_LAGS`, остальные параметры - как у `/delta`.
     """
 
     app_settings: Settings = current_app.config["APP_SETTINGS"]
-    db_session = await get_database_session(app_settings.DB.ENGINE)
+    lags = app_settings.DB.LAG_VIEW_LAGS
 
     try:
-        records = await get_delta_data_lag_view(
-            db_session=db_session)
+        response_format, stream = _get_response_mode()
+        lag = abs(int(request.args.get("lag", default=lags[0])))
+    except ValueError as e:
+        return f"Invalid request parameters: {e}", 400
+
+    if lag not in lags:
+        return f"Invalid request parameters: lag must be one of {lags}", 400
+
+    cache = app_settings.APP.RESPONSE_CACHE
+    cache_key = ("/delta-lag-view", lag, response_format, stream)
+    cached_response = _get_cached_response(cache, cache_key)
+    if cached_response is not None:
+        return cached_response
+    cache_version = cache.version if cache is not None else 0
+
+    if stream:
+        try:
+            response = await _make_stream_response(
+                app_settings,
+                partial(iter_with_database_session, app_settings.DB, stream_delta_data_lag_view),
+                endpoint="/delta-lag-view",
+                response_format=response_format,
+                lag=lag,
+            )
+        except ConnectionRefusedError:
+            return "Service connection problem occured", 500
+
+        return _cache_response(cache, cache_key, cache_version, response)
+
+    try:
+        with REQUEST_PHASE_SECONDS.time(endpoint="/delta-lag-view", phase=PHASE_DB_FETCH):
+            records = await run_with_database_session(
+                app_settings.DB, get_delta_data_lag_view, lag=lag)
     except ConnectionRefusedError:
         return "Service connection problem occured", 500
 
-    # В целях удобства последующего предстваления записей БД в виде словаря и 
-    # дальнейшей конвертации в JSON - записи конвертируются в pandas.DataFrame
-    data_df = merge_records_to_data_frame(records)
-    response_data = data_df.to_dict()
+    response = await asyncio.to_thread(
+        _make_records_response,
+        partial(records_to_columns, records, record_type=DeltaRecord),
+        endpoint="/delta-lag-view",
+    )
+
+    return _cache_response(cache, cache_key, cache_version, response)
+
+
+def _make_records_response(
+    get_columns: Callable[[], Dict[str, Sequence[Any]]],
+    endpoint: str,
+    columns_phase: str = PHASE_COLUMNS,
+    limit: Union[int, None] = None,
+) -> Response:
+    """
+    Создает JSON ответ с колонками записей `get_columns` (страницу, если задан `limit`).
+    Вызывается через `asyncio.to_thread`.
+    """
+
+    with REQUEST_PHASE_SECONDS.time(endpoint=endpoint, phase=columns_phase):
+        columns = get_columns()
+        ids = columns.pop(ID_COLUMN, None)
+
+    with REQUEST_PHASE_SECONDS.time(endpoint=endpoint, phase=PHASE_SERIALIZE):
+        rep_dt = columns[DELTA_LAG_COLUMNS[0]]
+        # Даты форматируются заранее: сериализатор Flask вызывает для каждой даты
+        # `http_date`, который и занимает большую часть времени сериализации
+        response_data = columns_to_dict(
+            {**columns, DELTA_LAG_COLUMNS[0]: [format_http_date(value) for value in rep_dt]})
+
+        # Создание схемы ответа
+        if limit is None:
+            response = DeltaGetDataFrameResponse(records=response_data)
+            # `vars` вместо `asdict`: `asdict` рекурсивно копирует словари колонок
+            return current_app.make_response(dict(vars(response)))
+
+        next_after = None
+        if len(rep_dt) == limit:
+            next_after = str(DeltaCursor(rep_dt=rep_dt[-1], id=ids[-1]))
+        response = DeltaGetPageResponse(records=response_data, next_after=next_after)
+
+        # Ключи в порядке полей схемы, а не по алфавиту: как в потоковом ответе,
+        # где `next_after` известен только после записей
+        dumps = partial(current_app.json.dumps, separators=(",", ":"))
+        body = ",".join(f"{dumps(key)}:{dumps(value)}" for key, value in vars(response).items())
+        return current_app.response_class(
+            f"{{{body}}}\n", mimetype=current_app.json.mimetype)
+
+
+def _get_index_columns(index: DeltaSeriesIndex, **query: Any) -> Dict[str, Sequence[Any]]:
+    return dict(zip(DELTA_LAG_COLUMNS + (ID_COLUMN,), index.get_delta_columns(**query)))
+
+
+def _get_records_columns(records: Sequence[DeltaRecordWithLag]) -> Dict[str, Sequence[Any]]:
+    columns = records_to_columns(records, record_type=DeltaRecordWithLag)
+    columns[ID_COLUMN] = [rec.id for rec in records]
+
+    return columns
+
+
+def _format_row_cursor(row: Sequence[Any]) -> str:
+    """Курсор пагинации строки `(rep_dt, delta, delta_lag, id)` результата запроса."""
+
+    return str(DeltaCursor(rep_dt=row[0], id=row[3]))
+
+
+def _get_cursor_arg(name: str) -> Union[DeltaCursor, None]:
+    """Возвращает параметр запроса `name` в виде курсора пагинации (см. `DeltaCursor`)."""
+
+    value = request.args.get(name, default=None)
+    if value is None:
+        return None
+
+    return DeltaCursor.parse(value)
+
+
+def _get_date_arg(name: str) -> Union[datetime.date, None]:
+    """Возвращает параметр запроса `name` в виде даты (ISO формат)."""
+
+    value = request.args.get(name, default=None)
+    if value is None:
+        return None
+
+    return datetime.date.fromisoformat(value)
+
+
+def _get_delta_index(app_settings: Settings) -> Union[DeltaSeriesIndex, None]:
+    """Возвращает индекс `deltas` в памяти, если он включен и загружен."""
+
+    index = app_settings.APP.DELTA_INDEX
+    if index is None or not index.is_loaded:
+        return None
+
+    return index
+
+
+def _get_response_mode() -> Tuple[str, bool]:
+    """
+    Возвращает формат ответа и признак потоковой отдачи.
+
+    Формат берется из параметра `format`, а без него - из заголовка `Accept`.
+    """
+
+    response_format = request.args.get("format", default=None)
+    if response_format is None:
+        mimetype = request.accept_mimetypes.best_match(
+            list(RESPONSE_MIMETYPES.values()),
+            default=RESPONSE_MIMETYPES[RESPONSE_FORMAT_JSON],
+        )
+        response_format = next(
+            name for name, value in RESPONSE_MIMETYPES.items() if value == mimetype)
+
+    response_format = response_format.lower()
+    if response_format not in RESPONSE_FORMATS:
+        raise ValueError(f"format must be one of {RESPONSE_FORMATS}")
+
+    stream = request.args.get("stream", default="false").lower() in ("true", "1")
+
+    return response_format, stream or response_format in ROW_STREAM_FORMATS
+
+
+async def _make_stream_response(
+    app_settings: Settings,
+    iter_chunks: Callable[..., Iterator[StreamChunk]],
+    endpoint: str,
+    response_format: str,
+    limit: Union[int, None] = None,
+    columns: Sequence[str] = DELTA_LAG_COLUMNS,
+    **query: Any,
+) -> Response:
+    """Создает потоковый ответ из пачек строк `iter_chunks` (серверного курсора или индекса в памяти)."""
+
+    passes = len(columns) if response_format == RESPONSE_FORMAT_JSON else 1
+    if limit is not None:
+        query["limit"] = limit
+    chunks = iter_chunks(
+        passes=passes,
+        batch_size=app_settings.DB.STREAM_BATCH_SIZE,
+        **query,
+    )
+
+    # Первая пачка запрашивается до отправки заголовков ответа,
+    # чтобы ошибки подключения к БД вернулись кодом ошибки, а не оборванным телом
+    with REQUEST_PHASE_SECONDS.time(endpoint=endpoint, phase=PHASE_FIRST_CHUNK):
+        first = await asyncio.to_thread(next, chunks, None)
+    chunks = itertools.chain([first] if first is not None else [], chunks)
+
+    # Тело ответа отдается уже вне контекста запроса, поэтому сериализатор
+    # JSON приложения связывается заранее
+    dumps = partial(current_app.json.dumps, separators=(",", ":"))
+    if response_format == RESPONSE_FORMAT_NDJSON:
+        body = iter_rows_ndjson(chunks, columns=columns, dumps=dumps)
+    elif response_format == RESPONSE_FORMAT_CSV:
+        body = iter_csv(chunks, columns=columns)
+    elif response_format == RESPONSE_FORMAT_ARROW:
+        body = iter_arrow_ipc(chunks, columns=columns)
+    elif response_format == RESPONSE_FORMAT_PARQUET:
+        body = iter_parquet(chunks, columns=columns)
+    else:
+        body = iter_columns_json(
+            chunks, columns=columns, dumps=dumps, limit=limit, format_cursor=_format_row_cursor)
+
+    return Response(body, mimetype=RESPONSE_MIMETYPES[response_format])
+
+
+def _get_cached_response(
+    cache: Union[ResponseCache, None],
+    key: Hashable,
+) -> Union[Response, None]:
+    """
+    Возвращает ответ из кэша
+    (`304 Not Modified`, если у клиента уже есть актуальная версия).
+    """
+
+    if cache is None:
+        return None
+
+    entry = cache.get(key)
+    if entry is None:
+        return None
+
+    return _make_conditional(Response(entry.body, mimetype=entry.mimetype), entry.etag)
+
+
+def _cache_response(
+    cache: Union[ResponseCache, None],
+    key: Hashable,
+    version: int,
+    response: Response,
+) -> Response:
+    """
+    Сохраняет ответ, собранный по данным версии `version`, в кэш.
+
+    Тело потокового ответа сохраняется по мере отдачи (`ETag` будет у следующих ответов).
+    """
+
+    if cache is None:
+        return response
+
+    if response.is_streamed:
+        response.response = cache.tee(key, version, response.response, response.mimetype)
+        response.vary.add("Accept")
+        return response
+
+    entry = cache.put(key, version, response.get_data(), response.mimetype)
+
+    return _make_conditional(response, entry.etag)
+
 
-    # Создание схемы ответа
-    response = DeltaGetDataFrameResponse(records=response_data)
+def _make_conditional(response: Response, etag: str) -> Response:
+    response.set_etag(etag)
+    # Формат ответа может выбираться по заголовку `Accept`
+    response.vary.add("Accept")
 
-    return asdict(response)
+    return response.make_conditional(request)
@@ -0,0 +1,44 @@
+import time
+
+from flask import Blueprint, Flask, Response, g, request
+
+from util.metrics import REGISTRY, CONTENT_TYPE
+
+
+metrics_bp = Blueprint("metrics-bp", __name__)
+
+
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    "delta_http_request_seconds",
+    "HTTP request latency until response headers (streamed body excluded)",
+    labelnames=("endpoint", "method", "status"),
+)
+
+
+@metrics_bp.get("/metrics")
+def get_metrics() -> Response:
+    """Эндпоинт метрик сервиса в текстовом формате Prometheus."""
+
+    return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
+
+
+def instrument_app(app: Flask) -> None:
+    """Регистрирует измерение длительности обработки запросов приложения."""
+
+    @app.before_request
+    def _start_timer() -> None:
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def _observe_request(response: Response) -> Response:
+        started = g.pop("request_started", None)
+        if started is not None:
+            HTTP_REQUEST_SECONDS.observe(
+                time.perf_counter() - started,
+                # Шаблон маршрута, чтобы не плодить метки по параметрам запроса
+                endpoint=request.url_rule.rule if request.url_rule is not None else "unmatched",
+                method=request.method,
+                status=response.status_code,
+            )
+
+        return response
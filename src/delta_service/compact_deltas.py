@@ -0,0 +1,50 @@
+"""
+Задача компактификации таблицы `deltas`: удаляет дубликаты `rep_dt`,
+накопленные загрузкой в режиме `append`, оставляя последнюю загруженную запись даты.
+
+С `--unique` создает уникальный индекс `rep_dt`, необходимый режиму `DB_INGEST_MODE=replace`
+(по умолчанию - если этот режим задан).
+
+Запуск (из `src/delta_service`):
+    python compact_deltas.py [--unique | --no-unique]
+"""
+import argparse
+import asyncio
+
+from loguru import logger
+
+from db.crud.compaction import compact_deltas
+from db.crud.delta import INGEST_MODE_REPLACE
+from db.events import create_database_engine, get_database_session
+from settings.settings import Settings, get_settings
+
+
+async def run(settings: Settings, unique: bool) -> int:
+    engine = create_database_engine(settings.DB)
+    try:
+        session = await get_database_session(engine)
+        async with session:
+            return await compact_deltas(
+                session, settings.DB.LAG_VIEW_LAGS, unique=unique, notify=True)
+    finally:
+        await engine.dispose()
+
+
+def main() -> None:
+    settings = get_settings()
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--unique",
+        action=argparse.BooleanOptionalAction,
+        default=settings.DB.INGEST_MODE == INGEST_MODE_REPLACE,
+        help="create unique rep_dt index required by replace ingest mode",
+    )
+    args = parser.parse_args()
+
+    removed = asyncio.run(run(settings, args.unique))
+    logger.info(f"Compaction finished, {removed} duplicate records removed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+from typing import Sequence
+
+from loguru import logger
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import text
+
+from db.crud.delta_lags import refresh_delta_lags
+from db.notify import notify_deltas_changed
+from models.db.tables import Delta
+
+
+# Уникальный индекс `rep_dt`, нужный загрузке в режиме `replace` (`ON CONFLICT (rep_dt)`).
+# Создается миграцией `7a1c4e2f9b58` с `DB_INGEST_MODE=replace` или `compact_deltas.py --unique`
+UNIQUE_REP_DT_INDEX_NAME = f"ux_{Delta.__tablename__}_rep_dt"
+
+
+async def has_unique_rep_dt(db_session: AsyncSession) -> bool:
+    """Проверяет, создан ли уникальный индекс `rep_dt` таблицы `deltas`."""
+
+    async with db_session.begin():
+        return await db_session.scalar(
+            text("SELECT to_regclass(:name) IS NOT NULL"),
+            {"name": UNIQUE_REP_DT_INDEX_NAME},
+        )
+
+
+async def compact_deltas(
+    db_session: AsyncSession,
+    lags: Sequence[int],
+    unique: bool = False,
+    notify: bool = False,
+) -> int:
+    """
+    Удаляет дубликаты `rep_dt` таблицы `deltas`, накопленные загрузкой в режиме `append`,
+    оставляя последнюю загруженную запись каждой даты.
+
+    Последней считается запись с наибольшим time-ordered id (UUIDv7); записи со старыми
+    случайными id (UUIDv4) считаются загруженными раньше, между собой - по `ctid`.
+    (`ctid` уникален только внутри партиции, поэтому записи сопоставляются еще и по `tableoid`.)
+    С `unique` создает уникальный индекс `rep_dt` для режима `replace`.
+    Таблица блокируется от изменений до конца транзакции, чтения не блокируются.
+    При удалении записей полностью пересчитывает материализованные лаги `lags`
+    (и с `notify` отправляет уведомление об изменении данных).
+    Возвращает кол-во удаленных записей.
+    """
+
+    async with db_session.begin():
+        await db_session.execute(
+            text(f"LOCK TABLE {Delta.__tablename__} IN SHARE ROW EXCLUSIVE MODE"))
+
+        result = await db_session.execute(text(
+            f"""
+            DELETE FROM {Delta.__tablename__} AS d
+            USING (
+                SELECT tableoid, ctid, row_number() OVER (
+                    PARTITION BY rep_dt
+                    ORDER BY substring(id::text, 15, 1) = '7' DESC, id DESC, ctid DESC
+                ) AS position
+                FROM {Delta.__tablename__}
+            ) AS ranked
+            WHERE d.tableoid = ranked.tableoid AND d.ctid = ranked.ctid AND ranked.position > 1
+            """
+        ))
+        removed = result.rowcount
+
+        if unique:
+            await db_session.execute(text(
+                f"""
+                CREATE UNIQUE INDEX IF NOT EXISTS {UNIQUE_REP_DT_INDEX_NAME}
+                ON {Delta.__tablename__} (rep_dt) INCLUDE (delta)
+                """
+            ))
+
+        if removed:
+            await refresh_delta_lags(db_session, lags)
+            if notify:
+                await notify_deltas_changed(db_session)
+
+    if removed:
+        logger.info(f"Removed {removed} duplicate delta records")
+
+    return removed
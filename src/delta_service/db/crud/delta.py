@@ -1,11 +1,82 @@
-from typing import Sequence, List
+import datetime
+import uuid
+from collections.abc import AsyncIterable
+from dataclasses import replace
+from typing import Sequence, List, Iterable, Union, AsyncIterator, Tuple, Any, Dict, Callable
 
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import insert, select
-from sqlalchemy.sql import text
+from sqlalchemy import (
+    select, func, literal, cast, tuple_, and_, Date, Select, ColumnElement, Row, Uuid)
+from sqlalchemy.sql import text, Executable
 
-from models.db.tables import Delta
-from models.db.entities import DeltaRecord, DeltaRecordWithLag
+from models.db.tables import Delta, DeltaStaging, DeltaLag
+from models.db.entities import (
+    DeltaRecord,
+    DeltaRecordWithLag,
+    DeltaBatch,
+    DeltaCursor,
+    IngestedFileRecord,
+)
+from util.ids import ids_to_strings
+from db.notify import notify_deltas_changed
+from db.crud.delta_lags import DEFAULT_LAG_VIEW_LAGS, refresh_delta_lags
+from db.crud.ingest import (
+    insert_ingested_file,
+    ensure_file_not_ingested,
+    lock_ingest_progress,
+    set_ingest_progress,
+    delete_ingest_progress,
+)
+
+
+# Стратегии загрузки пачек записей в таблицу `deltas`
+LOAD_STRATEGY_AUTO = "auto"
+LOAD_STRATEGY_INSERT = "insert"
+LOAD_STRATEGY_COPY = "copy"
+LOAD_STRATEGIES = (LOAD_STRATEGY_AUTO, LOAD_STRATEGY_INSERT, LOAD_STRATEGY_COPY)
+
+# Режимы фиксации загрузки пачек записей:
+# `single` - все пачки в одной транзакции,
+# `chunked` - транзакция на каждую часть с сохранением прогресса (возобновляемая загрузка),
+# `staged` - как `chunked`, но части копятся в `deltas_staging` и переносятся
+# в `deltas` одной транзакцией (читатели не видят частично загруженный файл)
+COMMIT_MODE_SINGLE = "single"
+COMMIT_MODE_CHUNKED = "chunked"
+COMMIT_MODE_STAGED = "staged"
+COMMIT_MODES = (COMMIT_MODE_SINGLE, COMMIT_MODE_CHUNKED, COMMIT_MODE_STAGED)
+
+# Режимы загрузки записей:
+# `append` - записи добавляются (записи с одинаковым `rep_dt` накапливаются),
+# `replace` - записи заменяют уже загруженные записи с тем же `rep_dt`
+# (`INSERT ... ON CONFLICT` по уникальному индексу `rep_dt`, см. `db.crud.compaction`)
+INGEST_MODE_APPEND = "append"
+INGEST_MODE_REPLACE = "replace"
+INGEST_MODES = (INGEST_MODE_APPEND, INGEST_MODE_REPLACE)
+
+# Временная таблица загрузки пачки через `COPY` в режиме `replace`
+UPSERT_TABLE_NAME = "deltas_upsert"
+
+# Колонки пачки записей в параметрах запроса (см. `_get_batch_params`)
+UNNEST_BATCH = (
+    "unnest(CAST(:id AS uuid[]), CAST(:rep_dt AS date[]), CAST(:delta AS float8[]))"
+    " AS t(id, rep_dt, delta)"
+)
+# `id` записи `deltas_staging` (у строк, загруженных до появления колонки `delta_id`, его нет)
+STAGED_DELTA_ID = "COALESCE(delta_id, uuid_generate_v7())"
+
+# Макс. кол-во строк, отправляемых в БД одной командой
+DEFAULT_LOAD_CHUNK_SIZE = 50_000
+# Мин. кол-во строк в пачке, при котором стратегия `auto` выбирает `COPY`
+DEFAULT_COPY_THRESHOLD = 5_000
+
+# Кол-во строк, забираемых из серверного курсора за раз
+DEFAULT_STREAM_BATCH_SIZE = 10_000
+
+# Пачка строк серверного курсора с номером прохода по результату запроса
+StreamChunk = Tuple[int, Sequence[Row[Any]]]
+
+# Диапазон `rep_dt` загруженных записей (`None` - записей не было)
+RepDtRange = Union[Tuple[datetime.date, datetime.date], None]
 
 
 async def put_delta_data(
@@ -14,13 +85,420 @@ async def put_delta_data(
 ) -> None:
     """Put delta records data to database."""
 
+    await put_delta_batches(
+        db_session, batches=[DeltaBatch.from_records(delta_records)])
+
+
+async def put_delta_batches(
+    db_session: AsyncSession,
+    batches: Union[Iterable[DeltaBatch], AsyncIterable[DeltaBatch]],
+    strategy: str = LOAD_STRATEGY_AUTO,
+    chunk_size: int = DEFAULT_LOAD_CHUNK_SIZE,
+    copy_threshold: int = DEFAULT_COPY_THRESHOLD,
+    ingested_file: Union[IngestedFileRecord, None] = None,
+    commit_mode: str = COMMIT_MODE_SINGLE,
+    notify: bool = False,
+    lags: Sequence[int] = DEFAULT_LAG_VIEW_LAGS,
+    ingest_mode: str = INGEST_MODE_APPEND,
+    on_resume: Union[Callable[[int], None], None] = None,
+) -> int:
+    """
+    Загружает пачки записей (в т.ч. async iterable) частями до `chunk_size` строк
+    через `INSERT` или `COPY` в режиме фиксации `commit_mode` и возвращает кол-во строк.
+    Устройство загрузки, режимы `commit_mode` и `ingest_mode` описаны в README.
+    Если часть строк была закоммичена раньше (прерванной или параллельной загрузкой с другими id),
+    вызывает `on_resume` с кол-вом таких строк.
+    """
+
+    if strategy not in LOAD_STRATEGIES:
+        raise ValueError(
+            f"Unknown load strategy \"{strategy}\", expected one of {LOAD_STRATEGIES}")
+    if commit_mode not in COMMIT_MODES:
+        raise ValueError(
+            f"Unknown commit mode \"{commit_mode}\", expected one of {COMMIT_MODES}")
+    if ingest_mode not in INGEST_MODES:
+        raise ValueError(
+            f"Unknown ingest mode \"{ingest_mode}\", expected one of {INGEST_MODES}")
+    if chunk_size <= 0:
+        raise ValueError("Chunk size must be positive")
+
+    replace_dates = ingest_mode == INGEST_MODE_REPLACE
+
+    if commit_mode != COMMIT_MODE_SINGLE:
+        if ingested_file is None:
+            raise ValueError(f"\"{commit_mode}\" commit mode requires ingested file record")
+
+        return await _put_delta_batches_resumable(
+            db_session,
+            batches=batches,
+            strategy=strategy,
+            chunk_size=chunk_size,
+            copy_threshold=copy_threshold,
+            ingested_file=ingested_file,
+            staged=commit_mode == COMMIT_MODE_STAGED,
+            notify=notify,
+            lags=lags,
+            replace_dates=replace_dates,
+            on_resume=on_resume,
+        )
+
+    total = 0
+    rep_dt_range = None
+
     async with db_session.begin():
-        stmt = (
-            insert(Delta).values(
-                [{"rep_dt": delta.rep_dt, "delta": delta.delta} for delta in delta_records]
-            )
+        async for chunk in _iter_chunks(batches, chunk_size):
+            await _load_chunk(
+                db_session, chunk, strategy, copy_threshold, replace_dates=replace_dates)
+            total += len(chunk)
+            rep_dt_range = _extend_rep_dt_range(rep_dt_range, chunk)
+
+        if rep_dt_range is not None:
+            await refresh_delta_lags(db_session, lags, *rep_dt_range)
+        if ingested_file is not None:
+            await insert_ingested_file(
+                db_session, replace(ingested_file, rows=total))
+        if notify:
+            await notify_deltas_changed(db_session)
+
+    return total
+
+
+async def _put_delta_batches_resumable(
+    db_session: AsyncSession,
+    batches: Union[Iterable[DeltaBatch], AsyncIterable[DeltaBatch]],
+    strategy: str,
+    chunk_size: int,
+    copy_threshold: int,
+    ingested_file: IngestedFileRecord,
+    staged: bool,
+    notify: bool = False,
+    lags: Sequence[int] = DEFAULT_LAG_VIEW_LAGS,
+    replace_dates: bool = False,
+    on_resume: Union[Callable[[int], None], None] = None,
+) -> int:
+    """
+    Загружает пачки, коммитя каждую часть вместе с прогрессом загрузки файла:
+    прерванная загрузка продолжается с последней закоммиченной части (`staged` - через `deltas_staging`).
+    """
+
+    sha256 = ingested_file.sha256
+    staging_sha256 = sha256 if staged else None
+
+    async with db_session.begin():
+        committed = await lock_ingest_progress(db_session, sha256, ingested_file.file_name)
+        await ensure_file_not_ingested(db_session, sha256)
+
+        if staged and committed:
+            # UNLOGGED таблица очищается при сбое сервера БД -
+            # прогресс сверяется с фактически сохраненными строками
+            staged_rows = await _count_staged_rows(db_session, sha256)
+            if staged_rows != committed:
+                await _delete_staged_rows(db_session, sha256)
+                await set_ingest_progress(db_session, sha256, 0)
+                committed = 0
+
+    offset = 0
+    rep_dt_range = None
+    # Строки, закоммиченные не этим вызовом
+    skipped = 0
+
+    async for chunk in _iter_chunks(batches, chunk_size):
+        end = offset + len(chunk)
+        # Диапазон - по всем частям файла, в т.ч. закоммиченным до прерывания
+        rep_dt_range = _extend_rep_dt_range(rep_dt_range, chunk)
+
+        if end <= committed:
+            skipped += len(chunk)
+        else:
+            async with db_session.begin():
+                # Прогресс мог измениться параллельной загрузкой того же содержимого
+                committed = await lock_ingest_progress(
+                    db_session, sha256, ingested_file.file_name)
+                await ensure_file_not_ingested(db_session, sha256)
+
+                skipped += min(max(committed - offset, 0), len(chunk))
+                if end > committed:
+                    await _load_chunk(
+                        db_session,
+                        chunk[max(committed - offset, 0):],
+                        strategy,
+                        copy_threshold,
+                        staging_sha256=staging_sha256,
+                        replace_dates=replace_dates,
+                    )
+                    await set_ingest_progress(db_session, sha256, end)
+                    committed = end
+
+        offset = end
+
+    async with db_session.begin():
+        await lock_ingest_progress(db_session, sha256, ingested_file.file_name)
+        await ensure_file_not_ingested(db_session, sha256)
+
+        if staged:
+            await _merge_staged_rows(db_session, sha256, replace_dates=replace_dates)
+        if rep_dt_range is not None:
+            await refresh_delta_lags(db_session, lags, *rep_dt_range)
+        await insert_ingested_file(db_session, replace(ingested_file, rows=offset))
+        await delete_ingest_progress(db_session, sha256)
+        if notify:
+            await notify_deltas_changed(db_session)
+
+    if skipped and on_resume is not None:
+        on_resume(skipped)
+
+    return offset
+
+
+async def discard_delta_upload(
+    db_session: AsyncSession,
+    sha256: str,
+    lags: Sequence[int] = (),
+) -> None:
+    """
+    Удаляет прогресс и промежуточные строки незавершенной загрузки файла по частям
+    (строки, уже закоммиченные в `deltas`, остаются) и пересчитывает лаги `lags` по всей таблице.
+    """
+
+    async with db_session.begin():
+        await _delete_staged_rows(db_session, sha256)
+        await delete_ingest_progress(db_session, sha256)
+        await refresh_delta_lags(db_session, lags)
+
+
+def _extend_rep_dt_range(rep_dt_range: RepDtRange, chunk: DeltaBatch) -> RepDtRange:
+    """Extend `rep_dt` range of loaded records with the chunk records."""
+
+    if not len(chunk):
+        return rep_dt_range
+
+    low, high = chunk.rep_dt.min().item(), chunk.rep_dt.max().item()
+    if rep_dt_range is None:
+        return low, high
+
+    return min(rep_dt_range[0], low), max(rep_dt_range[1], high)
+
+
+async def _iter_chunks(
+    batches: Union[Iterable[DeltaBatch], AsyncIterable[DeltaBatch]],
+    chunk_size: int,
+) -> AsyncIterator[DeltaBatch]:
+    """Split batches (sync or async iterable) into chunks of at most `chunk_size` rows."""
+
+    if isinstance(batches, AsyncIterable):
+        async for batch in batches:
+            for start in range(0, len(batch), chunk_size):
+                yield batch[start:start + chunk_size]
+        return
+
+    for batch in batches:
+        for start in range(0, len(batch), chunk_size):
+            yield batch[start:start + chunk_size]
+
+
+async def _load_chunk(
+    db_session: AsyncSession,
+    chunk: DeltaBatch,
+    strategy: str,
+    copy_threshold: int,
+    staging_sha256: Union[str, None] = None,
+    replace_dates: bool = False,
+) -> None:
+    """Загружает часть через `INSERT` или `COPY` (в `deltas_staging`, если задан `staging_sha256`)."""
+
+    use_copy = (
+        strategy == LOAD_STRATEGY_COPY
+        or (strategy == LOAD_STRATEGY_AUTO and len(chunk) >= copy_threshold)
+    )
+    if replace_dates and staging_sha256 is None:
+        # Одна команда `ON CONFLICT` не может изменить строку дважды
+        chunk = chunk.drop_duplicates()
+        if use_copy:
+            await _copy_upsert_delta_batch(db_session, chunk)
+        else:
+            await _upsert_delta_batch(db_session, chunk)
+    elif use_copy:
+        await _copy_delta_batch(db_session, chunk, staging_sha256=staging_sha256)
+    else:
+        await _insert_delta_batch(db_session, chunk, staging_sha256=staging_sha256)
+
+
+async def _count_staged_rows(db_session: AsyncSession, sha256: str) -> int:
+    stmt = select(func.count()).select_from(DeltaStaging).where(DeltaStaging.sha256 == sha256)
+    return await db_session.scalar(stmt)
+
+
+async def _delete_staged_rows(db_session: AsyncSession, sha256: str) -> None:
+    await db_session.execute(
+        text(f"DELETE FROM {DeltaStaging.__tablename__} WHERE sha256 = :sha256"),
+        {"sha256": sha256},
+    )
+
+
+async def _merge_staged_rows(
+    db_session: AsyncSession,
+    sha256: str,
+    replace_dates: bool = False,
+) -> None:
+    """
+    Move staged rows of the file into `deltas` within already started transaction.
+
+    With `replace_dates` the last staged row of each `rep_dt` replaces the loaded one.
+    """
+
+    if replace_dates:
+        stmt = text(
+            f"""
+            INSERT INTO {Delta.__tablename__} (id, rep_dt, delta)
+            SELECT DISTINCT ON (rep_dt) {STAGED_DELTA_ID}, rep_dt, delta
+            FROM {DeltaStaging.__tablename__}
+            WHERE sha256 = :sha256
+            ORDER BY rep_dt, id DESC
+            ON CONFLICT (rep_dt) DO UPDATE SET id = EXCLUDED.id, delta = EXCLUDED.delta
+            """
+        )
+    else:
+        stmt = text(
+            f"""
+            INSERT INTO {Delta.__tablename__} (id, rep_dt, delta)
+            SELECT {STAGED_DELTA_ID}, rep_dt, delta FROM {DeltaStaging.__tablename__}
+            WHERE sha256 = :sha256
+            ORDER BY id
+            """
+        )
+
+    await db_session.execute(stmt, {"sha256": sha256})
+    await _delete_staged_rows(db_session, sha256)
+
+
+async def _insert_delta_batch(
+    db_session: AsyncSession,
+    batch: DeltaBatch,
+    staging_sha256: Union[str, None] = None,
+) -> None:
+    """
+    Insert columnar delta batch within already started transaction
+    (into `deltas_staging` if `staging_sha256` is given).
+    """
+
+    params = _get_batch_params(batch)
+
+    if staging_sha256 is None:
+        stmt = text(
+            f"""
+            INSERT INTO {Delta.__tablename__} (id, rep_dt, delta)
+            SELECT t.id, t.rep_dt, t.delta
+            FROM {UNNEST_BATCH}
+            """
+        )
+    else:
+        stmt = text(
+            f"""
+            INSERT INTO {DeltaStaging.__tablename__} (sha256, delta_id, rep_dt, delta)
+            SELECT :sha256, t.id, t.rep_dt, t.delta
+            FROM {UNNEST_BATCH}
+            """
         )
-        await db_session.execute(stmt)
+        params["sha256"] = staging_sha256
+
+    await db_session.execute(stmt, params)
+
+
+def _get_batch_params(batch: DeltaBatch) -> Dict[str, List[Any]]:
+    return {
+        "id": ids_to_strings(batch.id),
+        "rep_dt": batch.rep_dt.tolist(),
+        "delta": batch.delta.tolist(),
+    }
+
+
+async def _copy_delta_batch(
+    db_session: AsyncSession,
+    batch: DeltaBatch,
+    staging_sha256: Union[str, None] = None,
+) -> None:
+    """
+    Загружает пачку бинарным `COPY` через asyncpg соединение сессии, в ее транзакции
+    (в `deltas_staging`, если задан `staging_sha256`).
+    """
+
+    conn = await db_session.connection()
+    raw_conn = await conn.get_raw_connection()
+
+    records = zip(ids_to_strings(batch.id), batch.rep_dt.tolist(), batch.delta.tolist())
+
+    if staging_sha256 is None:
+        await raw_conn.driver_connection.copy_records_to_table(
+            Delta.__tablename__,
+            records=records,
+            columns=("id", "rep_dt", "delta"),
+        )
+        return
+
+    await raw_conn.driver_connection.copy_records_to_table(
+        DeltaStaging.__tablename__,
+        records=((staging_sha256, *record) for record in records),
+        columns=("sha256", "delta_id", "rep_dt", "delta"),
+    )
+
+
+async def _upsert_delta_batch(
+    db_session: AsyncSession,
+    batch: DeltaBatch,
+) -> None:
+    """
+    Insert columnar delta batch (without duplicate `rep_dt`) replacing records
+    with the same `rep_dt` within already started transaction.
+    """
+
+    await db_session.execute(
+        text(
+            f"""
+            INSERT INTO {Delta.__tablename__} (id, rep_dt, delta)
+            SELECT t.id, t.rep_dt, t.delta
+            FROM {UNNEST_BATCH}
+            ON CONFLICT (rep_dt) DO UPDATE SET id = EXCLUDED.id, delta = EXCLUDED.delta
+            """
+        ),
+        _get_batch_params(batch),
+    )
+
+
+async def _copy_upsert_delta_batch(
+    db_session: AsyncSession,
+    batch: DeltaBatch,
+) -> None:
+    """
+    `COPY` analogue of `_upsert_delta_batch`: batch is copied into a temporary table
+    and upserted into `deltas` from it with a single command.
+    """
+
+    await db_session.execute(text(
+        f"""
+        CREATE TEMPORARY TABLE IF NOT EXISTS {UPSERT_TABLE_NAME} (
+            id uuid NOT NULL,
+            rep_dt date NOT NULL,
+            delta double precision NOT NULL
+        ) ON COMMIT DELETE ROWS
+        """
+    ))
+
+    conn = await db_session.connection()
+    raw_conn = await conn.get_raw_connection()
+    await raw_conn.driver_connection.copy_records_to_table(
+        UPSERT_TABLE_NAME,
+        records=zip(ids_to_strings(batch.id), batch.rep_dt.tolist(), batch.delta.tolist()),
+        columns=("id", "rep_dt", "delta"),
+    )
+
+    await db_session.execute(text(
+        f"""
+        INSERT INTO {Delta.__tablename__} (id, rep_dt, delta)
+        SELECT id, rep_dt, delta FROM {UPSERT_TABLE_NAME}
+        ON CONFLICT (rep_dt) DO UPDATE SET id = EXCLUDED.id, delta = EXCLUDED.delta
+        """
+    ))
+    await db_session.execute(text(f"TRUNCATE {UPSERT_TABLE_NAME}"))
 
 
 async def get_all_delta_data(
@@ -43,27 +521,216 @@ async def get_all_delta_data(
     return res
 
 
-async def get_delta_data_lag_view(
+async def get_all_delta_rows(
     db_session: AsyncSession,
+) -> List[Row[Tuple[uuid.UUID, datetime.date, float]]]:
+    """
+    Возвращает все записи таблицы `deltas` строками `(id, rep_dt, delta)`
+    в порядке `(rep_dt, id)` (см. `DeltaBatch.from_id_rows`).
+    """
+
+    async with db_session.begin():
+        stmt = (
+            select(Delta.id, Delta.rep_dt, Delta.delta)
+            .order_by(Delta.rep_dt.asc(), Delta.id.asc())
+        )
+        data = await db_session.execute(stmt)
+
+        return list(data)
+
+
+async def get_delta_data(
+    db_session: AsyncSession,
+    lag: int = 0,
+    after: Union[DeltaCursor, None] = None,
+    limit: Union[int, None] = None,
+    date_from: Union[datetime.date, None] = None,
+    date_to: Union[datetime.date, None] = None,
 ) -> List[DeltaRecordWithLag]:
     """
-    Возвращает записи представления `deltalag`.
+    Возвращает записи `deltas` с колонкой `DeltaLag`, вычисленной на стороне БД.
+    `after`, `limit` - keyset пагинация по `(rep_dt, id)`, `date_from`, `date_to` - включительный диапазон `rep_dt`.
     """
 
     res = []
 
     async with db_session.begin():
-        stmt = text(
-            f"""
-            SELECT * FROM deltalag;
-            """
+        stmt = _build_delta_lag_query(
+            lag=lag,
+            after=after,
+            limit=limit,
+            date_from=date_from,
+            date_to=date_to,
+            with_id=True,
         )
-
         data = await db_session.execute(stmt)
+        for row in data:
+            res.append(DeltaRecordWithLag(
+                rep_dt=row.rep_dt,
+                delta=row.delta,
+                delta_lag=row.delta_lag,
+                id=row.id))
+
+    return res
+
+
+async def stream_delta_data(
+    db_session: AsyncSession,
+    lag: int = 0,
+    after: Union[DeltaCursor, None] = None,
+    limit: Union[int, None] = None,
+    date_from: Union[datetime.date, None] = None,
+    date_to: Union[datetime.date, None] = None,
+    with_id: bool = False,
+    passes: int = 1,
+    batch_size: int = DEFAULT_STREAM_BATCH_SIZE,
+) -> AsyncIterator[StreamChunk]:
+    """
+    Потоковый аналог `get_delta_data` через серверный курсор: строки `(rep_dt, delta, delta_lag)`
+    (с `with_id` - и `id`) пачками не более `batch_size`.
+    """
+
+    stmt = _build_delta_lag_query(
+        lag=lag,
+        after=after,
+        limit=limit,
+        date_from=date_from,
+        date_to=date_to,
+        with_id=with_id,
+    )
+    async for chunk in _stream_query(db_session, stmt, passes, batch_size):
+        yield chunk
+
+
+def _build_delta_lag_query(
+    lag: int,
+    after: Union[DeltaCursor, None],
+    limit: Union[int, None],
+    date_from: Union[datetime.date, None],
+    date_to: Union[datetime.date, None],
+    with_id: bool = False,
+) -> Select:
+    """Собирает запрос записей `deltas` с лагом, читающий только возвращаемые строки и `lag` следующих."""
+
+    window = select(
+        Delta.id,
+        Delta.rep_dt,
+        Delta.delta,
+        func.lag(Delta.delta, -lag).over(order_by=(Delta.rep_dt, Delta.id)).label("delta_lag"),
+    )
+    if after is not None:
+        window = window.where(_build_after_condition(after))
+    if date_from is not None:
+        window = window.where(Delta.rep_dt >= date_from)
+    if date_to is not None:
+        window = window.where(Delta.rep_dt <= _get_window_upper_bound(date_to, lag))
+    window = window.subquery("w")
+
+    columns = [window.c.rep_dt, window.c.delta, window.c.delta_lag]
+    if with_id:
+        columns.append(window.c.id)
+    stmt = select(*columns).order_by(window.c.rep_dt.asc(), window.c.id.asc())
+    if date_to is not None:
+        stmt = stmt.where(window.c.rep_dt <= date_to)
+    if limit is not None:
+        stmt = stmt.limit(limit)
+
+    return stmt
+
+
+def _build_after_condition(after: DeltaCursor) -> ColumnElement:
+    """Условие записей строго после курсора `after` в порядке `(rep_dt, id)`."""
+
+    if after.id is None:
+        return Delta.rep_dt > after.rep_dt
+
+    # Отдельное условие по `rep_dt` - для поиска по индексу `rep_dt`
+    return and_(
+        Delta.rep_dt >= after.rep_dt,
+        tuple_(Delta.rep_dt, Delta.id) > tuple_(
+            literal(after.rep_dt, Date), literal(after.id, Uuid)),
+    )
+
+
+def _get_window_upper_bound(date_to: datetime.date, lag: int) -> ColumnElement:
+    """Возвращает `rep_dt` записи, отстоящей на `lag` записей после `date_to`."""
+
+    if lag == 0:
+        return literal(date_to, Date)
+
+    following = (
+        select(Delta.rep_dt)
+        .where(Delta.rep_dt > date_to)
+        .order_by(Delta.rep_dt.asc())
+        .offset(lag - 1)
+        .limit(1)
+        .scalar_subquery()
+    )
+
+    # Если после `date_to` меньше `lag` записей - окно ограничено концом таблицы
+    return func.coalesce(following, cast(literal("infinity"), Date))
+
+
+async def get_delta_data_lag_view(
+    db_session: AsyncSession,
+    lag: int = DEFAULT_LAG_VIEW_LAGS[0],
+) -> List[DeltaRecordWithLag]:
+    """Возвращает записи `deltas` с материализованной колонкой `DeltaLag` для лага `lag` (таблица `delta_lags`)."""
+
+    res = []
+
+    async with db_session.begin():
+        data = await db_session.execute(_build_lag_view_query(lag))
         for row in data:
             res.append(DeltaRecordWithLag(
                 rep_dt=row[0],
                 delta=row[1],
-                delta_lag=row[2]))
+                delta_lag=row[2],
+                id=row[3]))
 
     return res
+
+
+async def stream_delta_data_lag_view(
+    db_session: AsyncSession,
+    lag: int = DEFAULT_LAG_VIEW_LAGS[0],
+    passes: int = 1,
+    batch_size: int = DEFAULT_STREAM_BATCH_SIZE,
+) -> AsyncIterator[StreamChunk]:
+    """Потоковый аналог `get_delta_data_lag_view` через серверный курсор, пачками не более `batch_size`."""
+
+    stmt = _build_lag_view_query(lag)
+    async for chunk in _stream_query(db_session, stmt, passes, batch_size):
+        yield chunk
+
+
+def _build_lag_view_query(lag: int) -> Select:
+    """Собирает запрос материализованного лага - чтение по первичному ключу `delta_lags`."""
+
+    return (
+        select(DeltaLag.rep_dt, DeltaLag.delta, DeltaLag.delta_lag, DeltaLag.delta_id)
+        .where(DeltaLag.lag == lag)
+        .order_by(DeltaLag.rep_dt.asc(), DeltaLag.delta_id.asc())
+    )
+
+
+async def _stream_query(
+    db_session: AsyncSession,
+    stmt: Executable,
+    passes: int,
+    batch_size: int,
+) -> AsyncIterator[StreamChunk]:
+    """
+    Читает результат запроса серверным курсором `passes` раз подряд
+    в одной `REPEATABLE READ` транзакции (поколоночная сериализация без буферизации).
+    """
+
+    async with db_session.begin():
+        if passes > 1:
+            await db_session.connection(
+                execution_options={"isolation_level": "REPEATABLE READ"})
+
+        for pass_num in range(passes):
+            result = await db_session.stream(stmt)
+            async for partition in result.partitions(batch_size):
+                yield pass_num, partition
@@ -0,0 +1,211 @@
+import datetime
+from typing import Sequence, List, Union, Dict, Any
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, func
+from sqlalchemy.sql import text
+
+from models.db.tables import Delta, DeltaLag
+
+
+# Лаги, материализуемые по умолчанию (лаг бывшего представления `deltalag`)
+DEFAULT_LAG_VIEW_LAGS = (2,)
+
+# Ключ advisory lock-а, сериализующего обновления `delta_lags`
+DELTA_LAGS_LOCK_KEY = "delta_lags"
+
+
+def validate_lags(lags: Sequence[int]) -> None:
+    """Проверяет набор материализуемых лагов."""
+
+    if not lags:
+        raise ValueError("At least one lag must be materialized")
+    if any(lag < 0 for lag in lags):
+        raise ValueError("Lags must be non-negative")
+
+
+async def sync_delta_lags(
+    db_session: AsyncSession,
+    lags: Sequence[int],
+) -> List[int]:
+    """
+    Приводит `delta_lags` к набору лагов `lags`.
+
+    Удаляет значения лагов не из набора и полностью материализует лаги набора,
+    которых еще нет в таблице. Возвращает материализованные лаги.
+    """
+
+    validate_lags(lags)
+    lags = sorted(set(lags))
+
+    async with db_session.begin():
+        await _lock_delta_lags(db_session)
+
+        await db_session.execute(
+            text(
+                f"""
+                DELETE FROM {DeltaLag.__tablename__}
+                WHERE lag <> ALL(CAST(:lags AS integer[]))
+                """
+            ),
+            {"lags": lags},
+        )
+
+        missing = []
+        for lag in lags:
+            stmt = select(func.count()).select_from(
+                select(DeltaLag.lag).where(DeltaLag.lag == lag).limit(1).subquery())
+            if not await db_session.scalar(stmt):
+                missing.append(lag)
+
+        if missing:
+            await _rebuild_delta_lags(db_session, missing, lower_bound=None, date_to=None)
+
+    return missing
+
+
+async def refresh_delta_lags(
+    db_session: AsyncSession,
+    lags: Sequence[int],
+    date_from: Union[datetime.date, None] = None,
+    date_to: Union[datetime.date, None] = None,
+) -> None:
+    """
+    Пересчитывает материализованные лаги `lags` после изменения записей `deltas`
+    с `rep_dt` в диапазоне `[date_from, date_to]` в уже начатой транзакции.
+
+    Кроме самого диапазона пересчитываются `max(lags)` записей перед ним -
+    их `DeltaLag` ссылаются на записи диапазона. Записи после диапазона не меняются:
+    лаг смотрит только вперед. Без границ пересчитывается вся таблица.
+    Обновления сериализуются транзакционным advisory lock-ом, поэтому
+    параллельные загрузки видят записи друг друга.
+    """
+
+    if not lags:
+        return
+
+    await _lock_delta_lags(db_session)
+
+    # Меньше `max(lags)` записей перед диапазоном - пересчет с начала таблицы
+    lower_bound = None
+    if date_from is not None:
+        lower_bound = await _get_preceding_rep_dt(db_session, date_from, max(lags))
+
+    await _rebuild_delta_lags(db_session, lags, lower_bound=lower_bound, date_to=date_to)
+
+
+async def _lock_delta_lags(db_session: AsyncSession) -> None:
+    await db_session.execute(
+        text("SELECT pg_advisory_xact_lock(hashtext(:key))"), {"key": DELTA_LAGS_LOCK_KEY})
+
+
+async def _get_preceding_rep_dt(
+    db_session: AsyncSession,
+    rep_dt: datetime.date,
+    count: int,
+) -> Union[datetime.date, None]:
+    """Возвращает `rep_dt` записи, отстоящей на `count` записей перед `rep_dt`."""
+
+    if count == 0:
+        return rep_dt
+
+    stmt = (
+        select(Delta.rep_dt)
+        .where(Delta.rep_dt < rep_dt)
+        .order_by(Delta.rep_dt.desc())
+        .offset(count - 1)
+        .limit(1)
+    )
+
+    return await db_session.scalar(stmt)
+
+
+async def _get_following_rep_dt(
+    db_session: AsyncSession,
+    rep_dt: datetime.date,
+    count: int,
+) -> Union[datetime.date, None]:
+    """Возвращает `rep_dt` записи, отстоящей на `count` записей после `rep_dt`."""
+
+    if count == 0:
+        return rep_dt
+
+    stmt = (
+        select(Delta.rep_dt)
+        .where(Delta.rep_dt > rep_dt)
+        .order_by(Delta.rep_dt.asc())
+        .offset(count - 1)
+        .limit(1)
+    )
+
+    return await db_session.scalar(stmt)
+
+
+async def _rebuild_delta_lags(
+    db_session: AsyncSession,
+    lags: Sequence[int],
+    lower_bound: Union[datetime.date, None],
+    date_to: Union[datetime.date, None],
+) -> None:
+    """
+    Заменяет значения лагов `lags` записей с `rep_dt` в `[lower_bound, date_to]`
+    (`None` - без границы) значениями, вычисленными одним проходом оконных функций.
+    """
+
+    lags = sorted(set(int(lag) for lag in lags))
+    bounds = {"lower_bound": lower_bound, "date_to": date_to}
+
+    conditions = ["lag = ANY(CAST(:lags AS integer[]))"]
+    window_conditions = ["TRUE"]
+    row_conditions = ["TRUE"]
+    if lower_bound is not None:
+        conditions.append("rep_dt >= :lower_bound")
+        window_conditions.append("rep_dt >= :lower_bound")
+    if date_to is not None:
+        conditions.append("rep_dt <= :date_to")
+        row_conditions.append("w.rep_dt <= :date_to")
+        # Окно расширяется на `max(lags)` записей после диапазона
+        bounds["window_upper_bound"] = await _get_following_rep_dt(
+            db_session, date_to, max(lags))
+        if bounds["window_upper_bound"] is not None:
+            window_conditions.append("rep_dt <= :window_upper_bound")
+
+    await db_session.execute(
+        text(
+            f"""
+            DELETE FROM {DeltaLag.__tablename__}
+            WHERE {" AND ".join(conditions)}
+            """
+        ),
+        _select_params(conditions, lags=lags, **bounds),
+    )
+
+    lag_columns = ", ".join(
+        f"LAG(delta, -{lag}) OVER (ORDER BY rep_dt, id) AS lag_{lag}" for lag in lags)
+    lag_values = ", ".join(f"({lag}, w.lag_{lag})" for lag in lags)
+
+    await db_session.execute(
+        text(
+            f"""
+            INSERT INTO {DeltaLag.__tablename__} (lag, rep_dt, delta_id, delta, delta_lag)
+            SELECT l.lag, w.rep_dt, w.id, w.delta, l.delta_lag
+            FROM (
+                SELECT id, rep_dt, delta, {lag_columns}
+                FROM {Delta.__tablename__}
+                WHERE {" AND ".join(window_conditions)}
+            ) AS w
+            CROSS JOIN LATERAL (VALUES {lag_values}) AS l(lag, delta_lag)
+            WHERE {" AND ".join(row_conditions)}
+            """
+        ),
+        _select_params(window_conditions + row_conditions, **bounds),
+    )
+
+
+def _select_params(conditions: Sequence[str], **params: Any) -> Dict[str, Any]:
+    """Оставляет параметры, используемые в условиях `conditions`."""
+
+    return {
+        key: value for key, value in params.items()
+        if any(f":{key}" in condition for condition in conditions)
+    }
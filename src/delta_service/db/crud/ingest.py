@@ -0,0 +1,121 @@
+from typing import Union
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, update, delete, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from models.db.tables import IngestedFile, IngestProgress
+from models.db.entities import IngestedFileRecord
+
+
+class FileAlreadyIngestedError(Exception):
+    """Файл с таким же содержимым уже загружен в БД."""
+
+
+async def is_file_ingested(
+    db_session: AsyncSession,
+    sha256: str,
+) -> bool:
+    """Проверяет, есть ли файл с хэшем `sha256` в журнале загруженных файлов."""
+
+    async with db_session.begin():
+        found = await _select_ingested_file(db_session, sha256)
+
+    return found is not None
+
+
+async def ensure_file_not_ingested(
+    db_session: AsyncSession,
+    sha256: str,
+) -> None:
+    """
+    Проверяет журнал загруженных файлов в уже начатой транзакции.
+
+    Вызывает `FileAlreadyIngestedError`, если файл с хэшем `sha256` уже загружен.
+    """
+
+    if await _select_ingested_file(db_session, sha256) is not None:
+        raise FileAlreadyIngestedError(f"File with sha256 {sha256} is already ingested")
+
+
+async def _select_ingested_file(
+    db_session: AsyncSession,
+    sha256: str,
+) -> Union[str, None]:
+    stmt = select(IngestedFile.sha256).where(IngestedFile.sha256 == sha256)
+    return await db_session.scalar(stmt)
+
+
+async def insert_ingested_file(
+    db_session: AsyncSession,
+    record: IngestedFileRecord,
+) -> None:
+    """
+    Добавляет файл в журнал загруженных файлов в уже начатой транзакции.
+
+    Вызывает `FileAlreadyIngestedError`, если файл с тем же хэшем
+    уже загружен (в т.ч. параллельно другой транзакцией), что откатывает загрузку.
+    """
+
+    stmt = (
+        pg_insert(IngestedFile)
+        .values(sha256=record.sha256, file_name=record.file_name, rows=record.rows)
+        .on_conflict_do_nothing(index_elements=[IngestedFile.sha256])
+        .returning(IngestedFile.sha256)
+    )
+    inserted = await db_session.scalar(stmt)
+
+    if inserted is None:
+        raise FileAlreadyIngestedError(
+            f"File \"{record.file_name}\" (sha256 {record.sha256}) is already ingested")
+
+
+async def lock_ingest_progress(
+    db_session: AsyncSession,
+    sha256: str,
+    file_name: str,
+) -> int:
+    """
+    Блокирует (до конца уже начатой транзакции) запись о прогрессе загрузки
+    файла по частям, создавая ее при отсутствии.
+
+    Возвращает кол-во уже закоммиченных строк файла.
+    Блокировка упорядочивает параллельные загрузки файлов с одинаковым содержимым.
+    """
+
+    await db_session.execute(
+        pg_insert(IngestProgress)
+        .values(sha256=sha256, file_name=file_name)
+        .on_conflict_do_nothing(index_elements=[IngestProgress.sha256])
+    )
+
+    stmt = (
+        select(IngestProgress.committed_rows)
+        .where(IngestProgress.sha256 == sha256)
+        .with_for_update()
+    )
+    return await db_session.scalar(stmt)
+
+
+async def set_ingest_progress(
+    db_session: AsyncSession,
+    sha256: str,
+    committed_rows: int,
+) -> None:
+    """Обновляет кол-во закоммиченных строк файла в уже начатой транзакции."""
+
+    await db_session.execute(
+        update(IngestProgress)
+        .where(IngestProgress.sha256 == sha256)
+        .values(committed_rows=committed_rows, updated_at=func.now())
+    )
+
+
+async def delete_ingest_progress(
+    db_session: AsyncSession,
+    sha256: str,
+) -> None:
+    """Удаляет запись о прогрессе загрузки файла в уже начатой транзакции."""
+
+    await db_session.execute(
+        delete(IngestProgress).where(IngestProgress.sha256 == sha256))
@@ -0,0 +1,106 @@
+import datetime
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, delete, func, or_, case
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.sql import text
+
+from models.db.tables import IngestLease
+
+
+# Префикс ключа advisory lock-а, сериализующего перехват файлов обработчика
+INGEST_LEASE_LOCK_PREFIX = "ingest_lease:"
+
+
+async def acquire_ingest_lease(
+    db_session: AsyncSession,
+    worker_id: str,
+    instance_id: str,
+    ttl_sec: float,
+) -> bool:
+    """
+    Захватывает или продлевает на `ttl_sec` сек. аренду обработчика `worker_id`
+    экземпляром сервиса `instance_id`.
+
+    Возвращает `False`, если аренда `worker_id` действует и принадлежит другому экземпляру.
+    """
+
+    stmt = pg_insert(IngestLease).values(
+        worker_id=worker_id,
+        instance_id=instance_id,
+        expires_at=func.now() + datetime.timedelta(seconds=ttl_sec),
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[IngestLease.worker_id],
+        set_={
+            "instance_id": stmt.excluded.instance_id,
+            "expires_at": stmt.excluded.expires_at,
+            "acquired_at": case(
+                (IngestLease.instance_id == stmt.excluded.instance_id, IngestLease.acquired_at),
+                else_=func.now(),
+            ),
+        },
+        where=or_(
+            IngestLease.instance_id == stmt.excluded.instance_id,
+            IngestLease.expires_at < func.now(),
+        ),
+    ).returning(IngestLease.worker_id)
+
+    async with db_session.begin():
+        acquired = await db_session.scalar(stmt)
+
+    return acquired is not None
+
+
+async def release_ingest_lease(
+    db_session: AsyncSession,
+    worker_id: str,
+    instance_id: str,
+) -> None:
+    """Освобождает аренду обработчика `worker_id`, если она принадлежит `instance_id`."""
+
+    async with db_session.begin():
+        await db_session.execute(
+            delete(IngestLease).where(
+                IngestLease.worker_id == worker_id,
+                IngestLease.instance_id == instance_id,
+            )
+        )
+
+
+async def lock_expired_ingest_lease(
+    db_session: AsyncSession,
+    worker_id: str,
+) -> bool:
+    """
+    Блокирует (до конца уже начатой транзакции) истекшую аренду обработчика `worker_id`
+    для перехвата его файлов. Отсутствующая аренда считается истекшей.
+
+    Возвращает `False`, если аренда действует или ее уже перехватывает другой обработчик.
+    Пока транзакция не завершена, аренда не может быть продлена.
+    """
+
+    locked = await db_session.scalar(
+        text("SELECT pg_try_advisory_xact_lock(hashtext(:key))"),
+        {"key": f"{INGEST_LEASE_LOCK_PREFIX}{worker_id}"},
+    )
+    if not locked:
+        return False
+
+    stmt = (
+        select(IngestLease.expires_at >= func.now())
+        .where(IngestLease.worker_id == worker_id)
+        .with_for_update()
+    )
+    active = await db_session.scalar(stmt)
+
+    return not active
+
+
+async def delete_ingest_lease(
+    db_session: AsyncSession,
+    worker_id: str,
+) -> None:
+    """Удаляет аренду обработчика `worker_id` в уже начатой транзакции."""
+
+    await db_session.execute(delete(IngestLease).where(IngestLease.worker_id == worker_id))
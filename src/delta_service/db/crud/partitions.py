@@ -0,0 +1,138 @@
+import datetime
+from typing import List, Iterator, Tuple
+
+from loguru import logger
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import text
+
+from models.db.tables import Delta
+
+
+# Партиция `deltas` для `rep_dt` вне помесячных партиций
+DEFAULT_PARTITION_NAME = f"{Delta.__tablename__}_default"
+
+
+def get_partition_name(month: datetime.date) -> str:
+    """Возвращает имя помесячной партиции `deltas` (например, `deltas_y2023m12`)."""
+
+    return f"{Delta.__tablename__}_y{month.year:04d}m{month.month:02d}"
+
+
+def add_months(month: datetime.date, count: int) -> datetime.date:
+    """Возвращает первое число месяца, отстоящего на `count` месяцев от `month`."""
+
+    index = month.year * 12 + month.month - 1 + count
+    return datetime.date(index // 12, index % 12 + 1, 1)
+
+
+def iter_months(
+    date_from: datetime.date,
+    date_to: datetime.date,
+) -> Iterator[Tuple[datetime.date, datetime.date]]:
+    """Отдает границы `[начало, начало следующего)` месяцев, пересекающих `[date_from, date_to]`."""
+
+    month = date_from.replace(day=1)
+    while month <= date_to:
+        next_month = add_months(month, 1)
+        yield month, next_month
+        month = next_month
+
+
+async def is_deltas_partitioned(db_session: AsyncSession) -> bool:
+    """Проверяет, секционирована ли таблица `deltas` (миграция `4e8b1d7c2a69`)."""
+
+    stmt = text(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table"
+        " WHERE partrelid = to_regclass(:table))"
+    )
+
+    return await db_session.scalar(stmt, {"table": Delta.__tablename__})
+
+
+async def ensure_delta_partitions(
+    db_session: AsyncSession,
+    date_from: datetime.date,
+    date_to: datetime.date,
+) -> List[str]:
+    """
+    Создает недостающие помесячные партиции `deltas` для `[date_from, date_to]`.
+
+    Если таблица не секционирована (миграция не применена) - ничего не делает. Записи месяца,
+    уже попавшие в партицию по умолчанию, переносятся в созданную партицию (`deltas` на время
+    переноса блокируется и для чтения). Возвращает имена созданных партиций.
+    """
+
+    created = []
+
+    async with db_session.begin():
+        if not await is_deltas_partitioned(db_session):
+            return created
+
+        for start, end in iter_months(date_from, date_to):
+            name = get_partition_name(start)
+            exists = await db_session.scalar(
+                text("SELECT to_regclass(:name) IS NOT NULL"), {"name": name})
+            if exists:
+                continue
+
+            in_default = await db_session.scalar(
+                text(
+                    f"""
+                    SELECT EXISTS (
+                        SELECT 1 FROM {DEFAULT_PARTITION_NAME}
+                        WHERE rep_dt >= :start AND rep_dt < :end
+                    )
+                    """
+                ),
+                {"start": start, "end": end},
+            )
+            # Партиция месяца не создается, пока его записи в партиции по умолчанию
+            if in_default:
+                await db_session.execute(text(
+                    f"ALTER TABLE {Delta.__tablename__} DETACH PARTITION {DEFAULT_PARTITION_NAME}"))
+
+            await db_session.execute(text(
+                f"CREATE TABLE {name} PARTITION OF {Delta.__tablename__}"
+                f" FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+            ))
+            created.append(name)
+
+            if in_default:
+                moved = await _move_default_records(db_session, name, start, end)
+                await db_session.execute(text(
+                    f"ALTER TABLE {Delta.__tablename__}"
+                    f" ATTACH PARTITION {DEFAULT_PARTITION_NAME} DEFAULT"
+                ))
+                logger.info(
+                    f"Moved {moved} records for {start:%Y-%m}"
+                    f" from \"{DEFAULT_PARTITION_NAME}\" to \"{name}\""
+                )
+
+    return created
+
+
+async def _move_default_records(
+    db_session: AsyncSession,
+    name: str,
+    start: datetime.date,
+    end: datetime.date,
+) -> int:
+    """Переносит записи `[start, end)` из отсоединенной партиции по умолчанию в партицию `name`."""
+
+    params = {"start": start, "end": end}
+    await db_session.execute(
+        text(
+            f"""
+            INSERT INTO {name} (id, rep_dt, delta)
+            SELECT id, rep_dt, delta FROM {DEFAULT_PARTITION_NAME}
+            WHERE rep_dt >= :start AND rep_dt < :end
+            """
+        ),
+        params,
+    )
+    result = await db_session.execute(
+        text(f"DELETE FROM {DEFAULT_PARTITION_NAME} WHERE rep_dt >= :start AND rep_dt < :end"),
+        params,
+    )
+
+    return result.rowcount
@@ -0,0 +1,143 @@
+import asyncio
+from concurrent.futures import Future
+from dataclasses import dataclass, field, replace
+from typing import Callable, List, Union
+
+from loguru import logger
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from db.crud.delta import get_all_delta_rows
+from db.events import DatabaseLoop, create_database_engine, get_session_factory
+from models.db.entities import DeltaBatch
+from settings.settings import DatabaseSettings
+from util.retry import get_backoff_delay
+from util.series_index import DeltaSeriesIndex
+
+
+# Кол-во попыток загрузки, если индекс изменился во время чтения данных из БД
+RELOAD_ATTEMPTS = 3
+RELOAD_RETRY_BASE_DELAY_SEC = 1.0
+RELOAD_RETRY_MAX_DELAY_SEC = 30.0
+
+
+@dataclass
+class DeltaIndexLoader:
+    """
+    Загружает индекс `index` из таблицы `deltas` (`get_all_delta_rows`).
+
+    Работает в своем `DatabaseLoop` с отдельным движком: загружает индекс при старте,
+    по запросу (`request_reload`) и, если задан `reconcile_sec`, периодически -
+    для сверки с БД (данные, загруженные другими экземплярами сервиса и т.п.).
+    После каждой загрузки вызывает `on_reload` (из потока загрузчика).
+    `replace_dates` - загруженные записи заменяют записи индекса с тем же `rep_dt`
+    (режим загрузки `replace`).
+    """
+
+    db_settings: DatabaseSettings
+    index: DeltaSeriesIndex
+    reconcile_sec: float = 0
+    on_reload: Union[Callable[[], None], None] = None
+    replace_dates: bool = False
+
+    _loop: Union[DatabaseLoop, None] = None
+    _future: Union[Future, None] = None
+    _stop_event: asyncio.Event = field(default_factory=asyncio.Event)
+    _reload_event: asyncio.Event = field(default_factory=asyncio.Event)
+
+    def start(self) -> None:
+        if self._loop is not None:
+            return
+
+        self._stop_event = asyncio.Event()
+        self._reload_event = asyncio.Event()
+        self._loop = DatabaseLoop()
+        self._loop.start()
+        self._future = asyncio.run_coroutine_threadsafe(self._run(), self._loop.loop)
+
+    def stop(self) -> None:
+        """Прерывает загрузку и ожидает завершения потока загрузчика."""
+
+        if self._loop is None:
+            return
+
+        self._loop.loop.call_soon_threadsafe(self._stop_event.set)
+        self._future.result()
+        self._loop.stop()
+        self._loop, self._future = None, None
+
+    def request_reload(self) -> None:
+        """
+        Помечает индекс неготовым (до загрузки читатели обращаются к БД)
+        и запрашивает его загрузку.
+        """
+
+        self.index.invalidate()
+        if self._loop is not None:
+            self._loop.loop.call_soon_threadsafe(self._reload_event.set)
+
+    def apply(self, batches: Union[List[DeltaBatch], None]) -> None:
+        """
+        Применяет к индексу загруженные в БД пачки записей.
+
+        `None` - данные в БД изменились неизвестным образом, индекс загружается заново.
+        """
+
+        if batches is None:
+            self.request_reload()
+        else:
+            self.index.add(batches, replace_dates=self.replace_dates)
+
+    async def _run(self) -> None:
+        # Загрузка выполняется редко и не должна занимать соединения пула
+        engine = create_database_engine(
+            replace(self.db_settings, ENGINE=None, LOOP=None, POOL_ENABLED=False))
+        attempt = 0
+
+        try:
+            while not self._stop_event.is_set():
+                try:
+                    await self._reload(engine)
+                    attempt = 0
+                    timeout = self.reconcile_sec or None
+                except Exception as e:
+                    attempt += 1
+                    timeout = get_backoff_delay(
+                        attempt, RELOAD_RETRY_BASE_DELAY_SEC, RELOAD_RETRY_MAX_DELAY_SEC)
+                    logger.error(
+                        f"Error occured while loading delta index: \"{e}\","
+                        f" retrying in {timeout:.1f} sec"
+                    )
+                await self._wait(timeout)
+        finally:
+            await engine.dispose()
+
+    async def _reload(self, engine: AsyncEngine) -> None:
+        for _ in range(RELOAD_ATTEMPTS):
+            self._reload_event.clear()
+            generation = self.index.generation
+
+            async with get_session_factory(engine)() as db_session:
+                rows = await get_all_delta_rows(db_session=db_session)
+            batch = await asyncio.to_thread(DeltaBatch.from_id_rows, rows)
+
+            if self.index.replace([batch], generation=generation):
+                logger.info(f"Delta index loaded: {len(batch)} records")
+                if self.on_reload is not None:
+                    self.on_reload()
+                return
+
+        raise RuntimeError(
+            f"index was modified during each of {RELOAD_ATTEMPTS} load attempts")
+
+    async def _wait(self, timeout: Union[float, None]) -> None:
+        """Ожидает остановки, запроса загрузки или истечения `timeout`."""
+
+        waiters = [
+            asyncio.ensure_future(self._stop_event.wait()),
+            asyncio.ensure_future(self._reload_event.wait()),
+        ]
+        try:
+            await asyncio.wait(waiters, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for waiter in waiters:
+                waiter.cancel()
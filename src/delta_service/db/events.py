@@ -1,34 +1,293 @@
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, AsyncEngine
-from sqlalchemy.orm import sessionmaker
+import asyncio
+import threading
+from dataclasses import dataclass, field
+from typing import (
+    Dict,
+    Union,
+    Coroutine,
+    Any,
+    TypeVar,
+    Callable,
+    Awaitable,
+    AsyncIterator,
+    Iterator,
+)
+
+from sqlalchemy.ext.asyncio import (
+    create_async_engine,
+    async_sessionmaker,
+    AsyncSession,
+    AsyncEngine,
+)
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy.pool import NullPool
 
-from settings.settings import Settings
+from settings.settings import Settings, DatabaseSettings
+
+
+T = TypeVar("T")
+
+# SQLSTATE ошибок недоступности БД: класс `08` (connection exception)
+# и `57P03` (cannot_connect_now - сервер запускается или восстанавливается)
+CONNECTION_SQLSTATE_CLASS = "08"
+CANNOT_CONNECT_NOW_SQLSTATE = "57P03"
+
+# Фабрики сессий, по одной на каждый движок
+_session_factories: Dict[AsyncEngine, async_sessionmaker] = {}
+_session_factories_lock = threading.Lock()
+
+
+@dataclass
+class DatabaseLoop:
+    """
+    Долгоживущий asyncio event loop в отдельном потоке.
+
+    Соединения asyncpg привязаны к event loop-у, в котором были созданы,
+    а Flask создает новый event loop на каждый асинхронный запрос.
+    Поэтому вся работа с пулом соединений на стороне Flask выполняется здесь.
+    """
+
+    loop: asyncio.AbstractEventLoop = field(default_factory=asyncio.new_event_loop)
+    _thread: Union[threading.Thread, None] = None
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+
+        self._thread = threading.Thread(
+            target=self._run, name="database-loop", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Останавливает event loop и ожидает завершения потока."""
+
+        if self._thread is None:
+            return
+
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+        self._thread = None
+        self.loop.close()
+
+    async def run(self, coro: Coroutine[Any, Any, T]) -> T:
+        """Выполняет корутину в этом event loop-е и ожидает результат из текущего."""
+
+        if asyncio.get_running_loop() is self.loop:
+            return await coro
+
+        return await asyncio.wrap_future(
+            asyncio.run_coroutine_threadsafe(coro, self.loop))
+
+    def run_sync(self, coro: Coroutine[Any, Any, T]) -> T:
+        """Выполняет корутину в этом event loop-е, блокируя вызывающий поток."""
+
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    def _run(self) -> None:
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+
+def create_database_engine(db_settings: DatabaseSettings) -> AsyncEngine:
+    """
+    Создает асинхронный движок БД.
+
+    Пул соединений движка должен использоваться только в одном event loop-е,
+    поэтому каждому потребителю со своим event loop-ом нужен свой движок.
+    При выключенном пуле соединения открываются на каждую сессию (`NullPool`).
+    """
+
+    if not db_settings.POOL_ENABLED:
+        return create_async_engine(
+            db_settings.CONN_STR,
+            poolclass=NullPool,  # https://docs.sqlalchemy.org/en/20/orm/extensions/asyncio.html#using-multiple-asyncio-event-loops
+        )
+
+    return create_async_engine(
+        db_settings.CONN_STR,
+        pool_size=db_settings.POOL_SIZE,
+        max_overflow=db_settings.POOL_MAX_OVERFLOW,
+        pool_recycle=db_settings.POOL_RECYCLE_SEC,
+        pool_timeout=db_settings.POOL_TIMEOUT_SEC,
+        pool_pre_ping=True,
+    )
 
 
 def connect_to_database(settigns: Settings) -> None:
     """
     Логика подключения к БД.
-    
-    Подключается к базе данных (создает асинхронный движок) 
+
+    Подключается к базе данных (создает асинхронный движок)
     и сохраняет подключение в `settings`.
+    При включенном пуле соединений также запускает `DatabaseLoop`,
+    в котором выполняются запросы к БД со стороны Flask.
     """
 
-    # TODO try to change for scoped session
-    settigns.DB.ENGINE = create_async_engine(
-        settigns.DB.CONN_STR,
-        poolclass=NullPool,  # https://docs.sqlalchemy.org/en/20/orm/extensions/asyncio.html#using-multiple-asyncio-event-loops
-    )
+    settigns.DB.ENGINE = create_database_engine(settigns.DB)
+
+    if settigns.DB.POOL_ENABLED:
+        settigns.DB.LOOP = DatabaseLoop()
+        settigns.DB.LOOP.start()
+
+
+def disconnect_from_database(settigns: Settings) -> None:
+    """Закрывает соединения пула и останавливает `DatabaseLoop`."""
+
+    engine, db_loop = settigns.DB.ENGINE, settigns.DB.LOOP
+    settigns.DB.ENGINE, settigns.DB.LOOP = None, None
+
+    if engine is not None:
+        if db_loop is not None:
+            db_loop.run_sync(engine.dispose())
+        else:
+            asyncio.run(engine.dispose())
+        _forget_session_factory(engine)
+
+    if db_loop is not None:
+        db_loop.stop()
+
+
+def connect_to_database_in_loop(settigns: Settings) -> None:
+    """
+    Подключается к БД из уже работающего event loop-а (ASGI сервера).
+
+    Вместо отдельного `DatabaseLoop` запросы к БД выполняются в этом event loop-е:
+    `DatabaseLoop` только оборачивает его и не запускает своего потока.
+    """
+
+    settigns.DB.ENGINE = create_database_engine(settigns.DB)
+    settigns.DB.LOOP = DatabaseLoop(loop=asyncio.get_running_loop())
+
+
+async def disconnect_from_database_in_loop(settigns: Settings) -> None:
+    """Закрывает соединения пула, созданного `connect_to_database_in_loop`."""
+
+    engine = settigns.DB.ENGINE
+    settigns.DB.ENGINE, settigns.DB.LOOP = None, None
+
+    if engine is not None:
+        await engine.dispose()
+        _forget_session_factory(engine)
+
+
+async def run_in_database_loop(
+    db_settings: DatabaseSettings,
+    coro: Coroutine[Any, Any, T],
+) -> T:
+    """
+    Выполняет корутину работы с БД в event loop-е, которому принадлежит пул.
+
+    Без `DatabaseLoop` (пул выключен) корутина выполняется в текущем event loop-е.
+    """
+
+    if db_settings.LOOP is None:
+        return await coro
+
+    return await db_settings.LOOP.run(coro)
+
+
+async def run_with_database_session(
+    db_settings: DatabaseSettings,
+    func: Callable[..., Awaitable[T]],
+    **kwargs: Any,
+) -> T:
+    """
+    Вызывает CRUD функцию `func` с новой сессией БД в event loop-е пула.
+
+    Сессия передается в `func` именованным аргументом `db_session`.
+    """
+
+    async def _run() -> T:
+        async with get_session_factory(db_settings.ENGINE)() as db_session:
+            return await func(db_session=db_session, **kwargs)
+
+    return await run_in_database_loop(db_settings, _run())
+
+
+def iter_with_database_session(
+    db_settings: DatabaseSettings,
+    func: Callable[..., AsyncIterator[T]],
+    **kwargs: Any,
+) -> Iterator[T]:
+    """
+    Синхронный итератор по асинхронному генератору CRUD функции `func`.
+
+    Генератор выполняется в event loop-е пула (без `DatabaseLoop` - во временном),
+    что позволяет отдавать результат потоково из синхронного кода (тела ответа WSGI).
+    Сессия и курсор закрываются при исчерпании или закрытии итератора.
+    """
+
+    async def _stream() -> AsyncIterator[T]:
+        async with get_session_factory(db_settings.ENGINE)() as db_session:
+            async for item in func(db_session=db_session, **kwargs):
+                yield item
+
+    db_loop, own_loop = db_settings.LOOP, db_settings.LOOP is None
+    if own_loop:
+        db_loop = DatabaseLoop()
+        db_loop.start()
+
+    stream = _stream()
+    try:
+        while True:
+            try:
+                item = db_loop.run_sync(stream.__anext__())
+            except StopAsyncIteration:
+                return
+            yield item
+    finally:
+        db_loop.run_sync(stream.aclose())
+        if own_loop:
+            db_loop.stop()
+
+
+def is_connection_error(error: BaseException) -> bool:
+    """
+    Проверяет, вызвана ли ошибка недоступностью БД (обращение можно повторить):
+    `ConnectionError`, разорванное соединение (`DBAPIError.connection_invalidated`)
+    или SQLSTATE класса `08` и `57P03` (в т.ч. у исходной ошибки драйвера).
+    """
+
+    while error is not None:
+        if isinstance(error, ConnectionError):
+            return True
+        if isinstance(error, DBAPIError) and error.connection_invalidated:
+            return True
+
+        sqlstate = getattr(error, "sqlstate", None)
+        if isinstance(sqlstate, str) and (
+            sqlstate.startswith(CONNECTION_SQLSTATE_CLASS)
+            or sqlstate == CANNOT_CONNECT_NOW_SQLSTATE
+        ):
+            return True
+
+        error = error.orig if isinstance(error, DBAPIError) else error.__cause__
+
+    return False
 
 
 async def get_database_session(engine: AsyncEngine) -> AsyncSession:
     """
     Фабрика сессий БД.
 
-    Создает новую асинхронную сессию.
+    Создает новую асинхронную сессию из долгоживущей фабрики движка.
     """
-    
-    Session = sessionmaker(
-        bind=engine,
-        class_=AsyncSession,
-    )
-    return Session()
+
+    return get_session_factory(engine)()
+
+
+def get_session_factory(engine: AsyncEngine) -> async_sessionmaker:
+    """Возвращает фабрику сессий движка, создавая ее при первом обращении."""
+
+    with _session_factories_lock:
+        factory = _session_factories.get(engine)
+        if factory is None:
+            factory = async_sessionmaker(bind=engine, class_=AsyncSession)
+            _session_factories[engine] = factory
+
+    return factory
+
+
+def _forget_session_factory(engine: AsyncEngine) -> None:
+    with _session_factories_lock:
+        _session_factories.pop(engine, None)
@@ -0,0 +1,134 @@
+import asyncio
+import uuid
+from concurrent.futures import Future
+from dataclasses import dataclass, field, replace
+from typing import Callable, Union, Any
+
+from loguru import logger
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession, AsyncEngine
+
+from db.events import DatabaseLoop, create_database_engine
+from settings.settings import DatabaseSettings
+from util.retry import get_backoff_delay
+
+
+# Канал уведомлений об изменении данных таблицы `deltas`
+DELTAS_CHANGED_CHANNEL = "deltas_changed"
+
+# Идентификатор экземпляра сервиса - содержимое его уведомлений
+INSTANCE_ID = uuid.uuid4().hex
+
+# Период проверки соединения слушателя
+LISTENER_CHECK_INTERVAL_SEC = 5
+LISTENER_RETRY_BASE_DELAY_SEC = 1.0
+LISTENER_RETRY_MAX_DELAY_SEC = 30.0
+
+
+async def notify_deltas_changed(db_session: AsyncSession) -> None:
+    """
+    Отправляет уведомление в канал `DELTAS_CHANGED_CHANNEL` в уже начатой транзакции.
+
+    Уведомление доставляется слушателям только при коммите транзакции.
+    Содержимое уведомления - `INSTANCE_ID`.
+    """
+
+    await db_session.execute(
+        text("SELECT pg_notify(:channel, :payload)"),
+        {"channel": DELTAS_CHANGED_CHANNEL, "payload": INSTANCE_ID},
+    )
+
+
+@dataclass
+class NotificationListener:
+    """
+    Слушатель уведомлений PostgreSQL (`LISTEN`) канала `channel`.
+
+    Работает в своем `DatabaseLoop` с отдельным соединением и вызывает `on_notify`
+    (из потока слушателя) на каждое уведомление, а также после (пере)подключения -
+    уведомления, отправленные без подключения, теряются.
+    Уведомления с содержимым `ignore_payload` (например, собственные) пропускаются.
+    """
+
+    db_settings: DatabaseSettings
+    channel: str
+    on_notify: Callable[[], None]
+    ignore_payload: Union[str, None] = None
+
+    _loop: Union[DatabaseLoop, None] = None
+    _future: Union[Future, None] = None
+    _stop_event: asyncio.Event = field(default_factory=asyncio.Event)
+
+    def start(self) -> None:
+        if self._loop is not None:
+            return
+
+        self._stop_event = asyncio.Event()
+        self._loop = DatabaseLoop()
+        self._loop.start()
+        self._future = asyncio.run_coroutine_threadsafe(self._listen(), self._loop.loop)
+
+    def stop(self) -> None:
+        """Отключается от БД и ожидает завершения потока слушателя."""
+
+        if self._loop is None:
+            return
+
+        self._loop.loop.call_soon_threadsafe(self._stop_event.set)
+        self._future.result()
+        self._loop.stop()
+        self._loop, self._future = None, None
+
+    async def _listen(self) -> None:
+        # Соединение слушателя не возвращается в пул - пул не нужен
+        engine = create_database_engine(
+            replace(self.db_settings, ENGINE=None, LOOP=None, POOL_ENABLED=False))
+        attempt = 0
+
+        try:
+            while not self._stop_event.is_set():
+                try:
+                    await self._listen_connection(engine)
+                    attempt = 0
+                except Exception as e:
+                    attempt += 1
+                    delay = get_backoff_delay(
+                        attempt, LISTENER_RETRY_BASE_DELAY_SEC, LISTENER_RETRY_MAX_DELAY_SEC)
+                    logger.error(
+                        f"Error occured while listening to \"{self.channel}\": \"{e}\","
+                        f" reconnecting in {delay:.1f} sec"
+                    )
+                    await self._wait_stop(delay)
+        finally:
+            await engine.dispose()
+
+    async def _listen_connection(self, engine: AsyncEngine) -> None:
+        """Слушает канал на одном соединении, пока оно живо или до остановки."""
+
+        async with engine.connect() as conn:
+            raw_conn = (await conn.get_raw_connection()).driver_connection
+            await raw_conn.add_listener(self.channel, self._on_notification)
+            logger.info(f"Listening to \"{self.channel}\" notifications")
+            self.on_notify()
+
+            try:
+                while True:
+                    await self._wait_stop(LISTENER_CHECK_INTERVAL_SEC)
+                    if self._stop_event.is_set():
+                        break
+                    # Запрос обнаруживает "мертвое" соединение
+                    await raw_conn.execute("SELECT 1")
+            finally:
+                if not raw_conn.is_closed():
+                    await raw_conn.remove_listener(self.channel, self._on_notification)
+
+    async def _wait_stop(self, timeout: float) -> None:
+        try:
+            await asyncio.wait_for(self._stop_event.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    def _on_notification(self, connection: Any, pid: int, channel: str, payload: str) -> None:
+        if self.ignore_payload is not None and payload == self.ignore_payload:
+            return
+        self.on_notify()
@@ -0,0 +1,134 @@
+import asyncio
+import pathlib
+from dataclasses import dataclass
+from typing import Callable, List
+
+from sqlalchemy.ext.asyncio import AsyncEngine
+from loguru import logger
+
+from db.events import get_database_session, is_connection_error
+from db.crud.leases import (
+    acquire_ingest_lease,
+    release_ingest_lease,
+    lock_expired_ingest_lease,
+    delete_ingest_lease,
+)
+from db.notify import INSTANCE_ID
+from util.claims import ClaimDirectory
+from util.files import list_xlsx_files
+from util.retry import CircuitBreaker
+
+
+# Срок аренды обработчика (продлевается каждую треть срока)
+DEFAULT_CLAIM_LEASE_SEC = 60
+
+
+@dataclass
+class IngestLease:
+    """
+    Аренда обработчика в таблице `ingest_leases`: пока она действует, обработчик захватывает
+    файлы `claims`, а файлы обработчиков с истекшей арендой перехватывает (`schedule`).
+    """
+
+    db_engine: AsyncEngine
+    claims: ClaimDirectory
+    breaker: CircuitBreaker
+    schedule: Callable[[List[pathlib.Path]], None]
+    lease_sec: float = DEFAULT_CLAIM_LEASE_SEC
+
+    # Время (`loop.time()`), до которого действует аренда
+    _deadline: float = 0
+
+    @property
+    def worker_id(self) -> str:
+        return self.claims.worker_id
+
+    def is_held(self) -> bool:
+        return asyncio.get_running_loop().time() < self._deadline
+
+    async def maintain(self) -> None:
+        """Продлевает аренду и перехватывает файлы; после получения аренды директория сканируется заново."""
+
+        while True:
+            had_lease = self.is_held()
+            await self.renew()
+
+            try:
+                if self.is_held():
+                    if not had_lease:
+                        logger.info(f"Ingest lease of worker \"{self.worker_id}\" is acquired")
+                        self.schedule(
+                            self.claims.list_claimed() + list_xlsx_files(self.claims.directory))
+                    await self.take_over_expired()
+            except OSError as e:
+                logger.error(f"Error occured while listing claimed files: {e}")
+
+            await asyncio.sleep(self.lease_sec / 3)
+
+    async def renew(self) -> None:
+        loop = asyncio.get_running_loop()
+        # Срок отсчитывается от момента до запроса - локальный срок не позже срока в БД
+        deadline = loop.time() + self.lease_sec
+
+        # Аренда продлевается и при разомкнутом предохранителе - иначе она истечет
+        try:
+            session = await get_database_session(self.db_engine)
+            acquired = await acquire_ingest_lease(
+                session, self.worker_id, INSTANCE_ID, self.lease_sec)
+        except Exception as e:
+            if is_connection_error(e):
+                self.breaker.record_failure()
+                logger.warning(f"Connection error occured while renewing ingest lease: \"{e}\"")
+            else:
+                self.breaker.record_success()
+                logger.error(f"Error occured while renewing ingest lease: {e}")
+            return
+
+        self.breaker.record_success()
+        if acquired:
+            self._deadline = deadline
+        else:
+            self._deadline = 0
+            logger.warning(
+                f"Ingest lease of worker \"{self.worker_id}\" is held by another instance,"
+                " files are not claimed"
+            )
+
+    async def take_over_expired(self) -> None:
+        """Перехватывает файлы обработчиков, аренда которых истекла."""
+
+        for worker_id in self.claims.list_other_workers():
+            try:
+                session = await get_database_session(self.db_engine)
+                async with session.begin():
+                    if not await lock_expired_ingest_lease(session, worker_id):
+                        continue
+                    taken = self.claims.take_over(worker_id)
+                    await delete_ingest_lease(session, worker_id)
+            except Exception as e:
+                logger.error(f"Error occured while taking over files of \"{worker_id}\": {e}")
+                continue
+
+            if taken:
+                logger.warning(
+                    f"Ingest lease of worker \"{worker_id}\" expired,"
+                    f" took over {len(taken)} files"
+                )
+                self.schedule(taken)
+
+    async def release(self) -> None:
+        """Возвращает необработанные захваченные файлы в директорию ожидания и освобождает аренду."""
+
+        kept = self.claims.release()
+        if kept:
+            logger.warning(
+                f"{len(kept)} claimed files are left in \"{self.claims.path}\","
+                " they will be taken over after the lease expires"
+            )
+
+        try:
+            session = await get_database_session(self.db_engine)
+            await release_ingest_lease(session, self.worker_id, INSTANCE_ID)
+        except Exception as e:
+            logger.error(f"Error occured while releasing ingest lease: {e}")
+        self._deadline = 0
@@ -0,0 +1,73 @@
+import pathlib
+import time
+from dataclasses import dataclass, field
+from typing import AsyncIterator, List, Union
+
+from models.db.entities import DeltaBatch
+from util.background import BackgroundIterator
+
+
+@dataclass(eq=False)
+class IngestJob:
+    """
+    Файл, проходящий через стадии конвейера обработки.
+
+    `parsed` - извлеченные пачки записей, `pending` - еще не прочитанные пачки
+    (потоковый парсинг). Прочитанные пачки сохраняются в `parsed` для повторной загрузки.
+    `spilled` - кол-во первых пачек `parsed`, перенесенных из памяти на диск.
+    `staged` - пачки `parsed` отображены из хранилища извлеченных записей.
+    `skipped` - файл уже загружен, дальнейшая обработка не нужна.
+    `retry` - БД недоступна, файл остается в директории для повторной попытки.
+    `error` - непредвиденная ошибка, файл переносится в директорию ошибок.
+    `parse_sec` - время парсинга, `parse_wait_sec` - время ожидания пачек потокового парсинга.
+    `rows` - кол-во загруженных строк, `expected_rows` - кол-во строк по диапазону листа.
+    """
+
+    file: pathlib.Path
+    file_hash: Union[str, None] = None
+    parsed: List[DeltaBatch] = field(default_factory=list)
+    pending: Union[BackgroundIterator[DeltaBatch], None] = None
+    spilled: int = 0
+    staged: bool = False
+    skipped: bool = False
+    retry: bool = False
+    error: Union[Exception, None] = None
+    parse_sec: float = 0
+    parse_wait_sec: float = 0
+    rows: Union[int, None] = None
+    expected_rows: Union[int, None] = None
+
+    def is_finished(self) -> bool:
+        return self.skipped or self.retry or self.error is not None
+
+    async def iter_batches(self) -> AsyncIterator[DeltaBatch]:
+        """Возвращает все пачки файла, дочитывая `pending`."""
+
+        for batch in list(self.parsed):
+            yield batch
+
+        while self.pending is not None:
+            started = time.perf_counter()
+            batch = await anext(self.pending, None)
+            self.parse_wait_sec += time.perf_counter() - started
+            if batch is None:
+                self.release_pending()
+                break
+            self.parsed.append(batch)
+            yield batch
+
+    def release_pending(self) -> None:
+        """Останавливает потоковый парсинг (его время учитывается в `parse_sec`)."""
+
+        if self.pending is not None:
+            self.pending.close()
+            self.parse_sec += self.pending.busy_sec
+            self.pending = None
+
+    def get_memory_size(self) -> int:
+        """Объем памяти (байт), занятой пачками, не перенесенными на диск."""
+
+        return sum(batch.nbytes for batch in self.parsed[self.spilled:])
+
+    def get_spill_name(self) -> str:
+        return f"{self.file_hash}-{id(self):x}"
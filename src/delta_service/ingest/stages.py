@@ -0,0 +1,458 @@
+import asyncio
+import pathlib
+import time
+from typing import Any, Awaitable, Callable, Iterable, Iterator, List, Union
+from functools import partial
+
+from loguru import logger
+
+from db.events import get_database_session, is_connection_error
+from db.crud.ingest import is_file_ingested, FileAlreadyIngestedError
+from db.crud.delta import (
+    put_delta_batches,
+    discard_delta_upload,
+    COMMIT_MODE_SINGLE,
+    COMMIT_MODE_CHUNKED,
+    LOAD_STRATEGY_AUTO,
+    LOAD_STRATEGY_INSERT,
+    LOAD_STRATEGY_COPY,
+)
+from ingest.jobs import IngestJob
+from models.db.entities import DeltaBatch, IngestedFileRecord
+from util.parsers import (
+    parse_xlsx_file,
+    parse_xlsx_as_batch,
+    iter_xlsx_batches,
+    PARSER_MODE_STREAMING,
+)
+from util.files import hash_file
+from util.retry import get_backoff_delay
+from util.background import BackgroundIterator
+from util.xlsx_sniffer import sniff_xlsx_file
+from util.metrics import REGISTRY, ROWS_BUCKETS
+
+
+# Стадии конвейера обработки файлов (после обнаружения) в порядке прохождения
+STAGE_VALIDATE = "validate"
+STAGE_PARSE = "parse"
+STAGE_UPLOAD = "upload"
+STAGE_FINALIZE = "finalize"
+PIPELINE_STAGES = (STAGE_VALIDATE, STAGE_PARSE, STAGE_UPLOAD, STAGE_FINALIZE)
+
+# На сколько пачек фоновый потоковый парсинг файла опережает его загрузку
+PARSE_PREFETCH_BATCHES = 2
+
+# Итог обработки файла (метка метрики `delta_ingest_files_total`)
+RESULT_PROCESSED = "processed"
+RESULT_SKIPPED = "skipped"
+RESULT_FAILED = "failed"
+RESULT_RETRY = "retry"
+
+INGEST_STAGE_SECONDS = REGISTRY.histogram(
+    "delta_ingest_stage_seconds",
+    "Time spent by a file in ingest pipeline stage",
+    labelnames=("stage",),
+)
+INGEST_PARSE_SECONDS = REGISTRY.histogram(
+    "delta_ingest_parse_seconds",
+    "Time spent parsing a file, including streamed parsing during upload",
+)
+INGEST_PUT_SECONDS = REGISTRY.histogram(
+    "delta_ingest_put_seconds",
+    "Database load latency of a file, parsing excluded",
+)
+INGEST_FILE_ROWS = REGISTRY.histogram(
+    "delta_ingest_file_rows",
+    "Rows per loaded file",
+    buckets=ROWS_BUCKETS,
+)
+INGEST_FILES_TOTAL = REGISTRY.counter(
+    "delta_ingest_files_total",
+    "Files finished by ingest pipeline by result",
+    labelnames=("result",),
+)
+INGEST_ROWS_TOTAL = REGISTRY.counter(
+    "delta_ingest_rows_total",
+    "Rows loaded to database",
+)
+
+
+class IngestStages:
+    """Стадии конвейера обработки файлов `XlsxFileHandler` и обращения к БД с повторными попытками."""
+
+    async def _run_stage(
+        self,
+        stage: str,
+        handler: Callable[[IngestJob], Awaitable[None]],
+    ) -> None:
+        """
+        Обработчик стадии: берет файлы из очереди стадии и передает в очередь следующей.
+        Завершенный (в т.ч. с ошибкой) файл передается сразу на стадию `finalize`.
+        """
+
+        queue = self._queues[stage]
+        stage_index = PIPELINE_STAGES.index(stage)
+
+        while True:
+            job = await queue.get()
+            self._stage_active[stage] += 1
+            started = time.perf_counter()
+            try:
+                await handler(job)
+            except Exception as e:
+                if is_connection_error(e):
+                    # Повторные попытки прерваны остановкой обработчика
+                    logger.error(
+                        f"Connection error occured while processing \"{job.file}\","
+                        " will retry after restart"
+                    )
+                    job.retry = True
+                else:
+                    # Непойманная/непредвиденная ошибка - перемещение файла в failed dir
+                    # в т.ч. сюда попадет ошибка ValueError при неудачной попытке чтения .xlsx файла
+                    logger.error(
+                        f"Task for \"{job.file}\" failed - unhandled exception: \"{e}\"")
+                    job.error = e
+            finally:
+                self._stage_active[stage] -= 1
+                INGEST_STAGE_SECONDS.observe(time.perf_counter() - started, stage=stage)
+
+            try:
+                if stage != STAGE_FINALIZE:
+                    if job.is_finished():
+                        next_stage = STAGE_FINALIZE
+                    else:
+                        next_stage = PIPELINE_STAGES[stage_index + 1]
+                    await self._queues[next_stage].put(job)
+            finally:
+                queue.task_done()
+
+    async def _validate_stage(self, job: IngestJob) -> None:
+        """
+        Проверяет структуру файла, вычисляет его хэш и проверяет журнал загруженных файлов.
+        Уже загруженные файлы и файлы с сохраненными записями не парсятся.
+        """
+
+        if self.sniff_files:
+            # `ValueError` - файл переносится в `failed_xlsx_dir` без парсинга
+            info = await asyncio.to_thread(sniff_xlsx_file, job.file)
+            job.expected_rows = info.rows
+
+        job.file_hash = await asyncio.to_thread(hash_file, job.file)
+
+        if await self._call_database(job, partial(self._is_file_ingested, job.file_hash)):
+            logger.info(
+                f"\"{job.file}\" is already ingested (sha256 {job.file_hash}), skipping")
+            job.skipped = True
+            return
+
+        if await self._storage.load_staged(job):
+            logger.info(f"Using staged data of \"{job.file}\", parsing is skipped")
+
+    async def _parse_stage(self, job: IngestJob) -> None:
+        """Парсит файл в колоночные пачки записей (кроме файлов с сохраненными записями)."""
+
+        if job.staged:
+            return
+
+        started = time.perf_counter()
+        try:
+            chunk_size = self._get_parse_chunk_size(job)
+            if self._parse_executor is not None:
+                # Парсинг в отдельном процессе, event loop в это время загружает другие файлы
+                job.parsed = await self._parse_xlsx_file_in_executor(job.file, chunk_size)
+            elif self.parser_mode == PARSER_MODE_STREAMING:
+                # Файл читается пачками в фоновом потоке одновременно с загрузкой
+                job.pending = BackgroundIterator(
+                    self._iter_xlsx_data_batches(job.file, chunk_size),
+                    maxsize=PARSE_PREFETCH_BATCHES,
+                )
+            else:
+                job.parsed = [
+                    await asyncio.to_thread(self._get_xlsx_data_from_file, job.file)]
+        finally:
+            job.parse_sec += time.perf_counter() - started
+
+    async def _upload_stage(self, job: IngestJob) -> None:
+        """
+        Загружает пачки записей файла в БД вместе с записью в журнале загруженных файлов.
+        При недоступности БД загрузка повторяется без повторного парсинга.
+        """
+
+        ingested_file = IngestedFileRecord(
+            sha256=job.file_hash, file_name=job.file.name, rows=None)
+
+        # Загруженные пачки. При ошибке загрузки по частям часть данных могла быть
+        # закоммичена - какие именно пачки в БД, неизвестно (`None`)
+        ingested = [] if self.commit_mode == COMMIT_MODE_SINGLE else None
+        # Кол-во строк, закоммиченных до продолжения загрузки (их id в БД не совпадают с `parsed`)
+        resumed = []
+        started, parse_wait_sec = time.perf_counter(), job.parse_wait_sec
+        try:
+            job.rows = await self._call_database(job, lambda: self._upload_xlsx_files_data(
+                job.iter_batches(),
+                ingested_file=ingested_file,
+                strategy=self._get_load_strategy(job),
+                on_resume=resumed.append,
+            ))
+            if resumed:
+                logger.info(
+                    f"Upload of \"{job.file}\" continued after {resumed[-1]} committed rows")
+            ingested = None if resumed else job.parsed
+            # Потоковый парсинг идет во время загрузки и учитывается отдельно
+            INGEST_PUT_SECONDS.observe(
+                time.perf_counter() - started - (job.parse_wait_sec - parse_wait_sec))
+        except FileAlreadyIngestedError:
+            logger.info(
+                f"\"{job.file}\" was ingested concurrently (sha256 {job.file_hash}), skipping")
+            job.skipped = True
+        finally:
+            job.parsed = []
+            job.release_pending()
+            if self.on_ingest is not None:
+                self.on_ingest(ingested)
+
+    async def _finalize_stage(self, job: IngestJob) -> None:
+        """
+        Удаляет успешно обработанный файл или переносит необрабатываемый в `failed_xlsx_dir`.
+        При недоступности БД файл остается в директории для повторной попытки.
+        """
+
+        self._storage.release(job)
+        self._record_job_metrics(job)
+
+        if job.retry:
+            self._in_flight.pop(job.file, None)
+            return
+
+        if self._reschedule_if_replaced(job.file):
+            return
+
+        try:
+            await self._remove_processed_file(job)
+        finally:
+            if self._claims is not None:
+                # Файл с тем же именем, появившийся за время обработки, не мог быть захвачен
+                self._schedule_later([self._claims.directory / job.file.name])
+
+    async def _call_database(
+        self,
+        job: IngestJob,
+        call: Callable[[], Awaitable[Any]],
+    ) -> Any:
+        """
+        Выполняет `call`, повторяя его при ошибках подключения с экспоненциальной задержкой,
+        пока обработчик работает (после остановки пробрасывает ошибку подключения).
+        """
+
+        attempt = 0
+
+        while True:
+            await self._wait_for_database()
+
+            try:
+                result = await call()
+            except Exception as e:
+                if not is_connection_error(e):
+                    # БД ответила - ошибка не связана с подключением
+                    self._breaker.record_success()
+                    raise
+
+                if self._breaker.record_failure():
+                    logger.error(
+                        "Database is unavailable, pausing database calls"
+                        f" for {self.circuit_reset_sec} sec"
+                    )
+                attempt += 1
+                if not self._work_flag.is_set():
+                    # Остановка - уже извлеченные записи сохраняются для следующего запуска
+                    await self._storage.stage(job, read_pending=False)
+                    raise
+
+                delay = get_backoff_delay(
+                    attempt, self.retry_base_delay_sec, self.retry_max_delay_sec)
+                logger.warning(
+                    f"Connection error occured while processing \"{job.file}\": \"{e}\","
+                    f" retry #{attempt} in {delay:.1f} sec"
+                )
+
+                self._retrying.add(job)
+                try:
+                    if not await self._storage.stage(job):
+                        await self._storage.spill_if_needed(job, self._retrying)
+                    await self._sleep_while_working(delay)
+                finally:
+                    self._retrying.discard(job)
+            else:
+                self._breaker.record_success()
+                return result
+
+    async def _wait_for_database(self) -> None:
+        """
+        Ожидает, пока предохранитель разрешит обращение к БД.
+        Вызывает `ConnectionRefusedError`, если обработчик остановлен во время ожидания.
+        """
+
+        while True:
+            delay = self._breaker.acquire()
+            if not delay:
+                return
+            if not self._work_flag.is_set():
+                raise ConnectionRefusedError("Database is unavailable")
+
+            await self._sleep_while_working(delay)
+
+    async def _remove_processed_file(self, job: IngestJob) -> None:
+        """Удаляет успешно обработанный файл или переносит необрабатываемый в `failed_xlsx_dir`."""
+
+        if job.error is None:
+            logger.info(f"Successfully processed \"{job.file}\"")
+            try:
+                job.file.unlink()
+            except Exception as e:
+                logger.error(f"Error occured while deleting .xlsx file: {e}")
+            return
+
+        if self.commit_mode != COMMIT_MODE_SINGLE and job.file_hash is not None:
+            await self._discard_upload(job)
+
+        if not self.failed_xlsx_dir.exists():
+            self.failed_xlsx_dir.mkdir()
+
+        # Перемещение файла в filed directory
+        try:
+            job.file.rename(self.failed_xlsx_dir / job.file.name)
+        except Exception as e:
+            logger.error(f"Error occured while moving .xlsx file: {e}")
+
+        logger.error(
+            f"Failed to process \"{job.file}\","
+            f" moved to \"{self.failed_xlsx_dir.absolute()}\""
+        )
+
+    def _record_job_metrics(self, job: IngestJob) -> None:
+        if job.retry:
+            result = RESULT_RETRY
+        elif job.error is not None:
+            result = RESULT_FAILED
+        elif job.skipped:
+            result = RESULT_SKIPPED
+        else:
+            result = RESULT_PROCESSED
+        INGEST_FILES_TOTAL.inc(result=result)
+
+        if job.parse_sec:
+            INGEST_PARSE_SECONDS.observe(job.parse_sec)
+        if job.rows is not None:
+            INGEST_FILE_ROWS.observe(job.rows)
+            INGEST_ROWS_TOTAL.inc(job.rows)
+
+    def _get_load_strategy(self, job: IngestJob) -> str:
+        """Стратегия загрузки файла: для `auto` - по кол-ву строк, если оно известно заранее."""
+
+        if self.load_strategy != LOAD_STRATEGY_AUTO or job.expected_rows is None:
+            return self.load_strategy
+
+        if job.expected_rows >= self.copy_threshold:
+            return LOAD_STRATEGY_COPY
+        return LOAD_STRATEGY_INSERT
+
+    def _get_parse_chunk_size(self, job: IngestJob) -> int:
+        """Размер пачки парсинга: файлы, загружаемые через `COPY`, парсятся пачками до `load_chunk_size` строк."""
+
+        if (
+            job.expected_rows is None
+            or self._get_load_strategy(job) != LOAD_STRATEGY_COPY
+        ):
+            return self.chunk_size
+
+        return max(self.chunk_size, min(job.expected_rows, self.load_chunk_size))
+
+    async def _parse_xlsx_file_in_executor(
+        self,
+        file: pathlib.Path,
+        chunk_size: int,
+    ) -> List[DeltaBatch]:
+        """
+        Парсит `.xlsx` файл в пуле процессов.
+
+        Может вызвать `ValueError` при неопределенном формате файла.
+        """
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._parse_executor,
+            parse_xlsx_file,
+            file,
+            self.parser_mode,
+            chunk_size,
+        )
+
+    def _get_xlsx_data_from_file(
+        self,
+        file: pathlib.Path,
+    ) -> DeltaBatch:
+        """
+        Извлекает данные из `.xlsx` файла и возвращает колоночную пачку записей.
+
+        Ожидает, что `file` будет в `.xlsx` формате.
+        """
+
+        return parse_xlsx_as_batch(file)  # Может вызвать ValueError при неопределенном формате файла
+
+    def _iter_xlsx_data_batches(
+        self,
+        file: pathlib.Path,
+        chunk_size: int,
+    ) -> Iterator[DeltaBatch]:
+        """
+        Потоково извлекает данные из `.xlsx` файла колоночными пачками не более `chunk_size` строк.
+
+        Может вызвать `ValueError` на любой из пачек при некорректных данных.
+        """
+
+        return iter_xlsx_batches(file, chunk_size=chunk_size)
+
+    async def _discard_upload(self, job: IngestJob) -> None:
+        """Удаляет прогресс незавершенной загрузки по частям необрабатываемого файла."""
+
+        try:
+            session = await get_database_session(self.db_engine)
+            # Закоммиченные части файла (`chunked`) остаются в `deltas`
+            lags = self.lag_view_lags if self.commit_mode == COMMIT_MODE_CHUNKED else ()
+            await discard_delta_upload(session, sha256=job.file_hash, lags=lags)
+        except Exception as e:
+            logger.error(f"Error occured while discarding upload of \"{job.file}\": {e}")
+
+    async def _is_file_ingested(self, file_hash: str) -> bool:
+        """Проверяет журнал загруженных файлов в БД."""
+
+        session = await get_database_session(self.db_engine)
+        return await is_file_ingested(session, sha256=file_hash)
+
+    async def _upload_xlsx_files_data(
+        self,
+        batches: Iterable[DeltaBatch],
+        ingested_file: Union[IngestedFileRecord, None] = None,
+        strategy: Union[str, None] = None,
+        on_resume: Union[Callable[[int], None], None] = None,
+    ) -> int:
+        """
+        Загружает пачки записей в БД (см. `commit_mode`) и возвращает кол-во строк.
+        `ingested_file` записывается в журнал загруженных файлов в последней транзакции загрузки.
+        """
+
+        session = await get_database_session(self.db_engine)
+        return await put_delta_batches(
+            session,
+            batches=batches,
+            strategy=strategy or self.load_strategy,
+            chunk_size=self.load_chunk_size,
+            copy_threshold=self.copy_threshold,
+            ingested_file=ingested_file,
+            commit_mode=self.commit_mode,
+            notify=self.notify_changes,
+            lags=self.lag_view_lags,
+            ingest_mode=self.ingest_mode,
+            on_resume=on_resume,
+        )
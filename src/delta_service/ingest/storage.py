@@ -0,0 +1,103 @@
+import asyncio
+from dataclasses import dataclass
+from typing import Iterable, Union
+
+from loguru import logger
+
+from ingest.jobs import IngestJob
+from util.spill import SpillStore
+
+
+DEFAULT_RETRY_MEMORY_LIMIT_MB = 256
+DEFAULT_STAGING_MAX_FILE_MB = 256
+DEFAULT_STAGING_MAX_MB = 1024
+
+
+@dataclass
+class JobStorage:
+    """
+    Извлеченные пачки файлов, ожидающих повторной загрузки: перенос на диск
+    при нехватке памяти (`spill`) и хранилище записей по sha256 файла (`staging`).
+    """
+
+    spill: SpillStore
+    staging: Union[SpillStore, None] = None
+    retry_memory_limit_mb: int = DEFAULT_RETRY_MEMORY_LIMIT_MB
+
+    def clear_spilled(self) -> None:
+        """Удаляет пачки, перенесенные на диск прошлым запуском."""
+
+        self.spill.remove()
+
+    async def load_staged(self, job: IngestJob) -> bool:
+        """Подставляет в `job` сохраненные записи файла. Возвращает, найдены ли записи."""
+
+        if self.staging is None:
+            return False
+
+        staged = await asyncio.to_thread(self.staging.load, job.file_hash)
+        if staged is None:
+            return False
+
+        job.parsed, job.spilled, job.staged = staged, len(staged), True
+        job.expected_rows = sum(len(batch) for batch in staged)
+        return True
+
+    async def stage(self, job: IngestJob, read_pending: bool = True) -> bool:
+        """
+        Сохраняет записи файла в хранилище и заменяет пачки в памяти отображенными с диска.
+        С `read_pending` потоковый парсинг предварительно дочитывается. Возвращает, сохранены ли записи.
+        """
+
+        if (
+            self.staging is None
+            or job.staged
+            or job.file_hash is None
+            or (not job.parsed and job.pending is None)
+            or (job.pending is not None and not read_pending)
+        ):
+            return False
+
+        if job.pending is not None:
+            # Пачки дочитываются только между попытками загрузки
+            job.parsed.extend([batch async for batch in job.pending])
+            job.release_pending()
+
+        try:
+            staged = await asyncio.to_thread(self.staging.save, job.file_hash, job.parsed)
+        except OSError as e:
+            logger.error(f"Error occured while staging parsed data of \"{job.file}\": {e}")
+            return False
+        if staged is None:
+            return False
+
+        if job.spilled:
+            self.spill.remove(job.get_spill_name())
+        job.parsed, job.spilled, job.staged = staged, len(staged), True
+
+        logger.info(f"Parsed data of \"{job.file}\" is staged to \"{self.staging.directory}\"")
+        return True
+
+    async def spill_if_needed(self, job: IngestJob, retrying: Iterable[IngestJob]) -> None:
+        """Переносит пачки файла на диск, если пачки `retrying` занимают больше `retry_memory_limit_mb`."""
+
+        retained = sum(retrying_job.get_memory_size() for retrying_job in retrying)
+        if retained <= self.retry_memory_limit_mb * 1024 * 1024 or not job.get_memory_size():
+            return
+
+        spilled = await asyncio.to_thread(
+            self.spill.save, job.get_spill_name(), job.parsed[job.spilled:], start=job.spilled)
+        if spilled is None:
+            return
+        job.parsed[job.spilled:] = spilled
+        job.spilled = len(job.parsed)
+
+        logger.info(f"Parsed data of \"{job.file}\" is moved to \"{self.spill.directory}\"")
+
+    def release(self, job: IngestJob) -> None:
+        """Удаляет пачки завершенного файла (записи файла, ожидающего повторной попытки, остаются)."""
+
+        if job.spilled and not job.staged:
+            self.spill.remove(job.get_spill_name())
+        if self.staging is not None and job.file_hash is not None and not job.retry:
+            self.staging.remove(job.file_hash)
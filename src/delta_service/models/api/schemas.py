@@ -7,3 +7,10 @@ from dataclasses import dataclass
 class DeltaGetDataFrameResponse:
     records: Dict[str, Dict[str, Union[datetime.date, Union[float, str]]]]
 
+
+@dataclass
+class DeltaGetPageResponse:
+    records: Dict[str, Dict[str, Union[datetime.date, Union[float, str]]]]
+    # Курсор последней записи страницы (`<rep_dt>_<id>`, см. `DeltaCursor`)
+    # для параметра `after`, `None` если страница последняя
+    next_after: Union[str, None]
@@ -1,6 +1,15 @@
 from dataclasses import dataclass
 import datetime
-from typing import Union
+import uuid
+from typing import Union, Sequence, Tuple
+
+import numpy as np
+
+from util.ids import ID_DTYPE, generate_uuid7_array, ids_from_uuids
+
+
+# Разделитель даты и идентификатора записи в строке курсора пагинации
+CURSOR_SEPARATOR = "_"
 
 
 @dataclass
@@ -13,8 +22,138 @@ class DeltaRecord:
 
 @dataclass
 class DeltaRecordWithLag:
-    __slots__ = ("rep_dt", "delta", "delta_lag")
+    __slots__ = ("rep_dt", "delta", "delta_lag", "id")
 
     rep_dt: datetime.date
     delta: float
     delta_lag: Union[float, None]
+    id: uuid.UUID
+
+
+@dataclass(frozen=True)
+class DeltaCursor:
+    """
+    Курсор keyset пагинации записей `deltas` в порядке `(rep_dt, id)`:
+    следующая страница начинается строго после записи `(rep_dt, id)`.
+
+    Без `id` (курсор - только дата) страница начинается после всех записей `rep_dt`.
+    """
+
+    __slots__ = ("rep_dt", "id")
+
+    rep_dt: datetime.date
+    id: Union[uuid.UUID, None]
+
+    def __str__(self) -> str:
+        if self.id is None:
+            return self.rep_dt.isoformat()
+
+        return f"{self.rep_dt.isoformat()}{CURSOR_SEPARATOR}{self.id}"
+
+    @classmethod
+    def parse(cls, value: str) -> "DeltaCursor":
+        """Разбирает курсор `<rep_dt>_<id>` или `<rep_dt>` (ISO формат даты)."""
+
+        rep_dt, separator, id_ = value.partition(CURSOR_SEPARATOR)
+        if separator and not id_:
+            raise ValueError(f"Invalid cursor: \"{value}\"")
+
+        return cls(
+            rep_dt=datetime.date.fromisoformat(rep_dt),
+            id=uuid.UUID(id_) if id_ else None,
+        )
+
+
+@dataclass
+class IngestedFileRecord:
+    __slots__ = ("sha256", "file_name", "rows")
+
+    sha256: str
+    file_name: str
+    rows: Union[int, None]
+
+
+@dataclass(slots=True)
+class DeltaBatch:
+    """
+    Колоночная репрезентация пачки записей таблицы `deltas`.
+
+    `rep_dt` - массив `datetime64[D]`, `delta` - массив `float64` той же длины,
+    `id` - идентификаторы записей (`util.ids`), без `id` создаются новые UUID версии 7.
+    """
+
+    rep_dt: np.ndarray
+    delta: np.ndarray
+    id: Union[np.ndarray, None] = None
+
+    def __post_init__(self) -> None:
+        self.rep_dt = np.asarray(self.rep_dt, dtype="datetime64[D]")
+        self.delta = np.asarray(self.delta, dtype=np.float64)
+        if self.id is not None:
+            self.id = np.asarray(self.id, dtype=ID_DTYPE)
+
+        if (
+            self.rep_dt.shape != self.delta.shape
+            or self.rep_dt.ndim != 1
+            or self.id is not None and self.id.shape != self.rep_dt.shape
+        ):
+            raise ValueError(
+                "Batch columns must be one-dimensional arrays of the same length")
+
+        if self.id is None:
+            self.id = generate_uuid7_array(len(self.rep_dt))
+
+    def __len__(self) -> int:
+        return len(self.rep_dt)
+
+    @property
+    def nbytes(self) -> int:
+        return self.rep_dt.nbytes + self.delta.nbytes + self.id.nbytes
+
+    def __getitem__(self, item: slice) -> "DeltaBatch":
+        return DeltaBatch(rep_dt=self.rep_dt[item], delta=self.delta[item], id=self.id[item])
+
+    def drop_duplicates(self) -> "DeltaBatch":
+        """Оставляет последнюю запись каждого `rep_dt`, сохраняя порядок записей."""
+
+        # Первое вхождение даты в обратном порядке - последнее в прямом
+        _, reversed_index = np.unique(self.rep_dt[::-1], return_index=True)
+        if len(reversed_index) == len(self.rep_dt):
+            return self
+
+        keep = np.sort(len(self.rep_dt) - 1 - reversed_index)
+        return self[keep]
+
+    @classmethod
+    def from_rows(
+        cls,
+        rows: Sequence[Tuple[datetime.date, float]],
+    ) -> "DeltaBatch":
+        """Собирает пачку из последовательности пар `(rep_dt, delta)`."""
+
+        rep_dt = np.fromiter(
+            (row[0] for row in rows), dtype="datetime64[D]", count=len(rows))
+        delta = np.fromiter(
+            (row[1] for row in rows), dtype=np.float64, count=len(rows))
+
+        return cls(rep_dt=rep_dt, delta=delta)
+
+    @classmethod
+    def from_records(cls, records: Sequence[DeltaRecord]) -> "DeltaBatch":
+        """Собирает пачку из объектных репрезентаций записей."""
+
+        return cls.from_rows([(rec.rep_dt, rec.delta) for rec in records])
+
+    @classmethod
+    def from_id_rows(
+        cls,
+        rows: Sequence[Tuple[uuid.UUID, datetime.date, float]],
+    ) -> "DeltaBatch":
+        """Собирает пачку из строк `(id, rep_dt, delta)` результата запроса к БД."""
+
+        rep_dt = np.fromiter(
+            (row[1] for row in rows), dtype="datetime64[D]", count=len(rows))
+        delta = np.fromiter(
+            (row[2] for row in rows), dtype=np.float64, count=len(rows))
+
+        return cls(rep_dt=rep_dt, delta=delta, id=ids_from_uuids([row[0] for row in rows]))
@@ -1,8 +1,29 @@
+import os
+import time
 import uuid
 import datetime
+from typing import Union
 
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
-from sqlalchemy import Float
+from sqlalchemy import (
+    Float, String, BigInteger, Identity, Index, PrimaryKeyConstraint, text, func)
+
+
+def uuid7() -> uuid.UUID:
+    """
+    UUID версии 7: 48 бит времени в мс и случайные биты.
+
+    Идентификаторы возрастают со временем создания, поэтому вставки
+    попадают в конец индекса первичного ключа, а не в случайные страницы.
+    """
+
+    value = (time.time_ns() // 1_000_000 & (1 << 48) - 1) << 80
+    value |= int.from_bytes(os.urandom(10), "big")
+    # Версия (4 бита) и вариант RFC 4122 (2 бита)
+    value = value & ~(0xF << 76) | 0x7 << 76
+    value = value & ~(0x3 << 62) | 0x2 << 62
+
+    return uuid.UUID(int=value)
 
 
 class Base(DeclarativeBase):
@@ -10,8 +31,94 @@ class Base(DeclarativeBase):
 
 
 class Delta(Base):
+    """Записи дельт, секционированы по месяцам `rep_dt` (партиции - `db.crud.partitions`)."""
+
     __tablename__ = "deltas"
+    __table_args__ = (
+        # Первичный ключ секционированной таблицы должен включать ключ секционирования
+        PrimaryKeyConstraint("rep_dt", "id", name="deltas_pkey"),
+        # Все чтения упорядочены по `rep_dt`; `delta` в индексе - для index-only scan.
+        # Уникальный индекс `rep_dt` для режима загрузки `replace` - `db.crud.compaction`
+        Index("ix_deltas_rep_dt", "rep_dt", postgresql_include=["delta"]),
+        {"postgresql_partition_by": "RANGE (rep_dt)"},
+    )
+
+    # Значение по умолчанию на стороне БД нужно для загрузки через COPY без колонки id
+    # (`uuid_generate_v7()` создается миграцией)
+    id: Mapped[uuid.UUID] = mapped_column(
+        default=uuid7, server_default=text("uuid_generate_v7()"))
+    rep_dt: Mapped[datetime.date]
+    delta: Mapped[float] = mapped_column(Float(decimal_return_scale=None))
+
+
+class IngestedFile(Base):
+    """Журнал загруженных `.xlsx` файлов (по хэшу содержимого)."""
+
+    __tablename__ = "ingested_files"
+
+    sha256: Mapped[str] = mapped_column(String(64), primary_key=True)
+    file_name: Mapped[str]
+    rows: Mapped[int]
+    ingested_at: Mapped[datetime.datetime] = mapped_column(server_default=func.now())
+
+
+class IngestProgress(Base):
+    """Прогресс загрузки файла по частям: кол-во уже закоммиченных строк."""
+
+    __tablename__ = "ingest_progress"
 
-    id: Mapped[uuid.UUID] = mapped_column(primary_key=True, default=uuid.uuid4)
+    sha256: Mapped[str] = mapped_column(String(64), primary_key=True)
+    file_name: Mapped[str]
+    committed_rows: Mapped[int] = mapped_column(server_default=text("0"))
+    updated_at: Mapped[datetime.datetime] = mapped_column(server_default=func.now())
+
+
+class IngestLease(Base):
+    """
+    Аренда обработчика `.xlsx` файлов (`worker_id`) при обработке общей директории
+    несколькими экземплярами сервиса, продлевается обработчиком, пока он работает.
+
+    Файлы, захваченные обработчиком с истекшей арендой, забирают другие обработчики.
+    """
+
+    __tablename__ = "ingest_leases"
+
+    worker_id: Mapped[str] = mapped_column(primary_key=True)
+    instance_id: Mapped[str] = mapped_column(String(32))
+    acquired_at: Mapped[datetime.datetime] = mapped_column(server_default=func.now())
+    expires_at: Mapped[datetime.datetime]
+
+
+class DeltaStaging(Base):
+    """
+    Промежуточная таблица загрузки файла по частям (UNLOGGED - без записи в WAL).
+
+    Строки файла переносятся в `deltas` одной транзакцией после загрузки всех частей.
+    """
+
+    __tablename__ = "deltas_staging"
+    __table_args__ = {"prefixes": ["UNLOGGED"]}
+
+    id: Mapped[int] = mapped_column(BigInteger, Identity(), primary_key=True)
+    sha256: Mapped[str] = mapped_column(String(64), index=True)
+    # `id` записи в `deltas` (создается при парсинге файла, см. `DeltaBatch`)
+    delta_id: Mapped[Union[uuid.UUID, None]]
     rep_dt: Mapped[datetime.date]
     delta: Mapped[float] = mapped_column(Float(decimal_return_scale=None))
+
+
+class DeltaLag(Base):
+    """
+    Материализованные значения `DeltaLag` записей `deltas` для набора лагов
+    (`LAG(delta, -lag) OVER (ORDER BY rep_dt, id)`), см. `db.crud.delta_lags`.
+
+    Первичный ключ упорядочен как результат запроса, поэтому чтение лага - сканирование индекса.
+    """
+
+    __tablename__ = "delta_lags"
+
+    lag: Mapped[int] = mapped_column(primary_key=True)
+    rep_dt: Mapped[datetime.date] = mapped_column(primary_key=True)
+    delta_id: Mapped[uuid.UUID] = mapped_column(primary_key=True)
+    delta: Mapped[float] = mapped_column(Float(decimal_return_scale=None))
+    delta_lag: Mapped[Union[float, None]] = mapped_column(Float(decimal_return_scale=None))
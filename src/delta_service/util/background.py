@@ -0,0 +1,100 @@
+import asyncio
+import threading
+import time
+from typing import Any, Generic, Iterator, Tuple, TypeVar, Union
+
+
+T = TypeVar("T")
+
+# Как часто поток чтения, ожидающий места в очереди, проверяет остановку (сек.)
+STOP_CHECK_SEC = 0.1
+
+_END = object()
+
+
+class BackgroundIterator(Generic[T]):
+    """
+    Асинхронный итератор, читающий синхронный итератор `iterator` в отдельном потоке.
+
+    Поток опережает потребителя не более чем на `maxsize` элементов (очередь ограничена),
+    event loop во время чтения не блокируется. Исключение итератора пробрасывается потребителю.
+    Создается в event loop-е потребителя; `close` останавливает поток и закрывает `iterator`.
+    `busy_sec` - время чтения `iterator` в потоке.
+    """
+
+    def __init__(self, iterator: Iterator[T], maxsize: int = 2) -> None:
+        if maxsize <= 0:
+            raise ValueError("Background iterator queue size must be positive")
+
+        self.busy_sec = 0.0
+
+        self._iterator = iterator
+        self._loop = asyncio.get_running_loop()
+        self._queue: asyncio.Queue[Tuple[Any, Union[BaseException, None]]] = asyncio.Queue()
+        self._slots = threading.Semaphore(maxsize)
+        self._stopped = threading.Event()
+        self._finished = False
+
+        self._thread = threading.Thread(target=self._read, daemon=True)
+        self._thread.start()
+
+    def __aiter__(self) -> "BackgroundIterator[T]":
+        return self
+
+    async def __anext__(self) -> T:
+        if self._finished:
+            raise StopAsyncIteration
+
+        item, error = await self._queue.get()
+        self._slots.release()
+        if item is _END:
+            self._finished = True
+            if error is not None:
+                raise error
+            raise StopAsyncIteration
+
+        return item
+
+    def close(self) -> None:
+        """Останавливает чтение (уже прочитанные элементы отбрасываются)."""
+
+        self._finished = True
+        self._stopped.set()
+
+    def _read(self) -> None:
+        try:
+            while self._acquire_slot():
+                started = time.perf_counter()
+                try:
+                    item = next(self._iterator)
+                except StopIteration:
+                    self._put(_END)
+                    return
+                except Exception as e:
+                    self._put(_END, e)
+                    return
+                finally:
+                    self.busy_sec += time.perf_counter() - started
+
+                self._put(item)
+        finally:
+            close = getattr(self._iterator, "close", None)
+            if close is not None:
+                close()
+
+    def _acquire_slot(self) -> bool:
+        """Ожидает места в очереди, `False` - чтение остановлено."""
+
+        while not self._slots.acquire(timeout=STOP_CHECK_SEC):
+            # Итератор, брошенный без `close` (например, при остановке event loop-а)
+            if self._stopped.is_set() or self._loop.is_closed():
+                return False
+
+        return not self._stopped.is_set()
+
+    def _put(self, item: Any, error: Union[BaseException, None] = None) -> None:
+        try:
+            self._loop.call_soon_threadsafe(self._queue.put_nowait, (item, error))
+        except RuntimeError:
+            # Event loop потребителя уже закрыт
+            self._stopped.set()
@@ -0,0 +1,132 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Hashable, Iterable, Iterator, Union
+
+
+@dataclass
+class CachedResponse:
+    __slots__ = ("version", "body", "mimetype", "etag")
+
+    version: int
+    body: bytes
+    mimetype: str
+    etag: str
+
+
+@dataclass
+class ResponseCache:
+    """
+    Потокобезопасный LRU кэш тел ответов эндпоинтов.
+
+    Записи привязаны к версии данных: загрузка новых данных увеличивает версию
+    (`bump_version`), и записи предыдущих версий считаются устаревшими.
+    Размер ограничен кол-вом записей `max_entries` и суммарным объемом `max_bytes`.
+    """
+
+    max_entries: int = 128
+    max_bytes: int = 64 * 1024 * 1024
+
+    _entries: "OrderedDict[Hashable, CachedResponse]" = field(default_factory=OrderedDict)
+    _size: int = 0
+    _version: int = 0
+    _lock: threading.Lock = field(default_factory=threading.Lock)
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def bump_version(self) -> None:
+        """Инвалидирует все записи (данные изменились)."""
+
+        with self._lock:
+            self._version += 1
+            self._entries.clear()
+            self._size = 0
+
+    def get(self, key: Hashable) -> Union[CachedResponse, None]:
+        """Возвращает актуальную запись `key` или `None`."""
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            if entry.version != self._version:
+                self._pop(key)
+                return None
+
+            self._entries.move_to_end(key)
+            return entry
+
+    def put(
+        self,
+        key: Hashable,
+        version: int,
+        body: bytes,
+        mimetype: str,
+    ) -> CachedResponse:
+        """
+        Сохраняет тело ответа, собранного по данным версии `version`.
+
+        Ответ устаревшей версии (данные изменились во время запроса)
+        или больше `max_bytes` не сохраняется, но запись все равно возвращается.
+        """
+
+        entry = CachedResponse(
+            version=version,
+            body=body,
+            mimetype=mimetype,
+            etag=hashlib.blake2b(body, digest_size=16).hexdigest(),
+        )
+
+        with self._lock:
+            if version != self._version or len(body) > self.max_bytes:
+                return entry
+
+            self._pop(key)
+            self._entries[key] = entry
+            self._size += len(body)
+
+            while self._entries and (
+                len(self._entries) > self.max_entries or self._size > self.max_bytes
+            ):
+                self._pop(next(iter(self._entries)))
+
+        return entry
+
+    def tee(
+        self,
+        key: Hashable,
+        version: int,
+        chunks: Iterable[Union[str, bytes]],
+        mimetype: str,
+    ) -> Iterator[Union[str, bytes]]:
+        """
+        Отдает части потокового тела ответа без изменений и сохраняет тело,
+        если оно было отдано целиком и не превысило `max_bytes`.
+        """
+
+        parts = []
+        size = 0
+
+        for chunk in chunks:
+            yield chunk
+
+            if parts is None:
+                continue
+            data = chunk.encode() if isinstance(chunk, str) else chunk
+            size += len(data)
+            if size > self.max_bytes:
+                parts = None
+            else:
+                parts.append(data)
+
+        if parts is not None:
+            self.put(key, version, b"".join(parts), mimetype)
+
+    def _pop(self, key: Hashable) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._size -= len(entry.body)
@@ -0,0 +1,138 @@
+import os
+import re
+import pathlib
+from dataclasses import dataclass
+from typing import List, Union
+
+from util.files import list_xlsx_files
+
+
+# Директория захваченных файлов внутри директории ожидания
+# (на той же файловой системе - переименование атомарно)
+CLAIMS_DIR_NAME = ".claims"
+
+WORKER_ID_PATTERN = re.compile(r"[A-Za-z0-9_.-]+")
+
+
+def validate_worker_id(worker_id: str) -> None:
+    """Проверяет, что идентификатор обработчика можно использовать как имя директории."""
+
+    if not WORKER_ID_PATTERN.fullmatch(worker_id) or worker_id in (".", ".."):
+        raise ValueError(
+            f"Invalid worker id \"{worker_id}\": expected letters, digits, \"_\", \".\" or \"-\"")
+
+
+@dataclass
+class ClaimDirectory:
+    """
+    Захват файлов общей директории ожидания `directory` обработчиками нескольких
+    экземпляров сервиса.
+
+    Файл захватывается переименованием в директорию обработчика `.claims/<worker_id>`:
+    переименование атомарно, поэтому файл достается ровно одному обработчику.
+    Файлы обработчика, переставшего продлевать аренду, перехватываются таким же образом.
+    """
+
+    directory: pathlib.Path
+    worker_id: str
+
+    def __post_init__(self) -> None:
+        validate_worker_id(self.worker_id)
+
+    @property
+    def root(self) -> pathlib.Path:
+        return self.directory / CLAIMS_DIR_NAME
+
+    @property
+    def path(self) -> pathlib.Path:
+        """Директория файлов, захваченных этим обработчиком."""
+
+        return self.root / self.worker_id
+
+    def owns(self, file: pathlib.Path) -> bool:
+        return file.parent == self.path
+
+    def claim(self, file: pathlib.Path) -> Union[pathlib.Path, None]:
+        """
+        Захватывает файл директории ожидания.
+
+        Возвращает путь захваченного файла или `None`, если файл уже захвачен
+        другим обработчиком, либо файл с тем же именем еще обрабатывается этим.
+        """
+
+        target = self.path / file.name
+        if target.exists():
+            return None
+
+        self.path.mkdir(parents=True, exist_ok=True)
+        try:
+            os.rename(file, target)
+        except FileNotFoundError:
+            return None
+
+        return target
+
+    def list_claimed(self) -> List[pathlib.Path]:
+        """Возвращает `.xlsx` файлы, захваченные этим обработчиком."""
+
+        return list_xlsx_files(self.path)
+
+    def list_other_workers(self) -> List[str]:
+        """Возвращает идентификаторы других обработчиков, у которых есть захваченные файлы."""
+
+        if not self.root.is_dir():
+            return []
+
+        return [
+            entity.name for entity in self.root.iterdir()
+            if entity.is_dir() and entity.name != self.worker_id and list_xlsx_files(entity)
+        ]
+
+    def take_over(self, worker_id: str) -> List[pathlib.Path]:
+        """
+        Перехватывает файлы обработчика `worker_id` (аренда которого истекла).
+
+        Файлы, имена которых совпадают с файлами в обработке, остаются на месте
+        до следующей попытки. Возвращает пути перехваченных файлов.
+        """
+
+        taken = []
+        for file in list_xlsx_files(self.root / worker_id):
+            claimed = self.claim(file)
+            if claimed is not None:
+                taken.append(claimed)
+
+        _remove_if_empty(self.root / worker_id)
+
+        return taken
+
+    def release(self) -> List[pathlib.Path]:
+        """
+        Возвращает захваченные файлы в директорию ожидания (при остановке обработчика).
+
+        Файл остается захваченным, если в директории ожидания уже есть файл с тем же именем.
+        Возвращает пути файлов, оставшихся захваченными.
+        """
+
+        kept = []
+        for file in self.list_claimed():
+            target = self.directory / file.name
+            if target.exists():
+                kept.append(file)
+                continue
+            try:
+                os.rename(file, target)
+            except FileNotFoundError:
+                # Файл перехвачен другим обработчиком
+                continue
+
+        _remove_if_empty(self.path)
+
+        return kept
+
+
+def _remove_if_empty(directory: pathlib.Path) -> None:
+    try:
+        directory.rmdir()
+    except OSError:
+        pass
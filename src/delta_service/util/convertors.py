@@ -1,23 +1,34 @@
+import datetime
 import pandas as pd
-from typing import Sequence, Union, Dict
+from typing import Sequence, Union, Dict, Type, List, Any
 
-from models.db.entities import DeltaRecord, DeltaRecordWithLag
+from models.db.entities import DeltaRecord, DeltaRecordWithLag, DeltaBatch
+
+
+# Имена дней недели и месяцев формата даты HTTP (не зависят от локали)
+HTTP_DATE_WEEKDAYS = ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")
+HTTP_DATE_MONTHS = (
+    "Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec")
 
 
 def merge_records_to_data_frame(
     records: Sequence[Union[DeltaRecord, DeltaRecordWithLag]],
     fill_none: bool = True,
+    record_type: Type[Union[DeltaRecord, DeltaRecordWithLag]] = DeltaRecord,
 ) -> pd.DataFrame:
-    """Сливает объектные репрезентации записей БД в `pandas.DataFrame`"""
+    """
+    Сливает объектные репрезентации записей БД в `pandas.DataFrame`
+
+    `record_type` определяет набор колонок фрейма при пустом `records`.
+    """
 
     d = {}
 
     if len(records) != 0:
-        if isinstance(records[0], DeltaRecord):
-            d = _get_delta_records_rows(records)
+        record_type = type(records[0])
 
-        if isinstance(records[0], DeltaRecordWithLag):
-            d = _get_lagged_delta_records_rows(records)
+    if record_type is DeltaRecordWithLag:
+        d = _get_lagged_delta_records_rows(records)
     else:
         d = _get_delta_records_rows(records=records)
 
@@ -28,6 +39,77 @@ def merge_records_to_data_frame(
     return df
 
 
+def records_to_columns(
+    records: Sequence[Union[DeltaRecord, DeltaRecordWithLag]],
+    record_type: Type[Union[DeltaRecord, DeltaRecordWithLag]] = DeltaRecord,
+) -> Dict[str, List[Any]]:
+    """
+    Собирает колонки (имя колонки -> значения) из объектных репрезентаций записей БД,
+    без построения `pandas.DataFrame`.
+
+    `record_type` определяет набор колонок при пустом `records`.
+    """
+
+    if len(records) != 0:
+        record_type = type(records[0])
+
+    if record_type is DeltaRecordWithLag:
+        return _get_lagged_delta_records_rows(records)
+
+    return _get_delta_records_rows(records=records)
+
+
+def columns_to_dict(
+    columns: Dict[str, Sequence[Any]],
+    fill_none: Any = "",
+) -> Dict[str, Dict[int, Any]]:
+    """
+    Конвертирует колонки в словарь `{<колонка>: {<номер строки>: <значение>}}` -
+    тот же, что дает `merge_records_to_data_frame(...).to_dict()`, но без pandas.
+
+    Пропуски (`None` и `NaN`) заменяются на `fill_none` (как `fillna`).
+    """
+
+    # `v == v` ложно только для `NaN`
+    return {
+        name: {
+            i: value if value is not None and value == value else fill_none
+            for i, value in enumerate(values)
+        }
+        for name, values in columns.items()
+    }
+
+
+def format_http_date(value: datetime.date) -> str:
+    """
+    Форматирует дату так же, как JSON сериализатор Flask (`werkzeug.http.http_date`):
+    `Wed, 01 Jan 2020 00:00:00 GMT`, но в несколько раз быстрее.
+    """
+
+    return (
+        f"{HTTP_DATE_WEEKDAYS[value.weekday()]}, {value.day:02d}"
+        f" {HTTP_DATE_MONTHS[value.month - 1]} {value.year:04d} 00:00:00 GMT"
+    )
+
+
+def data_frame_to_delta_batch(data: pd.DataFrame) -> DeltaBatch:
+    """
+    Конвертирует `pandas.DataFrame` с колонками `Rep_dt`, `Delta`
+    в колоночную пачку записей без построчного обхода.
+
+    Полностью пустые строки отбрасываются, частично пустые вызывают `ValueError`.
+    """
+
+    data = data[["Rep_dt", "Delta"]].dropna(how="all")
+    if data.isna().to_numpy().any():
+        raise ValueError("File contains rows with invalid \"Rep_dt\" or \"Delta\" values")
+
+    return DeltaBatch(
+        rep_dt=data["Rep_dt"].to_numpy(dtype="datetime64[D]"),
+        delta=data["Delta"].to_numpy(dtype="float64"),
+    )
+
+
 def _get_delta_records_rows(records: Sequence[DeltaRecord]) -> Dict:
     """"""
 
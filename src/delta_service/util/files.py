@@ -0,0 +1,60 @@
+import hashlib
+import pathlib
+from dataclasses import dataclass
+from typing import List
+
+
+# Размер блока чтения файла при подсчете хэша
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+@dataclass(frozen=True)
+class FileKey:
+    """
+    Идентификатор версии файла по данным `stat`.
+
+    Файл с тем же путем, но другим inode/mtime/размером считается другим файлом.
+    """
+
+    __slots__ = ("path", "inode", "mtime_ns", "size")
+
+    path: pathlib.Path
+    inode: int
+    mtime_ns: int
+    size: int
+
+
+def get_file_key(file: pathlib.Path) -> FileKey:
+    """Возвращает идентификатор версии файла (один вызов `stat`)."""
+
+    stat = file.stat()
+
+    return FileKey(
+        path=file,
+        inode=stat.st_ino,
+        mtime_ns=stat.st_mtime_ns,
+        size=stat.st_size,
+    )
+
+
+def hash_file(file: pathlib.Path) -> str:
+    """Возвращает SHA-256 содержимого файла (hex)."""
+
+    digest = hashlib.sha256()
+    with open(file, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+
+    return digest.hexdigest()
+
+
+def list_xlsx_files(directory: pathlib.Path) -> List[pathlib.Path]:
+    """Возвращает `.xlsx` файлы директории (пустой список, если директории нет)."""
+
+    if not directory.is_dir():
+        return []
+
+    return [
+        entity for entity in directory.iterdir()
+        if entity.is_file() and entity.suffix.lower() == ".xlsx"
+    ]
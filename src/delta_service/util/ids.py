@@ -0,0 +1,90 @@
+import os
+import threading
+import time
+import uuid
+from typing import List, Sequence
+
+import numpy as np
+
+
+# Идентификаторы записей в массивах NumPy - 16 байт UUID (порядок сравнения байт
+# совпадает с порядком `uuid` в PostgreSQL)
+ID_DTYPE = "S16"
+
+# Границы групп шестнадцатеричных символов в строке UUID `8-4-4-4-12`
+_HEX_GROUPS = ((0, 8), (8, 12), (12, 16), (16, 20), (20, 32))
+
+_RAND_B_BITS = 62
+_RAND_B_MASK = (1 << _RAND_B_BITS) - 1
+# Счетчик в 74 случайных битах UUID (`rand_a` и `rand_b`)
+_COUNTER_LIMIT = 1 << 74
+
+_lock = threading.Lock()
+_last = (0, 0)
+
+
+def generate_uuid7_array(size: int) -> np.ndarray:
+    """
+    Создает массив `size` UUID версии 7 (как `models.db.tables.uuid7`),
+    возрастающих в порядке элементов и между вызовами в одном процессе.
+
+    Случайные биты первого UUID - начало счетчика, следующие UUID увеличивают его на 1.
+    """
+
+    global _last
+
+    ms = time.time_ns() // 1_000_000 & (1 << 48) - 1
+    # Половина диапазона счетчика оставлена под инкременты
+    start = int.from_bytes(os.urandom(10), "big") >> 7
+    with _lock:
+        if (ms, start) <= _last:
+            ms, start = _last[0], _last[1] + 1
+        if start + size >= _COUNTER_LIMIT:
+            ms, start = ms + 1, 0
+        _last = (ms, start + max(size, 1) - 1)
+
+    counter = np.arange(size, dtype=np.uint64) + np.uint64(start & _RAND_B_MASK)
+    rand_a = (counter >> np.uint64(_RAND_B_BITS)) + np.uint64(start >> _RAND_B_BITS)
+
+    ids = np.empty(size, dtype=[("high", ">u8"), ("low", ">u8")])
+    # Версия (4 бита) и вариант RFC 4122 (2 бита)
+    ids["high"] = np.uint64(ms << 16 | 0x7 << 12) | rand_a
+    ids["low"] = np.uint64(0x2 << _RAND_B_BITS) | counter & np.uint64(_RAND_B_MASK)
+
+    return ids.view(ID_DTYPE)
+
+
+def ids_from_uuids(values: Sequence[uuid.UUID]) -> np.ndarray:
+    """Собирает массив идентификаторов из объектов UUID (в т.ч. UUID asyncpg)."""
+
+    return np.array([value.bytes for value in values], dtype=ID_DTYPE)
+
+
+def ids_to_uuids(ids: np.ndarray) -> List[uuid.UUID]:
+    """Конвертирует массив идентификаторов в объекты UUID."""
+
+    # `tolist` у `S16` отбрасывает нулевые байты в конце значений
+    raw = np.ascontiguousarray(ids, dtype=ID_DTYPE).tobytes()
+    return [uuid.UUID(bytes=raw[start:start + 16]) for start in range(0, len(raw), 16)]
+
+
+def ids_to_strings(ids: np.ndarray) -> List[str]:
+    """Форматирует массив идентификаторов строками UUID (для параметров запросов и `COPY`)."""
+
+    if not len(ids):
+        return []
+
+    raw = np.frombuffer(np.ascontiguousarray(ids, dtype=ID_DTYPE).tobytes(), dtype=np.uint8)
+    nibbles = np.empty((len(ids), 32), dtype=np.uint8)
+    nibbles[:, 0::2] = raw.reshape(len(ids), 16) >> 4
+    nibbles[:, 1::2] = raw.reshape(len(ids), 16) & 0xF
+    # `0`-`9` и `a`-`f` в ASCII
+    hex_chars = nibbles + ord("0") + (nibbles > 9) * np.uint8(ord("a") - ord("9") - 1)
+
+    chars = np.full((len(ids), 36), ord("-"), dtype=np.uint8)
+    for num, (start, stop) in enumerate(_HEX_GROUPS):
+        chars[:, start + num:stop + num] = hex_chars[:, start:stop]
+
+    text = chars.tobytes().decode("ascii")
+    return [text[start:start + 36] for start in range(0, len(text), 36)]
+
@@ -0,0 +1,125 @@
+import ctypes
+import ctypes.util
+import errno
+import os
+import pathlib
+import struct
+import sys
+from dataclasses import dataclass
+from typing import List, Union
+
+
+# Флаги событий из <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+
+# Заголовок `struct inotify_event`: wd, mask, cookie, len (далее - имя файла длиной len)
+_EVENT_HEADER = struct.Struct("iIII")
+_READ_BUFFER_SIZE = 64 * 1024
+
+
+def _load_libc() -> Union[ctypes.CDLL, None]:
+    if not sys.platform.startswith("linux"):
+        return None
+
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+    except OSError:
+        return None
+
+    if not hasattr(libc, "inotify_init1") or not hasattr(libc, "inotify_add_watch"):
+        return None
+
+    libc.inotify_init1.argtypes = [ctypes.c_int]
+    libc.inotify_init1.restype = ctypes.c_int
+    libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+    libc.inotify_add_watch.restype = ctypes.c_int
+
+    return libc
+
+
+_libc = _load_libc()
+
+
+def is_inotify_available() -> bool:
+    """Проверяет, доступен ли inotify в текущей системе."""
+
+    return _libc is not None
+
+
+@dataclass
+class InotifyEvent:
+    __slots__ = ("mask", "name")
+
+    mask: int
+    name: str
+
+
+@dataclass
+class InotifyWatcher:
+    """
+    Отслеживание событий файловой системы в директории `directory` через inotify.
+
+    Дескриптор открывается в неблокирующем режиме и предназначен для
+    `loop.add_reader`: после сигнала готовности события забираются `read_events`.
+
+    `mask` - отслеживаемые события (по умолчанию - завершение записи и перемещение в директорию).
+    """
+
+    directory: pathlib.Path
+    mask: int = IN_CLOSE_WRITE | IN_MOVED_TO
+
+    _fd: int = -1
+
+    def open(self) -> None:
+        if not is_inotify_available():
+            raise OSError(errno.ENOSYS, "inotify is not available")
+
+        fd = _libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            _raise_errno()
+
+        wd = _libc.inotify_add_watch(
+            fd, os.fsencode(self.directory), self.mask | IN_ONLYDIR)
+        if wd < 0:
+            os.close(fd)
+            _raise_errno()
+
+        self._fd = fd
+
+    def close(self) -> None:
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+    def fileno(self) -> int:
+        return self._fd
+
+    def read_events(self) -> List[InotifyEvent]:
+        """Возвращает все накопившиеся события (без ожидания)."""
+
+        events = []
+
+        while True:
+            try:
+                data = os.read(self._fd, _READ_BUFFER_SIZE)
+            except BlockingIOError:
+                break
+
+            offset = 0
+            while offset < len(data):
+                _, mask, _, name_len = _EVENT_HEADER.unpack_from(data, offset)
+                offset += _EVENT_HEADER.size
+                name = data[offset:offset + name_len].rstrip(b"\0")
+                offset += name_len
+                events.append(InotifyEvent(mask=mask, name=os.fsdecode(name)))
+
+        return events
+
+
+def _raise_errno() -> None:
+    err = ctypes.get_errno()
+    raise OSError(err, os.strerror(err))
@@ -0,0 +1,248 @@
+import bisect
+import contextlib
+import math
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterator, List, Sequence, Tuple, Union
+
+
+# Границы корзин гистограмм длительностей (сек.) по умолчанию
+DEFAULT_TIME_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+# Границы корзин гистограмм кол-ва строк
+ROWS_BUCKETS = (10, 100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+
+# MIME тип текстового формата экспозиции Prometheus
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LabelValues = Tuple[str, ...]
+
+
+@dataclass
+class Metric:
+    """
+    Метрика с набором меток `labelnames`.
+
+    Значения меток передаются именованными аргументами методов изменения.
+    Метрики потокобезопасны: изменяются из потоков запросов и обработчика файлов.
+    """
+
+    name: str
+    help: str
+    labelnames: Tuple[str, ...] = ()
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    type = "untyped"
+
+    def _get_label_values(self, labels: Dict[str, str]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(
+                f"Metric \"{self.name}\" expects labels {self.labelnames}, got {tuple(labels)}")
+
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _format_labels(self, values: LabelValues, extra: Dict[str, str] = None) -> str:
+        pairs = list(zip(self.labelnames, values)) + list((extra or {}).items())
+        if not pairs:
+            return ""
+
+        return "{" + ",".join(f"{name}=\"{_escape(value)}\"" for name, value in pairs) + "}"
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {_escape(self.help)}", f"# TYPE {self.name} {self.type}"]
+        lines.extend(self._render_samples())
+        return lines
+
+    def _render_samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+@dataclass
+class Counter(Metric):
+    """Монотонно возрастающий счетчик."""
+
+    _values: Dict[LabelValues, float] = field(default_factory=dict, repr=False)
+
+    type = "counter"
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        if amount < 0:
+            raise ValueError("Counter can only be increased")
+
+        key = self._get_label_values(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _render_samples(self) -> List[str]:
+        with self._lock:
+            values = dict(self._values)
+
+        return [
+            f"{self.name}{self._format_labels(key)} {_format_value(value)}"
+            for key, value in sorted(values.items())
+        ]
+
+
+@dataclass
+class Gauge(Metric):
+    """
+    Значение, которое может как расти, так и уменьшаться.
+
+    Вместо явной установки значения могут вычисляться при каждом чтении (`set_function`).
+    """
+
+    _values: Dict[LabelValues, float] = field(default_factory=dict, repr=False)
+    _function: Union[Callable[[], Dict[LabelValues, float]], None] = field(
+        default=None, repr=False)
+
+    type = "gauge"
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._get_label_values(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def set_function(self, function: Union[Callable[[], Dict[LabelValues, float]], None]) -> None:
+        """
+        Задает функцию, возвращающую значения метрики (значения меток -> значение).
+        `None` - вернуться к явно установленным значениям.
+        """
+
+        self._function = function
+
+    def _render_samples(self) -> List[str]:
+        function = self._function
+        if function is not None:
+            values = function()
+        else:
+            with self._lock:
+                values = dict(self._values)
+
+        return [
+            f"{self.name}{self._format_labels(key)} {_format_value(value)}"
+            for key, value in sorted(values.items())
+        ]
+
+
+@dataclass
+class Histogram(Metric):
+    """Распределение наблюдаемых значений по корзинам `buckets` (с суммой и кол-вом)."""
+
+    buckets: Sequence[float] = DEFAULT_TIME_BUCKETS
+    # Значения меток -> (кол-во в каждой корзине, сумма)
+    _values: Dict[LabelValues, Tuple[List[int], float]] = field(
+        default_factory=dict, repr=False)
+
+    type = "histogram"
+
+    def __post_init__(self) -> None:
+        self.buckets = tuple(sorted(self.buckets))
+        if "le" in self.labelnames:
+            raise ValueError("Histogram can not have \"le\" label")
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._get_label_values(labels)
+        # Индекс первой корзины, в которую попадает значение (последняя - `+Inf`)
+        index = bisect.bisect_left(self.buckets, value)
+
+        with self._lock:
+            counts, total = self._values.get(key) or ([0] * (len(self.buckets) + 1), 0.0)
+            counts[index] += 1
+            self._values[key] = (counts, total + value)
+
+    @contextlib.contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        """Измеряет длительность блока `with` (сек.)."""
+
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def _render_samples(self) -> List[str]:
+        with self._lock:
+            values = {key: (list(counts), total) for key, (counts, total) in self._values.items()}
+
+        lines = []
+        for key, (counts, total) in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(list(self.buckets) + [math.inf], counts):
+                cumulative += count
+                le = _format_value(bound)
+                lines.append(
+                    f"{self.name}_bucket{self._format_labels(key, {'le': le})} {cumulative}")
+            lines.append(f"{self.name}_sum{self._format_labels(key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{self._format_labels(key)} {cumulative}")
+
+        return lines
+
+
+@dataclass
+class MetricsRegistry:
+    """
+    Реестр метрик процесса, отдаваемых эндпоинтом `/metrics`
+    в текстовом формате Prometheus.
+
+    Повторная регистрация метрики с тем же именем возвращает уже созданную метрику.
+    """
+
+    _metrics: Dict[str, Metric] = field(default_factory=dict)
+    _lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help, tuple(labelnames)))
+
+    def gauge(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, help, tuple(labelnames)))
+
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_TIME_BUCKETS,
+    ) -> Histogram:
+        return self._register(Histogram(name, help, tuple(labelnames), buckets=buckets))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+
+        return "\n".join(lines) + "\n"
+
+    def _register(self, metric: Metric) -> Metric:
+        with self._lock:
+            registered = self._metrics.get(metric.name)
+            if registered is None:
+                self._metrics[metric.name] = metric
+                return metric
+
+        if type(registered) is not type(metric) or registered.labelnames != metric.labelnames:
+            raise ValueError(f"Metric \"{metric.name}\" is already registered with another type")
+
+        return registered
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace("\"", "\\\"")
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if value == -math.inf:
+        return "-Inf"
+    if isinstance(value, int) or float(value).is_integer():
+        return str(int(value))
+
+    return repr(float(value))
+
+
+# Реестр метрик сервиса
+REGISTRY = MetricsRegistry()
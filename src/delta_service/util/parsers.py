@@ -1,15 +1,55 @@
 import pandas as pd
 import pathlib
 import datetime
+from typing import Iterator, List, Tuple, Sequence, Any, Union
 
+import openpyxl
+from openpyxl.utils.datetime import from_excel
+from dateutil import parser as date_parser
 
-def parse_xlsx_as_data_frame(file: pathlib.Path) -> pd.DataFrame:
-    """Содержит логику парсинга `.xlsx` файла."""
+from models.db.entities import DeltaBatch
+from util.convertors import data_frame_to_delta_batch
+
+
+REP_DT_COLUMN = "Rep_dt"
+DELTA_COLUMN = "Delta"
+
+# Режимы парсинга `.xlsx` файлов
+PARSER_MODE_STREAMING = "streaming"
+PARSER_MODE_PANDAS = "pandas"
+PARSER_MODES = (PARSER_MODE_STREAMING, PARSER_MODE_PANDAS)
+
+# Размер пачки строк по умолчанию при потоковом парсинге
+DEFAULT_CHUNK_SIZE = 10_000
+
+XlsxRow = Tuple[datetime.date, float]
+
+
+def list_xlsx_sheets(file: pathlib.Path) -> List[str]:
+    """Возвращает имена листов с данными (без листов-диаграмм) книги, не читая сами листы."""
+
+    workbook = openpyxl.load_workbook(file, read_only=True)
+    try:
+        return [worksheet.title for worksheet in workbook.worksheets]
+    finally:
+        workbook.close()
+
+
+def parse_xlsx_as_data_frame(
+    file: pathlib.Path,
+    sheet: Union[str, None] = None,
+) -> pd.DataFrame:
+    """
+    Содержит логику парсинга `.xlsx` файла.
+
+    `sheet` - имя листа (по умолчанию первый лист).
+    """
 
     # TODO возможное место оптимизации
 
     data = pd.read_excel(
         file,
+        sheet_name=sheet if sheet is not None else 0,
         dtype={"Rep_dt": datetime.date, "Delta": float},
         parse_dates=["Rep_dt"],
         decimal=",",
@@ -18,3 +58,168 @@ def parse_xlsx_as_data_frame(file: pathlib.Path) -> pd.DataFrame:
         data["Rep_dt"], errors="coerce", format="mixed")
 
     return data
+
+
+def parse_xlsx_file(
+    file: pathlib.Path,
+    parser_mode: str = PARSER_MODE_STREAMING,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    sheet: Union[str, None] = None,
+    allow_empty: bool = False,
+) -> List[DeltaBatch]:
+    """
+    Парсит лист `sheet` (по умолчанию первый) `.xlsx` файла целиком
+    в список колоночных пачек записей.
+
+    Функция уровня модуля - может выполняться в дочернем процессе
+    (`ProcessPoolExecutor`), пачки возвращаются оттуда как массивы NumPy.
+    С `allow_empty` пустой лист дает пустой список вместо `ValueError`.
+    """
+
+    if parser_mode == PARSER_MODE_STREAMING:
+        return list(iter_xlsx_batches(
+            file, chunk_size=chunk_size, sheet=sheet, allow_empty=allow_empty))
+
+    return [parse_xlsx_as_batch(file, sheet=sheet)]
+
+
+def parse_xlsx_as_batch(file: pathlib.Path, sheet: Union[str, None] = None) -> DeltaBatch:
+    """Парсит лист `.xlsx` файла целиком в колоночную пачку записей."""
+
+    return data_frame_to_delta_batch(parse_xlsx_as_data_frame(file, sheet=sheet))
+
+
+def iter_xlsx_batches(
+    file: pathlib.Path,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    sheet: Union[str, None] = None,
+    allow_empty: bool = False,
+) -> Iterator[DeltaBatch]:
+    """Потоковый парсинг листа `.xlsx` файла колоночными пачками записей."""
+
+    for chunk in iter_xlsx_chunks(
+        file, chunk_size=chunk_size, sheet=sheet, allow_empty=allow_empty
+    ):
+        yield DeltaBatch.from_rows(chunk)
+
+
+def iter_xlsx_chunks(
+    file: pathlib.Path,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    sheet: Union[str, None] = None,
+    allow_empty: bool = False,
+) -> Iterator[List[XlsxRow]]:
+    """
+    Потоковый парсинг `.xlsx` файла.
+
+    Читает лист `sheet` (по умолчанию первый лист) книги в read-only режиме openpyxl
+    и возвращает провалидированные строки `(rep_dt, delta)` пачками не более `chunk_size`,
+    поэтому потребление памяти не зависит от размера файла.
+
+    Вызывает `ValueError` при неверной структуре файла или некорректных значениях,
+    а также при пустом листе, если не задан `allow_empty`.
+    """
+
+    if chunk_size <= 0:
+        raise ValueError("Chunk size must be positive")
+
+    workbook = openpyxl.load_workbook(file, read_only=True, data_only=True)
+    try:
+        if sheet is None:
+            worksheet = workbook.worksheets[0]
+        elif sheet in [worksheet.title for worksheet in workbook.worksheets]:
+            worksheet = workbook[sheet]
+        else:
+            raise ValueError(f"File \"{file}\" has no sheet \"{sheet}\"")
+        rows = worksheet.iter_rows(values_only=True)
+
+        header = next(rows, None)
+        if header is None:
+            if allow_empty:
+                return
+            raise ValueError(f"File \"{file}\" is empty")
+        rep_dt_idx, delta_idx = get_columns_indexes(header)
+
+        chunk = []
+        # Нумерация строк как в Excel, первая строка - заголовок
+        for row_num, row in enumerate(rows, start=2):
+            rep_dt = _get_cell(row, rep_dt_idx)
+            delta = _get_cell(row, delta_idx)
+
+            # Пустые строки (в т.ч. "хвост" листа) пропускаются
+            if rep_dt is None and delta is None:
+                continue
+
+            chunk.append((
+                _parse_rep_dt(rep_dt, row_num),
+                _parse_delta(delta, row_num),
+            ))
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+
+        if chunk:
+            yield chunk
+    finally:
+        workbook.close()
+
+
+def get_columns_indexes(header: Sequence[Any]) -> Tuple[int, int]:
+    """Возвращает индексы колонок `Rep_dt` и `Delta` в строке заголовка."""
+
+    names = [str(name).strip() if name is not None else None for name in header]
+    try:
+        return names.index(REP_DT_COLUMN), names.index(DELTA_COLUMN)
+    except ValueError:
+        raise ValueError(
+            f"Header must contain \"{REP_DT_COLUMN}\" and \"{DELTA_COLUMN}\""
+            f" columns, got {names}"
+        ) from None
+
+
+def _get_cell(row: Sequence[Any], idx: int) -> Any:
+    """Возвращает значение ячейки, учитывая "короткие" строки read-only режима."""
+
+    value = row[idx] if idx < len(row) else None
+    if isinstance(value, str) and not value.strip():
+        return None
+
+    return value
+
+
+def _parse_rep_dt(value: Any, row_num: int) -> datetime.date:
+    """Приводит значение ячейки `Rep_dt` к дате."""
+
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, datetime.date):
+        return value
+    # Дата, сохраненная числом без формата ячейки
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return from_excel(value).date()
+    if isinstance(value, str):
+        value = value.strip()
+        try:
+            return datetime.date.fromisoformat(value)
+        except ValueError:
+            pass
+        try:
+            return date_parser.parse(value).date()
+        except (ValueError, OverflowError):
+            pass
+
+    raise ValueError(f"Invalid \"{REP_DT_COLUMN}\" value in row {row_num}: {value!r}")
+
+
+def _parse_delta(value: Any, row_num: int) -> float:
+    """Приводит значение ячейки `Delta` к `float` (в т.ч. с десятичной запятой)."""
+
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            return float(value.strip().replace(",", "."))
+        except ValueError:
+            pass
+
+    raise ValueError(f"Invalid \"{DELTA_COLUMN}\" value in row {row_num}: {value!r}")
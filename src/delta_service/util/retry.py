@@ -0,0 +1,83 @@
+import random
+import time
+from dataclasses import dataclass
+from typing import Union
+
+
+# Ожидание других вызовов, пока пробный вызов полуоткрытого предохранителя не завершен
+PROBE_WAIT_SEC = 1.0
+
+
+def get_backoff_delay(
+    attempt: int,
+    base_delay_sec: float,
+    max_delay_sec: float,
+) -> float:
+    """
+    Возвращает задержку перед повторной попыткой номер `attempt` (с 1):
+    экспоненциальный рост от `base_delay_sec` до `max_delay_sec` с "полным" джиттером,
+    чтобы повторы разных файлов не приходились на один момент.
+    """
+
+    ceiling = min(max_delay_sec, base_delay_sec * 2 ** (attempt - 1))
+    return random.uniform(0, ceiling)
+
+
+@dataclass
+class CircuitBreaker:
+    """
+    Предохранитель вызовов недоступного сервиса.
+
+    После `failure_threshold` ошибок подряд размыкается на `reset_timeout_sec` сек.:
+    вызовы не выполняются. Затем пропускает один пробный вызов -
+    его успех замыкает предохранитель, ошибка - снова размыкает.
+    """
+
+    failure_threshold: int = 5
+    reset_timeout_sec: float = 30
+
+    _failures: int = 0
+    _opened_at: Union[float, None] = None
+    _probing: bool = False
+
+    def is_open(self) -> bool:
+        return self._opened_at is not None
+
+    def acquire(self) -> float:
+        """
+        Запрашивает разрешение на вызов.
+
+        Возвращает `0`, если вызов разрешен, иначе - рекомендуемое время ожидания (сек.).
+        """
+
+        if self._opened_at is None:
+            return 0
+
+        remaining = self._opened_at + self.reset_timeout_sec - time.monotonic()
+        if remaining > 0:
+            return remaining
+
+        if self._probing:
+            return PROBE_WAIT_SEC
+
+        self._probing = True
+        return 0
+
+    def record_success(self) -> None:
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+
+    def record_failure(self) -> bool:
+        """Учитывает ошибку вызова. Возвращает `True`, если предохранитель разомкнулся."""
+
+        self._failures += 1
+        if self._probing or (
+            self._opened_at is None and self._failures >= self.failure_threshold
+        ):
+            was_open = self._opened_at is not None
+            self._opened_at = time.monotonic()
+            self._probing = False
+            return not was_open
+
+        return False
@@ -0,0 +1,288 @@
+import datetime
+import threading
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Iterable, Iterator, List, Tuple, Union
+
+import numpy as np
+
+from models.db.entities import DeltaBatch, DeltaCursor, DeltaRecordWithLag
+from util.ids import ID_DTYPE, ids_to_uuids
+
+
+# Строка `(rep_dt, delta, delta_lag[, id])` в формате строк результата запроса к БД
+DeltaLagRow = Tuple[Union[datetime.date, float, uuid.UUID, None], ...]
+# Снимок индекса: колонки `(rep_dt, delta, id)`
+Series = Tuple[np.ndarray, np.ndarray, np.ndarray]
+
+
+@dataclass
+class DeltaSeriesIndex:
+    """
+    Индекс ряда `deltas` в памяти: отсортированные по `(rep_dt, id)` массивы NumPy.
+
+    Отвечает на запросы `get_delta_data` срезами и сдвигами массивов, без обращения к БД.
+    Читатели работают с неизменяемым снимком массивов, поэтому индекс можно
+    обновлять (`add`, `replace`) из другого потока параллельно с запросами.
+    Записи с одинаковым `rep_dt` упорядочены по `id`, как в запросах к БД.
+
+    До первой загрузки (`replace`) и после `invalidate` индекс не готов (`is_loaded`),
+    и читатели должны обращаться к БД.
+    """
+
+    # Снимок `(rep_dt, delta, id)` - заменяется целиком одним присваиванием
+    _series: Series = field(
+        default_factory=lambda: _concat_sorted([]))
+    _write_lock: threading.Lock = field(default_factory=threading.Lock)
+    _loaded: bool = False
+    # Счетчик изменений после загрузки, см. `replace`
+    _generation: int = 0
+
+    def __len__(self) -> int:
+        return len(self._series[0])
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._loaded
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    def replace(
+        self,
+        batches: Iterable[DeltaBatch],
+        generation: Union[int, None] = None,
+    ) -> bool:
+        """
+        Заменяет содержимое индекса (холодный старт, сверка с БД).
+
+        `generation` - значение `generation`, полученное до чтения `batches` из БД.
+        Если с тех пор индекс изменился (`add`, `invalidate`), `batches` могут не содержать
+        этих изменений или уже содержать их - замена не выполняется и возвращается `False`.
+        """
+
+        series = _concat_sorted(list(batches))
+        with self._write_lock:
+            if generation is not None and generation != self._generation:
+                return False
+            self._series = series
+            self._loaded = True
+
+        return True
+
+    def add(self, batches: Iterable[DeltaBatch], replace_dates: bool = False) -> None:
+        """
+        Добавляет загруженные в БД записи, сохраняя сортировку по `(rep_dt, id)`.
+
+        С `replace_dates` (режим загрузки `replace`) записи заменяют уже имеющиеся записи
+        с тем же `rep_dt`, а из новых записей одной даты остается последняя (с большим `id`).
+        В неготовый индекс записи не добавляются - они попадут в него при загрузке из БД.
+        """
+
+        new_series = _concat_sorted(list(batches))
+        if not len(new_series[0]):
+            return
+
+        if replace_dates:
+            new_rep_dt = new_series[0]
+            last = np.append(new_rep_dt[1:] != new_rep_dt[:-1], True)
+            new_series = tuple(column[last] for column in new_series)
+
+        with self._write_lock:
+            self._generation += 1
+            if not self._loaded:
+                return
+
+            series = self._series
+            if replace_dates:
+                kept = ~np.isin(series[0], new_series[0])
+                series = tuple(column[kept] for column in series)
+            positions = np.searchsorted(_get_keys(series), _get_keys(new_series))
+            self._series = tuple(
+                np.insert(column, positions, new_column)
+                for column, new_column in zip(series, new_series)
+            )
+
+    def invalidate(self) -> None:
+        """Помечает индекс неготовым (данные в БД изменились неизвестным образом)."""
+
+        with self._write_lock:
+            self._generation += 1
+            self._loaded = False
+
+    def get(self, rep_dt: datetime.date) -> List[float]:
+        """Возвращает значения `delta` за дату `rep_dt`."""
+
+        rep_dt_arr, delta_arr, _ = self._series
+        key = np.datetime64(rep_dt, "D")
+        start = np.searchsorted(rep_dt_arr, key, side="left")
+        stop = np.searchsorted(rep_dt_arr, key, side="right")
+
+        return delta_arr[start:stop].tolist()
+
+    def get_delta_data(
+        self,
+        lag: int = 0,
+        after: Union[DeltaCursor, None] = None,
+        limit: Union[int, None] = None,
+        date_from: Union[datetime.date, None] = None,
+        date_to: Union[datetime.date, None] = None,
+    ) -> List[DeltaRecordWithLag]:
+        """Аналог `db.crud.delta.get_delta_data` по данным индекса."""
+
+        series = self._series
+        start, stop = _get_bounds(series, after, limit, date_from, date_to)
+
+        return [
+            DeltaRecordWithLag(rep_dt=rep_dt, delta=delta, delta_lag=delta_lag, id=id_)
+            for rep_dt, delta, delta_lag, id_ in _get_rows(series, start, stop, lag, with_id=True)
+        ]
+
+    def get_delta_columns(
+        self,
+        lag: int = 0,
+        after: Union[DeltaCursor, None] = None,
+        limit: Union[int, None] = None,
+        date_from: Union[datetime.date, None] = None,
+        date_to: Union[datetime.date, None] = None,
+        with_id: bool = False,
+    ) -> Tuple[List[Any], ...]:
+        """
+        Аналог `get_delta_data`, возвращающий колонки `(rep_dt, delta, delta_lag[, id])`
+        прямо из массивов индекса, без объектов записей.
+        """
+
+        series = self._series
+        start, stop = _get_bounds(series, after, limit, date_from, date_to)
+
+        return _get_columns(series, start, stop, lag, with_id=with_id)
+
+    def iter_delta_chunks(
+        self,
+        lag: int = 0,
+        after: Union[DeltaCursor, None] = None,
+        limit: Union[int, None] = None,
+        date_from: Union[datetime.date, None] = None,
+        date_to: Union[datetime.date, None] = None,
+        with_id: bool = False,
+        passes: int = 1,
+        batch_size: int = 10_000,
+    ) -> Iterator[Tuple[int, List[DeltaLagRow]]]:
+        """
+        Аналог `db.crud.delta.stream_delta_data`: строки `(rep_dt, delta, delta_lag[, id])`
+        пачками не более `batch_size`, `passes` проходов по одному снимку индекса.
+        """
+
+        series = self._series
+        start, stop = _get_bounds(series, after, limit, date_from, date_to)
+
+        for pass_num in range(passes):
+            for batch_start in range(start, stop, batch_size):
+                yield pass_num, _get_rows(
+                    series, batch_start, min(batch_start + batch_size, stop), lag, with_id)
+
+
+def _get_bounds(
+    series: Series,
+    after: Union[DeltaCursor, None],
+    limit: Union[int, None],
+    date_from: Union[datetime.date, None],
+    date_to: Union[datetime.date, None],
+) -> Tuple[int, int]:
+    """Возвращает границы среза `[start, stop)` записей, подходящих под фильтры."""
+
+    rep_dt, _, ids = series
+
+    start, stop = 0, len(rep_dt)
+    if after is not None:
+        key = np.datetime64(after.rep_dt, "D")
+        after_date = int(np.searchsorted(rep_dt, key, side="right"))
+        if after.id is not None:
+            # Записи даты курсора упорядочены по `id`
+            first = int(np.searchsorted(rep_dt, key, side="left"))
+            after_date = first + int(np.searchsorted(
+                ids[first:after_date], after.id.bytes, side="right"))
+        start = max(start, after_date)
+    if date_from is not None:
+        start = max(start, int(np.searchsorted(
+            rep_dt, np.datetime64(date_from, "D"), side="left")))
+    if date_to is not None:
+        stop = min(stop, int(np.searchsorted(
+            rep_dt, np.datetime64(date_to, "D"), side="right")))
+    if limit is not None:
+        stop = min(stop, start + limit)
+
+    return start, max(start, stop)
+
+
+def _get_rows(
+    series: Series,
+    start: int,
+    stop: int,
+    lag: int,
+    with_id: bool = False,
+) -> List[DeltaLagRow]:
+    """
+    Возвращает строки `(rep_dt, delta, delta_lag[, id])` среза `[start, stop)`.
+
+    `delta_lag` - `delta` записи, отстоящей на `lag` записей вперед по всему ряду
+    (как `LAG(delta, -lag) OVER (ORDER BY rep_dt, id)`), `None` в конце ряда.
+    """
+
+    return list(zip(*_get_columns(series, start, stop, lag, with_id)))
+
+
+def _get_columns(
+    series: Series,
+    start: int,
+    stop: int,
+    lag: int,
+    with_id: bool = False,
+) -> Tuple[List[Any], ...]:
+    """Возвращает колонки `(rep_dt, delta, delta_lag[, id])` среза `[start, stop)` (см. `_get_rows`)."""
+
+    rep_dt, delta, ids = series
+
+    delta_lag = delta[start + lag:min(stop + lag, len(delta))].tolist()
+    delta_lag += [None] * (stop - start - len(delta_lag))
+
+    columns = (rep_dt[start:stop].tolist(), delta[start:stop].tolist(), delta_lag)
+    if with_id:
+        columns += (ids_to_uuids(ids[start:stop]),)
+
+    return columns
+
+
+def _concat_sorted(batches: List[DeltaBatch]) -> Series:
+    """Объединяет пачки в массивы, отсортированные по `(rep_dt, id)`."""
+
+    if not batches:
+        return (
+            np.empty(0, dtype="datetime64[D]"),
+            np.empty(0, dtype=np.float64),
+            np.empty(0, dtype=ID_DTYPE),
+        )
+
+    rep_dt = np.concatenate([batch.rep_dt for batch in batches])
+    delta = np.concatenate([batch.delta for batch in batches])
+    ids = np.concatenate([batch.id for batch in batches])
+    order = np.lexsort((ids, rep_dt))
+
+    return rep_dt[order], delta[order], ids[order]
+
+
+def _get_keys(series: Series) -> np.ndarray:
+    """
+    Возвращает ключи сортировки `(rep_dt, id)` строками байт: побайтовое сравнение
+    ключей совпадает с порядком записей (для `searchsorted` по обеим колонкам сразу).
+    """
+
+    rep_dt, _, ids = series
+
+    keys = np.empty(len(rep_dt), dtype=[("rep_dt", ">u8"), ("id", ID_DTYPE)])
+    # Смена знакового бита - отрицательные даты (до 1970 г.) идут раньше положительных
+    keys["rep_dt"] = rep_dt.view(np.int64).astype(np.uint64) ^ np.uint64(1 << 63)
+    keys["id"] = ids
+
+    return keys.view("S24")
@@ -0,0 +1,186 @@
+import os
+import pathlib
+import threading
+import time
+from dataclasses import dataclass
+from typing import List, Sequence, Union
+
+import numpy as np
+
+from models.db.entities import DeltaBatch
+
+
+# Колонки пачек, сохраняемые в `.npy` файлы
+SPILLED_COLUMNS = ("rep_dt", "delta", "id")
+# Суффикс файла с кол-вом строк пачек записи - признак полностью записанных пачек
+BATCHES_SUFFIX = "batches"
+# Через сколько сек. временные файлы, оставшиеся после сбоя при записи, удаляются
+STALE_TEMP_FILE_SEC = 3600
+
+
+@dataclass
+class SpillStore:
+    """
+    Хранилище пачек записей на диске по ключу `key`.
+
+    Колонки пачек хранятся `.npy` файлами `<key>.<номер>.{rep_dt,delta,id}.npy`
+    и читаются отображением с диска (`mmap`), без копирования в память.
+    Файлы записываются во временные и переименовываются, а кол-во строк пачек
+    (`<key>.batches.npy`) записывается последним, поэтому частично записанные
+    пачки не читаются, а директорию можно разделять между экземплярами сервиса.
+
+    `max_entry_mb` - Макс. объем пачек одного ключа (`None` - без ограничения).
+    `max_total_mb` - Макс. объем хранилища (`None` - без ограничения), при превышении
+    удаляются пачки ключей, которые дольше всего не использовались.
+    """
+
+    directory: pathlib.Path
+    max_entry_mb: Union[int, None] = None
+    max_total_mb: Union[int, None] = None
+
+    def save(
+        self,
+        key: str,
+        batches: Sequence[DeltaBatch],
+        start: int = 0,
+    ) -> Union[List[DeltaBatch], None]:
+        """
+        Сохраняет пачки и возвращает их же, отображенные с диска.
+        `None` - пачки не сохранены (превышен объем или пачек нет).
+
+        `start` - номер первой пачки (для дозаписи пачек того же `key`).
+        """
+
+        size = sum(batch.nbytes for batch in batches)
+        if not batches or size > self._get_limit(self.max_entry_mb, self.max_total_mb):
+            return None
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._evict(size, keep=key)
+
+        if start:
+            lengths = self._load_lengths(key)[:start]
+        else:
+            # Прежние пачки ключа перестают читаться до записи новых
+            self._get_path(key, BATCHES_SUFFIX).unlink(missing_ok=True)
+            lengths = np.empty(0, dtype=np.int64)
+        for num, batch in enumerate(batches, start=start):
+            for column in SPILLED_COLUMNS:
+                self._save_array(self._get_path(key, f"{num}.{column}"), getattr(batch, column))
+        lengths = np.concatenate([lengths, [len(batch) for batch in batches]])
+        self._save_array(self._get_path(key, BATCHES_SUFFIX), lengths.astype(np.int64))
+
+        return self._load_batches(key, range(start, start + len(batches)))
+
+    def load(self, key: str) -> Union[List[DeltaBatch], None]:
+        """Возвращает сохраненные пачки, отображенные с диска (`None`, если пачки не сохранены)."""
+
+        try:
+            lengths = self._load_lengths(key)
+            batches = self._load_batches(key, range(len(lengths)))
+            # Время использования - для удаления при превышении объема
+            os.utime(self._get_path(key, BATCHES_SUFFIX))
+        except FileNotFoundError:
+            return None
+        except ValueError:
+            # Поврежденные файлы (например, после ручного копирования)
+            self.remove(key)
+            return None
+
+        if [len(batch) for batch in batches] != lengths.tolist():
+            self.remove(key)
+            return None
+
+        return batches
+
+    def remove(self, key: Union[str, None] = None) -> None:
+        """Удаляет пачки `key` (без `key` - все пачки хранилища; отображенные пачки остаются доступны)."""
+
+        if not self.directory.exists():
+            return
+
+        if key is None:
+            for path in self.directory.glob("*.npy"):
+                path.unlink(missing_ok=True)
+            return
+
+        # Сначала признак полностью записанных пачек
+        self._get_path(key, BATCHES_SUFFIX).unlink(missing_ok=True)
+        for path in self.directory.glob(f"{key}.*.npy"):
+            path.unlink(missing_ok=True)
+
+    def get_size(self) -> int:
+        """Объем хранилища (байт)."""
+
+        if not self.directory.exists():
+            return 0
+
+        return sum(path.stat().st_size for path in self.directory.glob("*.npy"))
+
+    def _evict(self, size: int, keep: str) -> None:
+        """
+        Освобождает место под `size` байт: удаляет пачки ключей (кроме `keep`),
+        которые дольше всего не использовались, и временные файлы, оставшиеся после сбоев.
+        """
+
+        now = time.time()
+        for path in self.directory.glob("*.tmp"):
+            try:
+                if now - path.stat().st_mtime > STALE_TEMP_FILE_SEC:
+                    path.unlink(missing_ok=True)
+            except FileNotFoundError:
+                continue
+
+        if self.max_total_mb is None:
+            return
+
+        entries = []
+        total = 0
+        for path in self.directory.glob(f"*.{BATCHES_SUFFIX}.npy"):
+            key = path.name[:-len(f".{BATCHES_SUFFIX}.npy")]
+            try:
+                used = path.stat().st_mtime
+                entry_size = sum(
+                    entry.stat().st_size for entry in self.directory.glob(f"{key}.*.npy"))
+            except FileNotFoundError:
+                continue
+            total += entry_size
+            if key != keep:
+                entries.append((used, key, entry_size))
+
+        limit = self.max_total_mb * 1024 * 1024
+        for _, key, entry_size in sorted(entries):
+            if total + size <= limit:
+                break
+            self.remove(key)
+            total -= entry_size
+
+    def _load_lengths(self, key: str) -> np.ndarray:
+        return np.load(self._get_path(key, BATCHES_SUFFIX))
+
+    def _load_batches(self, key: str, nums: range) -> List[DeltaBatch]:
+        return [
+            DeltaBatch(**{
+                column: np.load(self._get_path(key, f"{num}.{column}"), mmap_mode="r")
+                for column in SPILLED_COLUMNS
+            })
+            for num in nums
+        ]
+
+    def _get_path(self, key: str, suffix: str) -> pathlib.Path:
+        return self.directory / f"{key}.{suffix}.npy"
+
+    @staticmethod
+    def _get_limit(*limits_mb: Union[int, None]) -> float:
+        limits = [limit * 1024 * 1024 for limit in limits_mb if limit is not None]
+        return min(limits, default=float("inf"))
+
+    @staticmethod
+    def _save_array(path: pathlib.Path, array: np.ndarray) -> None:
+        temp_path = path.with_name(f"{path.name}.{os.getpid()}-{threading.get_ident()}.tmp")
+        try:
+            with open(temp_path, "wb") as file:
+                np.save(file, np.ascontiguousarray(array))
+            os.replace(temp_path, path)
+        finally:
+            temp_path.unlink(missing_ok=True)
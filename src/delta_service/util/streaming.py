@@ -0,0 +1,208 @@
+import csv
+import io
+from typing import Iterable, Iterator, Sequence, Callable, Any, Tuple, Union, List
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+
+# Пачка строк с номером прохода по результату запроса (см. `db.crud.delta.StreamChunk`)
+Chunk = Tuple[int, Sequence[Sequence[Any]]]
+
+
+def iter_columns_json(
+    chunks: Iterable[Chunk],
+    columns: Sequence[str],
+    dumps: Callable[[Any], str],
+    fill_none: Any = "",
+    limit: Union[int, None] = None,
+    format_cursor: Union[Callable[[Sequence[Any]], str], None] = None,
+) -> Iterator[str]:
+    """
+    Потоково сериализует строки в JSON вида
+    `{"records": {<колонка>: {<номер строки>: <значение>}}}` - побайтно тот же,
+    что у непотокового ответа (`_make_records_response` в `blueprints.delta`).
+
+    Ожидает по одному проходу по результату на каждую колонку: проход `i`
+    заполняет `i`-ую по алфавиту колонку (ключи JSON ответа Flask сортируются).
+    `columns` - имена колонок в порядке значений в строке (значения после них не выводятся).
+    `None` значения заменяются на `fill_none` (как `fillna` в pandas пути).
+    При заданном `limit` в конце добавляется `next_after` - курсор следующей страницы,
+    собранный `format_cursor` из последней строки.
+    """
+
+    order = sorted(range(len(columns)), key=lambda i: columns[i])
+
+    yield '{"records":{'
+
+    opened = -1
+    rows_count = 0
+    last_row = None
+
+    for pass_num, rows in chunks:
+        # Открытие колонки текущего прохода (в т.ч. пустых колонок перед ней)
+        while opened < pass_num:
+            yield _open_column(opened, columns[order[opened + 1]], dumps)
+            opened += 1
+            rows_count = 0
+
+        col = order[pass_num]
+        values = {
+            i: row[col] if row[col] is not None else fill_none
+            for i, row in enumerate(rows, start=rows_count)
+        }
+        body = dumps(values)[1:-1]
+        if body:
+            yield ("," if rows_count else "") + body
+
+        rows_count += len(rows)
+        if rows:
+            last_row = rows[-1]
+
+    while opened < len(columns) - 1:
+        yield _open_column(opened, columns[order[opened + 1]], dumps)
+        opened += 1
+        rows_count = 0
+
+    yield "}}"
+
+    if limit is not None:
+        next_after = None
+        if rows_count == limit and last_row is not None:
+            next_after = format_cursor(last_row)
+        yield f',"next_after":{dumps(next_after)}'
+
+    # Перевод строки в конце - как у ответа `jsonify`
+    yield "}\n"
+
+
+def iter_rows_ndjson(
+    chunks: Iterable[Chunk],
+    columns: Sequence[str],
+    dumps: Callable[[Any], str],
+) -> Iterator[str]:
+    """Потоково сериализует строки в NDJSON: по одному JSON объекту на строку."""
+
+    for _, rows in chunks:
+        yield "".join(dumps(dict(zip(columns, row))) + "\n" for row in rows)
+
+
+def iter_csv(
+    chunks: Iterable[Chunk],
+    columns: Sequence[str],
+) -> Iterator[str]:
+    """
+    Потоково сериализует строки в CSV с заголовком (даты в ISO формате).
+
+    Значения строк после колонок `columns` не выводятся.
+    """
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+
+    writer.writerow(columns)
+    for _, rows in chunks:
+        if rows and len(rows[0]) > len(columns):
+            rows = [row[:len(columns)] for row in rows]
+        writer.writerows(rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+    yield buffer.getvalue()
+
+
+def iter_arrow_ipc(
+    chunks: Iterable[Chunk],
+    columns: Sequence[str],
+) -> Iterator[bytes]:
+    """
+    Потоково сериализует строки в Arrow IPC stream:
+    по одному `RecordBatch` на каждую пачку строк.
+    """
+
+    schema = _get_arrow_schema(columns)
+    sink = _BytesSink()
+
+    with pa.ipc.new_stream(sink, schema) as writer:
+        for _, rows in chunks:
+            writer.write_batch(_rows_to_record_batch(rows, schema))
+            yield sink.drain()
+
+    yield sink.drain()
+
+
+def iter_parquet(
+    chunks: Iterable[Chunk],
+    columns: Sequence[str],
+) -> Iterator[bytes]:
+    """
+    Потоково сериализует строки в Parquet:
+    по одной row group на каждую пачку строк, метаданные файла - в конце.
+    """
+
+    schema = _get_arrow_schema(columns)
+    sink = _BytesSink()
+
+    with pq.ParquetWriter(sink, schema) as writer:
+        for _, rows in chunks:
+            writer.write_batch(_rows_to_record_batch(rows, schema))
+            yield sink.drain()
+
+    yield sink.drain()
+
+
+class _BytesSink(io.RawIOBase):
+    """Накопитель записанных байт, которые забираются по мере готовности."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._parts: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data: bytes) -> int:
+        self._parts.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts.clear()
+        return data
+
+
+def _get_arrow_schema(columns: Sequence[str]) -> pa.Schema:
+    """Схема Arrow для колонок ответа: `Rep_dt` - дата, остальные - `float64`."""
+
+    return pa.schema([
+        pa.field(name, pa.date32() if name == "Rep_dt" else pa.float64())
+        for name in columns
+    ])
+
+
+def _rows_to_record_batch(
+    rows: Sequence[Sequence[Any]],
+    schema: pa.Schema,
+) -> pa.RecordBatch:
+    """Собирает `RecordBatch` из колонок пачки строк."""
+
+    # Значения строк после колонок схемы отбрасываются `zip`
+    values = list(zip(*rows)) if rows else [() for _ in schema]
+    arrays = [
+        pa.array(column, type=field.type) for column, field in zip(values, schema)
+    ]
+
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def _open_column(opened: int, name: str, dumps: Callable[[Any], str]) -> str:
+    """Закрывает предыдущую колонку (если была) и открывает колонку `name`."""
+
+    prefix = "}," if opened >= 0 else ""
+    return f"{prefix}{dumps(name)}:{{"
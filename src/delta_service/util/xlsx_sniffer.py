@@ -0,0 +1,276 @@
+import pathlib
+import posixpath
+import re
+import zipfile
+from dataclasses import dataclass
+from typing import Dict, List, Tuple, Union, Any, IO
+from xml.etree.ElementTree import Element, iterparse, ParseError
+
+from util.parsers import get_columns_indexes
+
+
+WORKBOOK_PATH = "xl/workbook.xml"
+WORKBOOK_RELS_PATH = "xl/_rels/workbook.xml.rels"
+
+# Окончания типов связей книги (без пространства имен: у strict OOXML оно другое)
+WORKSHEET_REL_TYPE = "/worksheet"
+SHARED_STRINGS_REL_TYPE = "/sharedStrings"
+
+CELL_REF_PATTERN = re.compile(r"([A-Z]+)(\d+)")
+
+
+@dataclass
+class XlsxSheetInfo:
+    """
+    Сведения о листе `.xlsx` файла, полученные без парсинга листа.
+
+    `dimension` - диапазон листа из его заголовка (`A1:B1001`), если он записан.
+    `rows` - кол-во строк данных (без заголовка) по `dimension`, включая пустые строки,
+    `None`, если диапазон неизвестен.
+    `rep_dt_column`, `delta_column` - индексы колонок `Rep_dt` и `Delta`.
+    """
+
+    sheet: str
+    dimension: Union[str, None]
+    rows: Union[int, None]
+    rep_dt_column: int
+    delta_column: int
+
+
+def sniff_xlsx_file(file: pathlib.Path, sheet: Union[str, None] = None) -> XlsxSheetInfo:
+    """
+    Быстро проверяет `.xlsx` файл до парсинга: zip контейнер, лист `sheet`
+    (по умолчанию первый), его диапазон и строку заголовка с колонками `Rep_dt` и `Delta`.
+
+    Из XML листа читается только начало - до конца первой строки, поэтому время
+    проверки не зависит от размера файла. Вызывает `ValueError`, если файл
+    не удастся распарсить (те же проверки структуры, что у `util.parsers`).
+    """
+
+    try:
+        with zipfile.ZipFile(file) as archive:
+            sheet_name, sheet_path, strings_path = _find_sheet(archive, file, sheet)
+            with archive.open(sheet_path) as sheet_xml:
+                dimension, header = _read_header(sheet_xml)
+
+            if header is None:
+                raise ValueError(f"File \"{file}\" is empty")
+            names = _resolve_header(archive, strings_path, header)
+    except zipfile.BadZipFile:
+        raise ValueError(f"File \"{file}\" is not a valid .xlsx (zip) file") from None
+    except (KeyError, ParseError) as e:
+        raise ValueError(f"File \"{file}\" has invalid .xlsx structure: {e}") from None
+
+    rep_dt_column, delta_column = get_columns_indexes(names)
+
+    return XlsxSheetInfo(
+        sheet=sheet_name,
+        dimension=dimension,
+        rows=_get_dimension_rows(dimension),
+        rep_dt_column=rep_dt_column,
+        delta_column=delta_column,
+    )
+
+
+def _find_sheet(
+    archive: zipfile.ZipFile,
+    file: pathlib.Path,
+    sheet: Union[str, None],
+) -> Tuple[str, str, Union[str, None]]:
+    """
+    Возвращает имя листа, путь его XML в архиве и путь таблицы общих строк
+    (как `openpyxl`: первый лист - первый лист с данными в порядке книги).
+    """
+
+    # Связи книги: id -> (тип, путь в архиве)
+    rels = {}
+    with archive.open(WORKBOOK_RELS_PATH) as rels_xml:
+        for _, elem in iterparse(rels_xml):
+            if _local_name(elem) == "Relationship":
+                rels[elem.get("Id")] = (
+                    elem.get("Type", ""), _resolve_target(elem.get("Target", "")))
+
+    strings_path = next(
+        (path for rel_type, path in rels.values() if rel_type.endswith(SHARED_STRINGS_REL_TYPE)),
+        None,
+    )
+
+    with archive.open(WORKBOOK_PATH) as workbook_xml:
+        for _, elem in iterparse(workbook_xml):
+            if _local_name(elem) != "sheet":
+                continue
+
+            rel_id = next(
+                (value for name, value in elem.attrib.items() if _local_name(name) == "id"),
+                None,
+            )
+            rel_type, path = rels.get(rel_id, ("", ""))
+            if not rel_type.endswith(WORKSHEET_REL_TYPE):
+                continue
+
+            name = elem.get("name")
+            if sheet is None or name == sheet:
+                return name, path, strings_path
+
+    if sheet is None:
+        raise ValueError(f"File \"{file}\" has no worksheets")
+    raise ValueError(f"File \"{file}\" has no sheet \"{sheet}\"")
+
+
+def _read_header(sheet_xml: IO[bytes]) -> Tuple[Union[str, None], Union[List[Tuple[str, str]], None]]:
+    """
+    Читает диапазон листа и ячейки первой строки (`(тип, значение)` по индексу колонки).
+
+    Заголовок - первая строка листа (как у парсеров): если первой записана не она,
+    заголовок пустой. `None` - в листе нет строк.
+    """
+
+    dimension = None
+
+    for event, elem in iterparse(sheet_xml, events=("start", "end")):
+        name = _local_name(elem)
+        if event == "start":
+            continue
+
+        if name == "dimension":
+            dimension = elem.get("ref")
+        elif name == "row":
+            if elem.get("r", "1") != "1":
+                return dimension, []
+
+            cells = {}
+            for position, cell in enumerate(c for c in elem if _local_name(c) == "c"):
+                index = _get_column_index(cell.get("r"), position)
+                cells[index] = (cell.get("t", "n"), _get_cell_text(cell))
+
+            header = [None] * (max(cells) + 1 if cells else 0)
+            for index, value in cells.items():
+                header[index] = value
+            return dimension, header
+        elif name == "sheetData":
+            return dimension, None
+
+    return dimension, None
+
+
+def _resolve_header(
+    archive: zipfile.ZipFile,
+    strings_path: Union[str, None],
+    header: List[Union[Tuple[str, str], None]],
+) -> List[Any]:
+    """Возвращает значения ячеек заголовка (строки из таблицы общих строк подставляются)."""
+
+    indexes = {int(value) for cell_type, value in filter(None, header) if cell_type == "s"}
+    strings = _read_shared_strings(archive, strings_path, max(indexes)) if indexes else {}
+
+    names = []
+    for cell in header:
+        if cell is None:
+            names.append(None)
+            continue
+
+        cell_type, value = cell
+        if cell_type == "s":
+            value = strings.get(int(value))
+        names.append(value)
+
+    return names
+
+
+def _read_shared_strings(
+    archive: zipfile.ZipFile,
+    strings_path: Union[str, None],
+    max_index: int,
+) -> Dict[int, str]:
+    """Читает таблицу общих строк только до строки `max_index` включительно."""
+
+    strings = {}
+    if strings_path is None:
+        return strings
+
+    with archive.open(strings_path) as strings_xml:
+        for _, elem in iterparse(strings_xml):
+            if _local_name(elem) != "si":
+                continue
+
+            strings[len(strings)] = _get_text(elem)
+            if len(strings) > max_index:
+                break
+            elem.clear()
+
+    return strings
+
+
+def _get_cell_text(cell: Element) -> Union[str, None]:
+    """Возвращает текст значения ячейки (`<v>` или строки `<is>`)."""
+
+    for child in cell:
+        name = _local_name(child)
+        if name == "v":
+            return child.text
+        if name == "is":
+            return _get_text(child)
+
+    return None
+
+
+def _get_text(elem: Element) -> str:
+    """Текст строки (`<t>` и фрагменты `<r><t>`), без фонетических подсказок `<rPh>`."""
+
+    parts = []
+    for child in elem:
+        name = _local_name(child)
+        if name == "t":
+            parts.append(child.text or "")
+        elif name == "r":
+            parts.extend(t.text or "" for t in child if _local_name(t) == "t")
+
+    return "".join(parts)
+
+
+def _get_column_index(ref: Union[str, None], position: int) -> int:
+    """Индекс колонки по адресу ячейки (`B1` -> `1`), без адреса - по позиции в строке."""
+
+    match = CELL_REF_PATTERN.fullmatch(ref or "")
+    if match is None:
+        return position
+
+    index = 0
+    for letter in match.group(1):
+        index = index * 26 + ord(letter) - ord("A") + 1
+
+    return index - 1
+
+
+def _get_dimension_rows(dimension: Union[str, None]) -> Union[int, None]:
+    """
+    Кол-во строк данных по диапазону листа. Диапазон из одной ячейки не учитывается -
+    некоторые программы записывают `A1` независимо от содержимого.
+    """
+
+    if not dimension or ":" not in dimension:
+        return None
+
+    match = CELL_REF_PATTERN.fullmatch(dimension.split(":")[1].replace("$", ""))
+    if match is None:
+        return None
+
+    return max(0, int(match.group(2)) - 1)
+
+
+def _resolve_target(target: str) -> str:
+    """Путь цели связи книги в архиве (относительно `xl/` или от корня архива)."""
+
+    if target.startswith("/"):
+        return target.lstrip("/")
+
+    return posixpath.normpath(posixpath.join(posixpath.dirname(WORKBOOK_PATH), target))
+
+
+def _local_name(tag: Union[str, Element]) -> str:
+    """Имя тега или атрибута без пространства имен."""
+
+    if isinstance(tag, Element):
+        tag = tag.tag
+
+    return tag.rsplit("}", 1)[-1]
@@ -1,31 +1,88 @@
 import asyncio
-import threading
 import datetime
+import multiprocessing
+import threading
 import pathlib
+import socket
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass, field
-from typing import Union, List, Sequence, Set
-from functools import partial
+from typing import Union, Set, Iterable, List, Dict, Callable, Sequence
 
 from sqlalchemy.ext.asyncio import AsyncEngine
-import pandas as pd
 from loguru import logger
 
-from db.events import get_database_session
-from db.crud.delta import put_delta_data
-from models.db.entities import DeltaRecord
-from util.parsers import parse_xlsx_as_data_frame
-
-
-@dataclass
-class XlsxFileRow:
-    __slots__ = ("rep_dt", "delta")
-
-    rep_dt: datetime.date
-    delta: float
+from db.events import get_database_session, is_connection_error
+from db.crud.delta_lags import DEFAULT_LAG_VIEW_LAGS, sync_delta_lags, validate_lags
+from db.crud.partitions import ensure_delta_partitions, add_months
+from db.crud.compaction import has_unique_rep_dt
+from db.crud.delta import (
+    COMMIT_MODE_SINGLE,
+    COMMIT_MODES,
+    INGEST_MODE_APPEND,
+    INGEST_MODE_REPLACE,
+    INGEST_MODES,
+    LOAD_STRATEGY_AUTO,
+    LOAD_STRATEGIES,
+    DEFAULT_LOAD_CHUNK_SIZE,
+    DEFAULT_COPY_THRESHOLD,
+)
+from ingest.claims import IngestLease, DEFAULT_CLAIM_LEASE_SEC
+from ingest.jobs import IngestJob
+from ingest.stages import (
+    IngestStages,
+    STAGE_VALIDATE,
+    STAGE_PARSE,
+    STAGE_UPLOAD,
+    STAGE_FINALIZE,
+    PIPELINE_STAGES,
+)
+from ingest.storage import (
+    JobStorage,
+    DEFAULT_RETRY_MEMORY_LIMIT_MB,
+    DEFAULT_STAGING_MAX_FILE_MB,
+    DEFAULT_STAGING_MAX_MB,
+)
+from models.db.entities import DeltaBatch
+from util.parsers import DEFAULT_CHUNK_SIZE, PARSER_MODE_STREAMING, PARSER_MODES
+from util.inotify import InotifyWatcher, is_inotify_available, IN_Q_OVERFLOW
+from util.files import FileKey, get_file_key, list_xlsx_files
+from util.retry import CircuitBreaker, get_backoff_delay
+from util.spill import SpillStore
+from util.claims import ClaimDirectory, validate_worker_id
+from util.metrics import REGISTRY
+
+
+# Способы обнаружения новых `.xlsx` файлов
+WATCH_MODE_AUTO = "auto"
+WATCH_MODE_INOTIFY = "inotify"
+WATCH_MODE_POLL = "poll"
+WATCH_MODES = (WATCH_MODE_AUTO, WATCH_MODE_INOTIFY, WATCH_MODE_POLL)
+
+# Период проверки стоп-сигнала во время ожидания
+STOP_CHECK_INTERVAL_SEC = 1
+# Период логирования глубины очереди конвейера
+BACKLOG_LOG_INTERVAL_SEC = 30
+# Период проверки места в очереди перед захватом файла
+QUEUE_CHECK_INTERVAL_SEC = 0.1
+
+DEFAULT_QUEUE_SIZE = 16
+DEFAULT_VALIDATE_CONCURRENCY = 4
+DEFAULT_UPLOAD_CONCURRENCY = 4
+
+DEFAULT_RETRY_BASE_DELAY_SEC = 1.0
+DEFAULT_RETRY_MAX_DELAY_SEC = 60.0
+# На сколько месяцев вперед создаются партиции `deltas`
+DEFAULT_PARTITION_AHEAD_MONTHS = 12
+
+INGEST_BACKLOG_FILES = REGISTRY.gauge(
+    "delta_ingest_backlog_files",
+    "Files in ingest pipeline by state (see XlsxFileHandler.get_backlog)",
+    labelnames=("state",),
+)
 
 
 @dataclass
-class XlsxFileHandler:
+class XlsxFileHandler(IngestStages):
     """
     Содержит в себе логику работы с `.xlsx` файлами.
     
@@ -37,17 +94,131 @@ class XlsxFileHandler:
     `db_engine` - Асинхронный движок, для создания сессий в БД.
     `failed_xlsx_dir` - Директория для "необрабатываемых" .xlsx файлов.
     `scan_dir_interval_sec` - Интервал проверки директории с `.xlsx` файлами на наличие новых файлов.
+    Остальные параметры соответствуют переменным окружения `XLSX_*` и `DB_*` (см. README).
     """
 
     db_engine: AsyncEngine
     failed_xlsx_dir: pathlib.Path = pathlib.Path("./failed_xlsx")
     scan_dir_interval_sec: int = 60
-
-    # Для хранения ссылок на активные задачи работы с .xlsx файлами
-    _active_tasks: Set = field(default_factory=set)
+    watch_mode: str = WATCH_MODE_AUTO
+    parser_mode: str = PARSER_MODE_STREAMING
+    chunk_size: int = DEFAULT_CHUNK_SIZE
+    parse_workers: int = 0
+    queue_size: int = DEFAULT_QUEUE_SIZE
+    validate_concurrency: int = DEFAULT_VALIDATE_CONCURRENCY
+    upload_concurrency: int = DEFAULT_UPLOAD_CONCURRENCY
+    retry_base_delay_sec: float = DEFAULT_RETRY_BASE_DELAY_SEC
+    retry_max_delay_sec: float = DEFAULT_RETRY_MAX_DELAY_SEC
+    circuit_failure_threshold: int = 5
+    circuit_reset_sec: float = 30
+    retry_memory_limit_mb: int = DEFAULT_RETRY_MEMORY_LIMIT_MB
+    spill_dir: pathlib.Path = pathlib.Path("./spilled_xlsx")
+    staging_dir: pathlib.Path = pathlib.Path("./staged_xlsx")
+    staging_max_file_mb: int = DEFAULT_STAGING_MAX_FILE_MB
+    staging_max_mb: int = DEFAULT_STAGING_MAX_MB
+    load_strategy: str = LOAD_STRATEGY_AUTO
+    load_chunk_size: int = DEFAULT_LOAD_CHUNK_SIZE
+    copy_threshold: int = DEFAULT_COPY_THRESHOLD
+    commit_mode: str = COMMIT_MODE_SINGLE
+    ingest_mode: str = INGEST_MODE_APPEND
+    lag_view_lags: Sequence[int] = DEFAULT_LAG_VIEW_LAGS
+    partition_ahead_months: int = DEFAULT_PARTITION_AHEAD_MONTHS
+    claim_files: bool = False
+    worker_id: Union[str, None] = None
+    claim_lease_sec: float = DEFAULT_CLAIM_LEASE_SEC
+    sniff_files: bool = True
+    notify_changes: bool = False
+    on_ingest: Union[Callable[[Union[List[DeltaBatch], None]], None], None] = None
+
+    # Task-и обработчиков стадий конвейера
+    _stage_tasks: Set[asyncio.Task] = field(default_factory=set)
+    # Task-и повторной постановки замененных файлов в обработку
+    _schedule_tasks: Set[asyncio.Task] = field(default_factory=set)
+    # Ограниченные очереди стадий конвейера (стадия -> очередь на входе стадии)
+    _queues: Dict[str, asyncio.Queue] = field(default_factory=dict)
+    # Кол-во файлов, обрабатываемых каждой стадией в данный момент
+    _stage_active: Dict[str, int] = field(default_factory=dict)
+    # Файлы в обработке (путь -> версия файла на момент постановки в обработку)
+    _in_flight: Dict[pathlib.Path, FileKey] = field(default_factory=dict)
     # Флаг регуляции процесса работы
     _work_flag: threading.Event = field(default_factory=threading.Event)
     _worker_thread: Union[threading.Thread, None] = None
+    # Файлы, ожидающие повторного обращения к БД
+    _retrying: Set[IngestJob] = field(default_factory=set)
+    # Предохранитель обращений к БД (общий для всех стадий)
+    _breaker: Union[CircuitBreaker, None] = None
+    # Пачки файлов, ожидающих повторной загрузки (`spill_dir`, `staging_dir`)
+    _storage: Union[JobStorage, None] = None
+    # Пул процессов парсинга (при `parse_workers` > 0)
+    _parse_executor: Union[ProcessPoolExecutor, None] = None
+    # Директория захваченных файлов (при `claim_files`)
+    _claims: Union[ClaimDirectory, None] = None
+    # Аренда обработчика (при `claim_files`)
+    _lease: Union[IngestLease, None] = None
+
+    def __post_init__(self) -> None:
+        if self.watch_mode not in WATCH_MODES:
+            raise ValueError(
+                f"Unknown watch mode \"{self.watch_mode}\","
+                f" expected one of {WATCH_MODES}"
+            )
+        if self.parser_mode not in PARSER_MODES:
+            raise ValueError(
+                f"Unknown parser mode \"{self.parser_mode}\","
+                f" expected one of {PARSER_MODES}"
+            )
+        if self.parse_workers < 0:
+            raise ValueError("Parse workers count must not be negative")
+        if self.queue_size <= 0:
+            raise ValueError("Pipeline queue size must be positive")
+        if self.validate_concurrency <= 0 or self.upload_concurrency <= 0:
+            raise ValueError("Pipeline stage concurrency must be positive")
+        if self.load_strategy not in LOAD_STRATEGIES:
+            raise ValueError(
+                f"Unknown load strategy \"{self.load_strategy}\","
+                f" expected one of {LOAD_STRATEGIES}"
+            )
+
+        if self.commit_mode not in COMMIT_MODES:
+            raise ValueError(
+                f"Unknown commit mode \"{self.commit_mode}\","
+                f" expected one of {COMMIT_MODES}"
+            )
+        if self.ingest_mode not in INGEST_MODES:
+            raise ValueError(
+                f"Unknown ingest mode \"{self.ingest_mode}\","
+                f" expected one of {INGEST_MODES}"
+            )
+        validate_lags(self.lag_view_lags)
+
+        if self.staging_max_file_mb < 0 or self.staging_max_mb < 0:
+            raise ValueError("Staging size limits must not be negative")
+        staging = None
+        if self.staging_max_mb > 0:
+            staging = SpillStore(
+                directory=self.staging_dir,
+                max_entry_mb=self.staging_max_file_mb,
+                max_total_mb=self.staging_max_mb,
+            )
+
+        if self.claim_files:
+            if self.claim_lease_sec <= 0:
+                raise ValueError("Claim lease duration must be positive")
+            if self.worker_id is None:
+                self.worker_id = socket.gethostname()
+            validate_worker_id(self.worker_id)
+            # Перенесенные на диск пачки удаляются при запуске - у каждого обработчика свои
+            self.spill_dir = self.spill_dir / self.worker_id
+        self._storage = JobStorage(
+            spill=SpillStore(directory=self.spill_dir),
+            staging=staging,
+            retry_memory_limit_mb=self.retry_memory_limit_mb,
+        )
+
+        self._breaker = CircuitBreaker(
+            failure_threshold=self.circuit_failure_threshold,
+            reset_timeout_sec=self.circuit_reset_sec,
+        )
 
     def start_scan(self, directory: Union[str, pathlib.Path]) -> None:
         """Метод запуска обработчика `.xlsx` файлов."""
@@ -61,6 +232,19 @@ class XlsxFileHandler:
         if self._worker_thread is not None:
             return
 
+        if self.claim_files:
+            self._claims = ClaimDirectory(directory, self.worker_id)
+            self._lease = IngestLease(
+                db_engine=self.db_engine,
+                claims=self._claims,
+                breaker=self._breaker,
+                schedule=self._schedule_later,
+                lease_sec=self.claim_lease_sec,
+            )
+
+        INGEST_BACKLOG_FILES.set_function(
+            lambda: {(state,): count for state, count in self.get_backlog().items()})
+
         self._worker_thread = threading.Thread(
             target=self._scan_dir, args=(directory,))
         self._worker_thread.start()
@@ -76,6 +260,7 @@ class XlsxFileHandler:
         self._work_flag.clear()
         self._worker_thread.join()
         self._worker_thread = None
+        INGEST_BACKLOG_FILES.set_function(None)
 
     def _scan_dir(self, directory: pathlib.Path) -> None:
         """Инициализирует процесс асинхронного ожидания `.xlsx` файлов."""
@@ -90,131 +275,299 @@ class XlsxFileHandler:
 
         logger.debug("xlsx file hanler is started")
 
-        # Непрерывный цикл работы до стоп-сигнала
-        while self._work_flag.isSet():
-            xlsx_to_process = []
+        if self.parse_workers > 0:
+            # spawn - дочерние процессы не наследуют потоки и соединения родителя
+            self._parse_executor = ProcessPoolExecutor(
+                max_workers=self.parse_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+
+        try:
+            await self._prepare_database()
+            self._start_pipeline()
+
+            if self._get_watch_mode() == WATCH_MODE_INOTIFY:
+                await self._watch_dir_events(directory)
+            else:
+                await self._poll_dir(directory)
+
+            # Ожидание обработки уже принятых в конвейер файлов
+            await self._drain_pipeline()
+        finally:
+            for task in self._stage_tasks:
+                task.cancel()
+            await asyncio.gather(*self._stage_tasks, return_exceptions=True)
+            self._stage_tasks.clear()
+
+            if self._lease is not None:
+                await self._lease.release()
+
+            if self._parse_executor is not None:
+                self._parse_executor.shutdown(cancel_futures=True)
+                self._parse_executor = None
+            # Пул соединений движка привязан к event loop-у этого потока
+            await self.db_engine.dispose()
+
+    def _start_pipeline(self) -> None:
+        """Создает ограниченные очереди между стадиями и Task-и обработчиков стадий."""
+
+        self._queues = {
+            stage: asyncio.Queue(maxsize=self.queue_size) for stage in PIPELINE_STAGES
+        }
+        self._stage_active = {stage: 0 for stage in PIPELINE_STAGES}
+
+        # Пачки, перенесенные на диск прошлым запуском, уже не нужны
+        self._storage.clear_spilled()
+
+        stages = (
+            (STAGE_VALIDATE, self._validate_stage, self.validate_concurrency),
+            (STAGE_PARSE, self._parse_stage, max(1, self.parse_workers)),
+            (STAGE_UPLOAD, self._upload_stage, self.upload_concurrency),
+            (STAGE_FINALIZE, self._finalize_stage, 1),
+        )
+        for stage, handler, concurrency in stages:
+            for _ in range(concurrency):
+                self._stage_tasks.add(
+                    asyncio.create_task(self._run_stage(stage, handler)))
+
+        self._stage_tasks.add(asyncio.create_task(self._log_backlog()))
+        if self._lease is not None:
+            self._stage_tasks.add(asyncio.create_task(self._lease.maintain()))
+
+    async def _drain_pipeline(self) -> None:
+        """Ожидает, пока все стадии обработают принятые в конвейер файлы."""
+
+        if self._schedule_tasks:
+            await asyncio.gather(*self._schedule_tasks, return_exceptions=True)
+
+        for stage in PIPELINE_STAGES:
+            await self._queues[stage].join()
+
+    def get_backlog(self) -> Dict[str, int]:
+        """
+        Возвращает глубину очереди конвейера:
+        кол-во файлов в обработке и кол-во ожидающих/обрабатываемых на каждой стадии.
+        """
+
+        backlog = {"in_flight": len(self._in_flight), "retrying": len(self._retrying)}
+        for stage in PIPELINE_STAGES:
+            queue = self._queues.get(stage)
+            backlog[f"{stage}_queued"] = queue.qsize() if queue is not None else 0
+            backlog[f"{stage}_active"] = self._stage_active.get(stage, 0)
+
+        return backlog
+
+    async def _log_backlog(self) -> None:
+        """Периодически логирует глубину очереди конвейера, пока она не пуста."""
+
+        while True:
+            await asyncio.sleep(BACKLOG_LOG_INTERVAL_SEC)
+            backlog = self.get_backlog()
+            if backlog["in_flight"]:
+                logger.info(f"xlsx ingest backlog: {backlog}")
 
+    def _get_watch_mode(self) -> str:
+        """Определяет способ обнаружения новых файлов с учетом доступности inotify."""
+
+        if self.watch_mode == WATCH_MODE_POLL:
+            return WATCH_MODE_POLL
+
+        if is_inotify_available():
+            return WATCH_MODE_INOTIFY
+
+        if self.watch_mode == WATCH_MODE_INOTIFY:
+            logger.warning("inotify is not available, falling back to directory polling")
+
+        return WATCH_MODE_POLL
+
+    async def _poll_dir(self, directory: pathlib.Path) -> None:
+        """Обнаружение новых `.xlsx` файлов периодическим сканированием директории."""
+
+        # Непрерывный цикл работы до стоп-сигнала
+        while self._work_flag.is_set():
             # Сбор накопившихся .xlsx файлы
-            for entity in directory.iterdir():
-                if entity.is_file() and entity.suffix.lower() == ".xlsx":
-                    xlsx_to_process.append(entity)
-
-            # Создание Task-ов на парсинг и загрузку собранных файлов
-            for file in xlsx_to_process:
-                p_task = asyncio.Task(self._process_xlsx_file(file))
-                p_task.add_done_callback(
-                    partial(self._any_task_done_clb, file))
-                self._active_tasks.add(p_task)
-
-            await asyncio.sleep(self.scan_dir_interval_sec)
-
-    def _any_task_done_clb(
-        self,
-        file: pathlib.Path,
-        task: asyncio.Task,
-    ) -> None:
-        """Вызывается по завершению работы каждого Task-а обработки файла."""
-
-        # Если Task был отменен до его завершения (например, в случае недоступности БД)
-        # Удаление Task-а из активных -> повторная попытка в след. итерации
-        if task.cancelled():
-            self._active_tasks.remove(task)
-            return
+            await self._schedule_files(list_xlsx_files(directory))
 
-        # В зависимости от результата выполнения Task-а:
-        exc = task.exception()
-        if exc:
-            # Непойманная/непредвиденная ошибка - перемещение файла в failed dir
-            # в т.ч. сюда попадет ошибка ValueError при неудачной попытке чтения .xlsx файла
-            logger.error(
-                f"Task for \"{file}\" failed - unhandled exception: \"{exc}\"")
-            task.add_done_callback(
-                partial(self._fail_data_upload_clb, file))
-        else:
-            # Удачное завершение Task-а - удаление файла
-            task.add_done_callback(
-                partial(self._success_data_upload_clb, file))
-        
-    def _success_data_upload_clb(
-        self,
-        file: pathlib.Path,
-        task: asyncio.Task,
-    ) -> None:
+            await self._sleep_while_working(self.scan_dir_interval_sec)
+
+    async def _watch_dir_events(self, directory: pathlib.Path) -> None:
         """
-        Вызывается при удачном завершении Task-a по загрузке файла в БД.
-        
-        Удаляет обработанный файл.
+        Обнаружение новых `.xlsx` файлов по событиям inotify: файл берется в обработку
+        после завершения записи (`IN_CLOSE_WRITE`) или перемещения в директорию (`IN_MOVED_TO`).
         """
 
+        watcher = InotifyWatcher(directory)
+        watcher.open()
+
+        loop = asyncio.get_running_loop()
+        events_ready = asyncio.Event()
+        loop.add_reader(watcher.fileno(), events_ready.set)
+
         try:
-            file.unlink()
-        except Exception as e:
-            logger.error(f"Error occured while deleting .xlsx file: {e}")
-
-        self._active_tasks.remove(task)
-        logger.info(f"Successfully processed \"{file}\"")
-
-    def _fail_data_upload_clb(
-        self,
-        file: pathlib.Path,
-        task: asyncio.Task,
-    ) -> None:
+            # Файлы, появившиеся до начала отслеживания событий
+            await self._schedule_files(list_xlsx_files(directory))
+
+            while self._work_flag.is_set():
+                try:
+                    await asyncio.wait_for(
+                        events_ready.wait(), timeout=STOP_CHECK_INTERVAL_SEC)
+                except asyncio.TimeoutError:
+                    continue
+                events_ready.clear()
+
+                events = watcher.read_events()
+                # При переполнении очереди событий часть из них потеряна
+                # (в т.ч. пока конвейер был заполнен и события не читались)
+                if any(event.mask & IN_Q_OVERFLOW for event in events):
+                    logger.warning("inotify event queue overflowed, rescanning directory")
+                    await self._schedule_files(list_xlsx_files(directory))
+                    continue
+
+                await self._schedule_files([
+                    directory / event.name for event in events
+                    if event.name.lower().endswith(".xlsx")
+                ])
+        finally:
+            loop.remove_reader(watcher.fileno())
+            watcher.close()
+
+    async def _schedule_files(self, files: Iterable[pathlib.Path]) -> None:
         """
-        Вызывается при неудачной попытке загрузки данных файла в БД.
-        
-        Переносит файл в директорию файлоф, которые вызвали непредусмотренную ошибку.
+        Передает файлы, которые еще не в обработке, в конвейер (стадия `validate`), ожидая места в очереди.
+        При `claim_files` файл захватывается, только когда в очереди есть место и действует аренда.
         """
 
-        if not self.failed_xlsx_dir.exists():
-            self.failed_xlsx_dir.mkdir()
+        for file in files:
+            if file in self._in_flight:
+                continue
 
-        # Перемещение файла в filed directory
-        try:
-            file.rename(self.failed_xlsx_dir / file.name)
-        except Exception as e:
-            logger.error(f"Error occured while moving .xlsx file: {e}")
-        
-        self._active_tasks.remove(task)
-        logger.error(
-            f"Failed to process \"{file}\","
-            f" moved to \"{self.failed_xlsx_dir.absolute()}\""
-        )
+            if self._claims is not None and not self._claims.owns(file):
+                if not await self._wait_for_queue_space(self._queues[STAGE_VALIDATE]):
+                    return
+                if not self._lease.is_held():
+                    continue
+                file = self._claims.claim(file)
+                if file is None:
+                    continue
+
+            try:
+                self._in_flight[file] = get_file_key(file)
+            except FileNotFoundError:
+                # Файл успел исчезнуть между обнаружением и постановкой в обработку
+                continue
 
-    async def _process_xlsx_file(self, file: pathlib.Path) -> None:
-        """Входня точка для обработки нового `.xlsx` файла."""
+            if not await self._put_while_working(self._queues[STAGE_VALIDATE], IngestJob(file)):
+                # Остановка обработчика - файл останется в директории до следующего запуска
+                self._in_flight.pop(file, None)
 
-        rows = self._get_xlsx_data_from_file(file)
-        # Создание репрезентаций записей содержимого .xslx файлов в БД
-        db_records = [
-            DeltaRecord(rep_dt=row.rep_dt, delta=row.delta) for row in rows]
+    async def _put_while_working(self, queue: asyncio.Queue, job: "IngestJob") -> bool:
+        """Ожидает места в очереди, прерываясь при стоп-сигнале."""
+
+        while self._work_flag.is_set():
+            try:
+                await asyncio.wait_for(queue.put(job), timeout=STOP_CHECK_INTERVAL_SEC)
+                return True
+            except asyncio.TimeoutError:
+                continue
+
+        return False
+
+    async def _wait_for_queue_space(self, queue: asyncio.Queue) -> bool:
+        """Ожидает, пока в очереди появится место, прерываясь при стоп-сигнале."""
+
+        while self._work_flag.is_set():
+            if not queue.full():
+                return True
+            await asyncio.sleep(QUEUE_CHECK_INTERVAL_SEC)
+
+        return False
+
+    async def _sleep_while_working(self, seconds: float) -> None:
+        """Ожидает `seconds` сек., прерываясь при стоп-сигнале."""
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + seconds
+        while self._work_flag.is_set() and loop.time() < deadline:
+            await asyncio.sleep(min(STOP_CHECK_INTERVAL_SEC, deadline - loop.time()))
+
+    def _reschedule_if_replaced(self, file: pathlib.Path) -> bool:
+        """
+        Снимает файл с обработки и, если за время обработки он был заменен
+        новой версией, ставит в обработку новую версию вместо удаления/перемещения.
+        """
+
+        processed_key = self._in_flight.pop(file, None)
         try:
-            await self._upload_xlsx_files_data(db_records)
-        except ConnectionRefusedError:
-            logger.error(
-                "Connection error occured while uploading .xlsx data,"
-                " cancelling task"
-            )
-            raise asyncio.CancelledError
+            replaced = get_file_key(file) != processed_key
+        except FileNotFoundError:
+            return False
+
+        if replaced:
+            logger.info(f"\"{file}\" was replaced while processing, scheduling new version")
+            self._schedule_later([file])
+
+        return replaced
 
-    def _get_xlsx_data_from_file(
-        self,
-        file: pathlib.Path,
-    ) -> Sequence[XlsxFileRow]:
+    def _schedule_later(self, files: List[pathlib.Path]) -> None:
         """
-        Извлекает данные из `.xlsx` файла и возвращает список записей.
-        
-        Ожидает, что `file` будет в `.xlsx` формате.
+        Передает файлы в конвейер отдельным Task-ом
+        (вызывающий не должен ждать места в очереди validate).
         """
-        
-        rows = []
-        data = parse_xlsx_as_data_frame(file)  # Может вызвать ValueError при неопределенном формате файла
-        for index, row in data.iterrows():
-            rows.append(XlsxFileRow(rep_dt=row["Rep_dt"], delta=row["Delta"]))
 
-        return rows
+        task = asyncio.create_task(self._schedule_files(files))
+        self._schedule_tasks.add(task)
+        task.add_done_callback(self._schedule_tasks.discard)
 
-    async def _upload_xlsx_files_data(self, deltas: List[DeltaRecord]) -> None:
-        """Загружает извлеченные записи в БД."""
+    async def _prepare_database(self) -> None:
+        """
+        Создает партиции `deltas` и материализует недостающие лаги, ожидая недоступную БД.
+        В режиме `replace` без уникального индекса `rep_dt` поднимает `RuntimeError`.
+        """
 
-        session = await get_database_session(self.db_engine)
-        await put_delta_data(session, delta_records=deltas)
+        attempt = 0
+
+        while True:
+            try:
+                await self._wait_for_database()
+            except ConnectionRefusedError:
+                return
+
+            try:
+                session = await get_database_session(self.db_engine)
+                month = datetime.date.today().replace(day=1)
+                partitions = await ensure_delta_partitions(
+                    session, month, add_months(month, self.partition_ahead_months))
+                rebuilt = await sync_delta_lags(session, self.lag_view_lags)
+
+                unique_rep_dt = (
+                    self.ingest_mode != INGEST_MODE_REPLACE or await has_unique_rep_dt(session))
+            except Exception as e:
+                if not is_connection_error(e):
+                    self._breaker.record_success()
+                    logger.error(f"Error occured while preparing database: {e}")
+                    return
+
+                self._breaker.record_failure()
+                attempt += 1
+                if not self._work_flag.is_set():
+                    return
+
+                delay = get_backoff_delay(
+                    attempt, self.retry_base_delay_sec, self.retry_max_delay_sec)
+                logger.warning(
+                    f"Connection error occured while preparing database: \"{e}\","
+                    f" retry #{attempt} in {delay:.1f} sec"
+                )
+                await self._sleep_while_working(delay)
+            else:
+                self._breaker.record_success()
+                if partitions:
+                    logger.info(f"Created partitions {partitions}")
+                if rebuilt:
+                    logger.info(f"Materialized lags {rebuilt}")
+                if not unique_rep_dt:
+                    raise RuntimeError(
+                        "Replace ingest mode requires unique rep_dt index,"
+                        " run \"python compact_deltas.py --unique\" first"
+                    )
+                return
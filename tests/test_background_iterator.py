@@ -0,0 +1,95 @@
+import asyncio
+import threading
+import time
+from typing import Iterator, List
+
+import numpy as np
+import pytest
+
+from db.crud.delta import _iter_chunks
+from models.db.entities import DeltaBatch
+from util.background import BackgroundIterator
+
+
+def slow_numbers(count: int, delay_sec: float, threads: List[int]) -> Iterator[int]:
+    for number in range(count):
+        threads.append(threading.get_ident())
+        time.sleep(delay_sec)
+        yield number
+
+
+def test_background_iterator_keeps_loop_responsive() -> None:
+    async def scenario():
+        threads, ticks = [], 0
+        numbers = []
+        iterator = BackgroundIterator(slow_numbers(5, 0.02, threads))
+
+        async def tick() -> None:
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.005)
+                ticks += 1
+
+        ticker = asyncio.create_task(tick())
+        async for number in iterator:
+            numbers.append(number)
+        ticker.cancel()
+
+        return numbers, threads, ticks
+
+    numbers, threads, ticks = asyncio.run(scenario())
+
+    assert numbers == [0, 1, 2, 3, 4]
+    assert threading.get_ident() not in threads
+    # Event loop не блокировался на время чтения (~0.1 сек.)
+    assert ticks >= 5
+
+
+def test_background_iterator_raises_iterator_error() -> None:
+    def failing() -> Iterator[int]:
+        yield 1
+        raise ValueError("bad row")
+
+    async def scenario():
+        numbers = []
+        async for number in BackgroundIterator(failing()):
+            numbers.append(number)
+        return numbers
+
+    with pytest.raises(ValueError, match="bad row"):
+        asyncio.run(scenario())
+
+
+def test_background_iterator_close_stops_reading() -> None:
+    closed = threading.Event()
+
+    def endless() -> Iterator[int]:
+        try:
+            number = 0
+            while True:
+                yield number
+                number += 1
+        finally:
+            closed.set()
+
+    async def scenario():
+        iterator = BackgroundIterator(endless(), maxsize=2)
+        first = await anext(iterator)
+        iterator.close()
+        return first, await anext(iterator, None)
+
+    assert asyncio.run(scenario()) == (0, None)
+    assert closed.wait(1)
+
+
+def test_chunks_of_async_batches() -> None:
+    batch = DeltaBatch(
+        rep_dt=np.datetime64("2020-01-01") + np.arange(5),
+        delta=np.arange(5, dtype=np.float64),
+    )
+
+    async def scenario():
+        iterator = BackgroundIterator(iter([batch, batch[:2]]))
+        return [len(chunk) async for chunk in _iter_chunks(iterator, chunk_size=2)]
+
+    assert asyncio.run(scenario()) == [2, 2, 1, 2]
@@ -0,0 +1,110 @@
+import asyncio
+import contextlib
+import pathlib
+from typing import Any, List, Tuple
+
+import pytest
+
+import ingest.claims
+from db.crud.leases import (
+    acquire_ingest_lease,
+    delete_ingest_lease,
+    lock_expired_ingest_lease,
+)
+from ingest.claims import IngestLease
+from util.claims import ClaimDirectory
+from util.retry import CircuitBreaker
+
+
+def make_file(path: pathlib.Path) -> pathlib.Path:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b"xlsx")
+    return path
+
+
+def test_claim_directory_takes_over_files(tmp_path: pathlib.Path) -> None:
+    worker, other = ClaimDirectory(tmp_path, "worker"), ClaimDirectory(tmp_path, "other")
+    first = other.claim(make_file(tmp_path / "first.xlsx"))
+    second = other.claim(make_file(tmp_path / "second.xlsx"))
+    # Файл с тем же именем еще обрабатывается этим обработчиком
+    worker.claim(make_file(tmp_path / "second.xlsx"))
+
+    taken = worker.take_over("other")
+
+    assert taken == [worker.path / "first.xlsx"]
+    assert not first.exists() and second.exists()
+    assert worker.list_other_workers() == ["other"]
+
+
+class FakeSession:
+    def begin(self) -> contextlib.AbstractAsyncContextManager:
+        return contextlib.nullcontext()
+
+
+def make_lease(
+    tmp_path: pathlib.Path,
+    monkeypatch: pytest.MonkeyPatch,
+    expired: bool,
+) -> Tuple[IngestLease, List[List[pathlib.Path]], List[str]]:
+    scheduled, deleted = [], []
+
+    async def get_session(engine: Any) -> FakeSession:
+        return FakeSession()
+
+    async def lock_expired(session: FakeSession, worker_id: str) -> bool:
+        return expired
+
+    async def delete_lease(session: FakeSession, worker_id: str) -> None:
+        deleted.append(worker_id)
+
+    monkeypatch.setattr(ingest.claims, "get_database_session", get_session)
+    monkeypatch.setattr(ingest.claims, "lock_expired_ingest_lease", lock_expired)
+    monkeypatch.setattr(ingest.claims, "delete_ingest_lease", delete_lease)
+
+    lease = IngestLease(
+        db_engine=None,
+        claims=ClaimDirectory(tmp_path, "worker"),
+        breaker=CircuitBreaker(failure_threshold=5, reset_timeout_sec=30),
+        schedule=scheduled.append,
+    )
+    return lease, scheduled, deleted
+
+
+@pytest.mark.parametrize("expired", [True, False])
+def test_lease_takes_over_only_expired_claims(
+    tmp_path: pathlib.Path,
+    monkeypatch: pytest.MonkeyPatch,
+    expired: bool,
+) -> None:
+    lease, scheduled, deleted = make_lease(tmp_path, monkeypatch, expired)
+    claimed = ClaimDirectory(tmp_path, "other").claim(make_file(tmp_path / "deltas.xlsx"))
+
+    asyncio.run(lease.take_over_expired())
+
+    if expired:
+        assert scheduled == [[lease.claims.path / "deltas.xlsx"]]
+        assert deleted == ["other"]
+        assert not claimed.exists()
+    else:
+        assert scheduled == [] and deleted == []
+        assert claimed.exists()
+
+
+def test_database_lease_expires(run_db) -> None:
+    async def scenario(db_session) -> List[bool]:
+        results = [
+            await acquire_ingest_lease(db_session, "other", "first", ttl_sec=0.2),
+            # Действующая аренда другого экземпляра
+            await acquire_ingest_lease(db_session, "other", "second", ttl_sec=0.2),
+        ]
+        async with db_session.begin():
+            results.append(await lock_expired_ingest_lease(db_session, "other"))
+
+        await asyncio.sleep(0.3)
+        async with db_session.begin():
+            results.append(await lock_expired_ingest_lease(db_session, "other"))
+            await delete_ingest_lease(db_session, "other")
+        results.append(await acquire_ingest_lease(db_session, "other", "second", ttl_sec=60))
+        return results
+
+    assert run_db(scenario) == [True, False, False, True, True]
@@ -0,0 +1,55 @@
+import uuid
+from typing import Any, List, Tuple
+
+from sqlalchemy.sql import text
+
+from db.crud.compaction import compact_deltas, has_unique_rep_dt, UNIQUE_REP_DT_INDEX_NAME
+from db.crud.delta import get_all_delta_rows, put_delta_batches
+from db.crud.delta_lags import DEFAULT_LAG_VIEW_LAGS
+from util.ids import ids_to_uuids
+
+
+def test_database_compaction_keeps_last_loaded_record(run_db, make_batch) -> None:
+    first = make_batch([0, 1], [1.0, 2.0])
+    second = make_batch([1, 2], [20.0, 30.0])
+
+    async def scenario(db_session) -> Tuple[bool, int, List[Any], bool]:
+        # Дубликаты `rep_dt`, накопленные в режиме `append`
+        try:
+            had_index = await has_unique_rep_dt(db_session)
+            await put_delta_batches(db_session, batches=[first])
+            await put_delta_batches(db_session, batches=[second])
+            async with db_session.begin():
+                # Запись со старым случайным id (UUIDv4) считается загруженной раньше
+                await db_session.execute(
+                    text("INSERT INTO deltas (id, rep_dt, delta) VALUES (:id, :rep_dt, :delta)"),
+                    {"id": uuid.uuid4(), "rep_dt": first.rep_dt[0].item(), "delta": 0.0},
+                )
+
+            removed = await compact_deltas(db_session, lags=DEFAULT_LAG_VIEW_LAGS, unique=True)
+            rows = await get_all_delta_rows(db_session)
+            has_index = await has_unique_rep_dt(db_session)
+        finally:
+            async with db_session.begin():
+                await db_session.execute(text(f"DROP INDEX IF EXISTS {UNIQUE_REP_DT_INDEX_NAME}"))
+
+        return had_index, removed, rows, has_index
+
+    had_index, removed, rows, has_index = run_db(scenario)
+
+    assert not had_index and has_index
+    assert removed == 2
+    assert [(row.rep_dt, row.delta) for row in rows] == [
+        (first.rep_dt[0].item(), 1.0),
+        (second.rep_dt[0].item(), 20.0),
+        (second.rep_dt[1].item(), 30.0),
+    ]
+    assert rows[1].id == ids_to_uuids(second.id)[0]
+
+
+def test_database_compaction_without_duplicates(run_db, make_batch) -> None:
+    async def scenario(db_session) -> int:
+        await put_delta_batches(db_session, batches=[make_batch([0, 1], [1.0, 2.0])])
+        return await compact_deltas(db_session, lags=DEFAULT_LAG_VIEW_LAGS)
+
+    assert run_db(scenario) == 0
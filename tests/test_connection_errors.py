@@ -0,0 +1,55 @@
+import asyncio
+import pathlib
+
+import asyncpg
+from sqlalchemy.exc import DBAPIError, IntegrityError, OperationalError
+
+from app import create_xlsx_file_handler
+from db.events import is_connection_error
+from settings.settings import Settings
+from ingest.jobs import IngestJob
+
+
+class DriverError(Exception):
+    """Ошибка драйвера с SQLSTATE (как у адаптера asyncpg в SQLAlchemy)."""
+
+    def __init__(self, sqlstate: str) -> None:
+        super().__init__(sqlstate)
+        self.sqlstate = sqlstate
+
+
+def test_connection_errors_are_retryable() -> None:
+    assert is_connection_error(ConnectionResetError())
+    assert is_connection_error(
+        DBAPIError("SELECT 1", None, DriverError("XX000"), connection_invalidated=True))
+    assert is_connection_error(OperationalError("SELECT 1", None, DriverError("08006")))
+
+    # `CannotConnectNowError` asyncpg - причина ошибки адаптера
+    orig = DriverError(None)
+    orig.__cause__ = asyncpg.CannotConnectNowError("the database system is starting up")
+    assert is_connection_error(OperationalError("SELECT 1", None, orig))
+
+
+def test_query_errors_are_not_retryable() -> None:
+    assert not is_connection_error(ValueError("bad row"))
+    assert not is_connection_error(IntegrityError("INSERT", None, DriverError("23505")))
+
+
+def test_handler_retries_invalidated_connection(settings: Settings) -> None:
+    settings.APP.XLSX_RETRY_BASE_DELAY_SEC = 0.01
+    settings.APP.XLSX_STAGING_MAX_MB = 0
+    handler = create_xlsx_file_handler(settings)
+    handler._work_flag.set()
+
+    calls = 0
+
+    async def call() -> int:
+        nonlocal calls
+        calls += 1
+        if calls < 3:
+            raise DBAPIError("SELECT 1", None, DriverError("57P03"))
+        return calls
+
+    job = IngestJob(file=pathlib.Path("deltas.xlsx"))
+    assert asyncio.run(handler._call_database(job, call)) == 3
+    assert not handler._breaker.is_open()
@@ -0,0 +1,121 @@
+from typing import Any, Dict, List, Tuple
+
+from sqlalchemy.dialects import postgresql
+
+from app import create_app
+from db.crud.delta import _build_delta_lag_query, get_delta_data, put_delta_batches
+from models.db.entities import DeltaCursor
+from settings.settings import Settings
+from util.series_index import DeltaSeriesIndex
+
+
+# По две записи на дату - страницы делят записи одной даты
+PAGED_DAYS = [0, 0, 1, 1, 2, 2]
+
+
+def read_pages(settings: Settings, target: str) -> Tuple[List[float], List[Any], int]:
+    """Читает `target` постранично по `next_after`, возвращает `Delta`, `DeltaLag` и кол-во страниц."""
+
+    client = create_app(settings).test_client()
+    delta, delta_lag, pages, after = [], [], 0, None
+    while True:
+        response = client.get(target + (f"&after={after}" if after is not None else ""))
+        assert response.status_code == 200
+        body: Dict[str, Any] = response.get_json()
+        pages += 1
+
+        records = body["records"]
+        delta += [records["Delta"][str(i)] for i in range(len(records["Delta"]))]
+        delta_lag += [records["DeltaLag"][str(i)] for i in range(len(records["DeltaLag"]))]
+
+        after = body["next_after"]
+        if after is None:
+            return delta, delta_lag, pages
+
+
+def test_index_pages_cover_duplicate_dates(make_batch) -> None:
+    index = DeltaSeriesIndex()
+    index.replace([make_batch(PAGED_DAYS)])
+
+    delta, after = [], None
+    while True:
+        rep_dt_page, delta_page, _, ids = index.get_delta_columns(
+            after=after, limit=2, with_id=True)
+        delta += delta_page
+        if len(rep_dt_page) < 2:
+            break
+        after = DeltaCursor.parse(str(DeltaCursor(rep_dt=rep_dt_page[-1], id=ids[-1])))
+
+    assert delta == [0.0, 1.0, 2.0, 3.0, 4.0, 5.0]
+
+
+def test_index_date_cursor_skips_whole_date(make_batch) -> None:
+    batch = make_batch(PAGED_DAYS)
+    index = DeltaSeriesIndex()
+    index.replace([batch])
+
+    rep_dt, delta, _ = index.get_delta_columns(
+        after=DeltaCursor(rep_dt=batch.rep_dt[0].item(), id=None))
+
+    assert delta == [2.0, 3.0, 4.0, 5.0]
+    assert rep_dt[0] == batch.rep_dt[2].item()
+
+
+def test_index_orders_dates_by_id(make_batch) -> None:
+    first, second = make_batch(PAGED_DAYS), make_batch(PAGED_DAYS)
+    index = DeltaSeriesIndex()
+    index.replace([second, first])
+    index.add([make_batch([0, 1])])
+
+    rep_dt, _, _, ids = index.get_delta_columns(with_id=True)
+
+    assert [(value, id_.bytes) for value, id_ in zip(rep_dt, ids)] == sorted(
+        (value, id_.bytes) for value, id_ in zip(rep_dt, ids))
+
+
+def test_delta_endpoint_pages_cover_duplicate_dates(settings: Settings, make_batch) -> None:
+    settings.APP.DELTA_INDEX_ENABLED = True
+    settings.APP.RESPONSE_CACHE_ENABLED = False
+    create_app(settings)
+    settings.APP.DELTA_INDEX.replace([make_batch(PAGED_DAYS)])
+
+    for stream in ("false", "true"):
+        delta, delta_lag, pages = read_pages(settings, f"/delta?lag=1&limit=2&stream={stream}")
+
+        assert delta == [0.0, 1.0, 2.0, 3.0, 4.0, 5.0]
+        # `DeltaLag` считается по всему ряду, а не по странице
+        assert delta_lag == [1.0, 2.0, 3.0, 4.0, 5.0, ""]
+        assert pages == 4
+
+
+def test_delta_lag_query_orders_by_rep_dt_and_id() -> None:
+    after = DeltaCursor.parse("2020-01-01_0189f7a0-0000-7000-8000-000000000000")
+    query = str(_build_delta_lag_query(
+        lag=1, after=after, limit=2, date_from=None, date_to=None, with_id=True,
+    ).compile(dialect=postgresql.dialect()))
+
+    assert "ORDER BY deltas.rep_dt, deltas.id" in query
+    assert "(deltas.rep_dt, deltas.id) >" in query
+    assert "ORDER BY w.rep_dt ASC, w.id ASC" in query
+
+
+def test_database_pages_match_index(run_db, make_batch) -> None:
+    batch = make_batch(PAGED_DAYS)
+    index = DeltaSeriesIndex()
+    index.replace([batch])
+
+    async def scenario(db_session) -> List[Any]:
+        await put_delta_batches(db_session, batches=[batch])
+
+        records, after = [], None
+        while True:
+            page = await get_delta_data(db_session, lag=1, after=after, limit=2)
+            records += page
+            if len(page) < 2:
+                return records
+            after = DeltaCursor(rep_dt=page[-1].rep_dt, id=page[-1].id)
+
+    records = run_db(scenario)
+
+    assert [(rec.rep_dt, rec.delta, rec.delta_lag, rec.id) for rec in records] == [
+        (rec.rep_dt, rec.delta, rec.delta_lag, rec.id) for rec in index.get_delta_data(lag=1)]
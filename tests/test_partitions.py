@@ -0,0 +1,50 @@
+import datetime
+from typing import Any, List, Tuple
+
+from sqlalchemy.sql import text
+
+from db.crud.delta import get_all_delta_rows, put_delta_batches
+from db.crud.partitions import DEFAULT_PARTITION_NAME, ensure_delta_partitions, get_partition_name
+from models.db.entities import DeltaBatch
+
+
+# Месяц до записей тестовой БД - его записи попадают в партицию по умолчанию
+MONTH = datetime.date(1990, 1, 1)
+
+
+def test_database_partition_takes_records_from_default(run_db) -> None:
+    batch = DeltaBatch(
+        rep_dt=[MONTH, MONTH + datetime.timedelta(days=30), MONTH + datetime.timedelta(days=31)],
+        delta=[1.0, 2.0, 3.0],
+    )
+    name = get_partition_name(MONTH)
+
+    async def count_rows(db_session, table: str) -> int:
+        return await db_session.scalar(text(f"SELECT count(*) FROM ONLY {table}"))
+
+    async def scenario(db_session) -> Tuple[List[str], List[int], List[Any]]:
+        async with db_session.begin():
+            await db_session.execute(text(f"DROP TABLE IF EXISTS {name}"))
+            await db_session.execute(
+                text(f"DROP TABLE IF EXISTS {get_partition_name(batch.rep_dt[-1].item())}"))
+        try:
+            await put_delta_batches(db_session, batches=[batch])
+            created = await ensure_delta_partitions(db_session, MONTH, MONTH)
+            async with db_session.begin():
+                counts = [
+                    await count_rows(db_session, name),
+                    await count_rows(db_session, DEFAULT_PARTITION_NAME),
+                ]
+            rows = await get_all_delta_rows(db_session)
+        finally:
+            async with db_session.begin():
+                await db_session.execute(text(f"DROP TABLE IF EXISTS {name}"))
+
+        return created, counts, rows
+
+    created, counts, rows = run_db(scenario)
+
+    assert created == [name]
+    # Записи следующего месяца остаются в партиции по умолчанию
+    assert counts == [2, 1]
+    assert [row.delta for row in rows] == [1.0, 2.0, 3.0]
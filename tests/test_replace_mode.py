@@ -0,0 +1,98 @@
+import datetime
+import uuid
+from typing import Any, List, Tuple
+
+import pytest
+
+from db.crud.delta import (
+    get_all_delta_rows,
+    put_delta_batches,
+    COMMIT_MODE_CHUNKED,
+    COMMIT_MODE_SINGLE,
+    COMMIT_MODE_STAGED,
+    INGEST_MODE_REPLACE,
+    LOAD_STRATEGY_COPY,
+    LOAD_STRATEGY_INSERT,
+)
+from models.db.entities import DeltaBatch, IngestedFileRecord
+from util.ids import ids_to_uuids
+from util.series_index import DeltaSeriesIndex
+
+
+def get_rows(batch: DeltaBatch) -> List[Tuple[datetime.date, float, uuid.UUID]]:
+    return list(zip(batch.rep_dt.tolist(), batch.delta.tolist(), ids_to_uuids(batch.id)))
+
+
+def test_drop_duplicates_keeps_last_record_of_date(make_batch) -> None:
+    batch = make_batch([0, 1, 0, 2, 1], [1.0, 2.0, 3.0, 4.0, 5.0])
+
+    deduplicated = batch.drop_duplicates()
+
+    assert get_rows(deduplicated) == [get_rows(batch)[i] for i in (2, 3, 4)]
+
+
+def test_index_add_replaces_dates(make_batch) -> None:
+    index = DeltaSeriesIndex()
+    index.replace([make_batch([0, 1, 2], [1.0, 2.0, 3.0])])
+    # Из записей одной даты остается последняя
+    new = make_batch([1, 3, 1], [20.0, 40.0, 21.0])
+
+    index.add([new], replace_dates=True)
+
+    rep_dt, delta, _, ids = index.get_delta_columns(with_id=True)
+    assert delta == [1.0, 21.0, 3.0, 40.0]
+    assert rep_dt[1] == new.rep_dt[2].item()
+    assert ids[1] == ids_to_uuids(new.id)[2]
+
+
+@pytest.mark.parametrize(("strategy", "commit_mode"), [
+    (LOAD_STRATEGY_INSERT, COMMIT_MODE_SINGLE),
+    (LOAD_STRATEGY_COPY, COMMIT_MODE_SINGLE),
+    (LOAD_STRATEGY_INSERT, COMMIT_MODE_CHUNKED),
+    (LOAD_STRATEGY_COPY, COMMIT_MODE_STAGED),
+])
+def test_database_replace_mode_upserts_dates(
+    unique_rep_dt,
+    make_batch,
+    strategy: str,
+    commit_mode: str,
+) -> None:
+    first = make_batch([0, 1, 2], [1.0, 2.0, 3.0])
+    second = make_batch([1, 3, 1], [20.0, 40.0, 21.0])
+
+    async def scenario(db_session) -> List[Any]:
+        for num, batch in enumerate((first, second)):
+            await put_delta_batches(
+                db_session,
+                batches=[batch],
+                strategy=strategy,
+                chunk_size=2,
+                commit_mode=commit_mode,
+                ingested_file=IngestedFileRecord(
+                    sha256=f"{num:064x}", file_name=f"{num}.xlsx", rows=None),
+                ingest_mode=INGEST_MODE_REPLACE,
+            )
+        return await get_all_delta_rows(db_session)
+
+    rows = unique_rep_dt(scenario)
+
+    index = DeltaSeriesIndex()
+    index.replace([first])
+    index.add([second], replace_dates=True)
+    rep_dt, delta, _, ids = index.get_delta_columns(with_id=True)
+
+    assert [(row.rep_dt, row.delta, row.id) for row in rows] == list(zip(rep_dt, delta, ids))
+    assert [row.delta for row in rows] == [1.0, 21.0, 3.0, 40.0]
+
+
+def test_database_append_mode_keeps_loaded_dates(run_db, make_batch) -> None:
+    async def scenario(db_session) -> List[Any]:
+        # Повторяющиеся даты и в файле, и среди загруженных записей
+        await put_delta_batches(db_session, batches=[make_batch([0, 1, 1], [1.0, 2.0, 3.0])])
+        await put_delta_batches(db_session, batches=[make_batch([1, 2], [20.0, 30.0])])
+        return await get_all_delta_rows(db_session)
+
+    rows = run_db(scenario)
+
+    assert [row.delta for row in rows] == [1.0, 2.0, 3.0, 20.0, 30.0]
+    assert all(isinstance(row.id, uuid.UUID) for row in rows)
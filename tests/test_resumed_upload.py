@@ -0,0 +1,81 @@
+import pathlib
+from typing import Any, AsyncIterator, List, Tuple, Union
+
+import pytest
+
+from app import create_xlsx_file_handler
+from db.crud.delta import COMMIT_MODE_CHUNKED, get_all_delta_rows, put_delta_batches
+from ingest.jobs import IngestJob
+from models.db.entities import DeltaBatch, IngestedFileRecord
+from settings.settings import Settings
+from util.series_index import DeltaSeriesIndex
+
+
+DAYS = [0, 1, 2, 3]
+DELTAS = [1.0, 2.0, 3.0, 4.0]
+FILE_HASH = "0" * 64
+
+
+def test_database_resumed_upload_reloads_index(
+    run_db,
+    make_batch,
+    settings: Settings,
+    tmp_path: pathlib.Path,
+) -> None:
+    settings.DB.LOAD_COMMIT_MODE = COMMIT_MODE_CHUNKED
+    settings.DB.LOAD_CHUNK_SIZE = 2
+    handler = create_xlsx_file_handler(settings)
+    handler._work_flag.set()
+
+    index = DeltaSeriesIndex()
+    index.replace([])
+    applied: List[Union[List[DeltaBatch], None]] = []
+
+    def on_ingest(batches: Union[List[DeltaBatch], None]) -> None:
+        applied.append(batches)
+        if batches is None:
+            index.invalidate()
+        else:
+            index.add(batches)
+
+    handler.on_ingest = on_ingest
+
+    async def interrupted() -> AsyncIterator[DeltaBatch]:
+        yield make_batch(DAYS[:2], DELTAS[:2])
+        raise RuntimeError("Upload is interrupted")
+
+    async def scenario(db_session) -> List[Any]:
+        try:
+            with pytest.raises(RuntimeError):
+                await put_delta_batches(
+                    db_session,
+                    batches=interrupted(),
+                    chunk_size=2,
+                    commit_mode=COMMIT_MODE_CHUNKED,
+                    ingested_file=IngestedFileRecord(
+                        sha256=FILE_HASH, file_name="deltas.xlsx", rows=None),
+                )
+
+            # Повторный парсинг файла дает новые id уже закоммиченным строкам
+            job = IngestJob(
+                file=tmp_path / "deltas.xlsx",
+                file_hash=FILE_HASH,
+                parsed=[make_batch(DAYS, DELTAS)],
+            )
+            await handler._upload_stage(job)
+        finally:
+            await handler.db_engine.dispose()
+
+        return await get_all_delta_rows(db_session)
+
+    rows = run_db(scenario)
+
+    assert applied == [None]
+    if not index.is_loaded:
+        # Перезагрузка индекса из БД (`db.delta_index.DeltaIndexLoader`)
+        index.replace([DeltaBatch.from_id_rows(rows)])
+
+    rep_dt, delta, _, ids = index.get_delta_columns(with_id=True)
+    expected: List[Tuple[Any, float, Any]] = [(row.rep_dt, row.delta, row.id) for row in rows]
+    assert list(zip(rep_dt, delta, ids)) == expected
+    assert delta == DELTAS
@@ -0,0 +1,93 @@
+import os
+import pathlib
+
+import numpy as np
+
+from models.db.entities import DeltaBatch
+from util.spill import SpillStore
+
+
+def make_batches(count: int, rows: int = 1000) -> list:
+    return [
+        DeltaBatch(
+            rep_dt=np.datetime64("2000-01-01") + np.arange(rows) + num * rows,
+            delta=np.full(rows, float(num)),
+        )
+        for num in range(count)
+    ]
+
+
+def as_tuples(batches: list) -> list:
+    return [
+        (batch.rep_dt.tolist(), batch.delta.tolist(), batch.id.tobytes())
+        for batch in batches
+    ]
+
+
+def test_spill_store_round_trip_with_append(tmp_path: pathlib.Path) -> None:
+    store = SpillStore(directory=tmp_path)
+    batches = make_batches(3)
+
+    saved = store.save("job", batches[:2])
+    saved += store.save("job", batches[2:], start=2)
+
+    assert as_tuples(saved) == as_tuples(batches)
+    assert as_tuples(store.load("job")) == as_tuples(batches)
+    # Отображены с диска, а не скопированы в память
+    assert not store.load("job")[0].delta.flags.owndata
+
+
+def test_spill_store_ignores_incomplete_entry(tmp_path: pathlib.Path) -> None:
+    store = SpillStore(directory=tmp_path)
+    store.save("job", make_batches(2))
+
+    # Пачки без признака полностью записанных пачек не читаются
+    (tmp_path / "job.batches.npy").unlink()
+
+    assert store.load("job") is None
+
+
+def test_spill_store_resave_replaces_entry(tmp_path: pathlib.Path) -> None:
+    store = SpillStore(directory=tmp_path)
+    store.save("job", make_batches(3))
+    batches = make_batches(1)
+
+    store.save("job", batches)
+
+    assert as_tuples(store.load("job")) == as_tuples(batches)
+
+
+def test_spill_store_evicts_least_recently_used(tmp_path: pathlib.Path) -> None:
+    # Пачки ~0.3 Мб, в хранилище помещаются две
+    store = SpillStore(directory=tmp_path, max_entry_mb=1, max_total_mb=1)
+    batches = make_batches(1, rows=16000)
+
+    store.save("first", batches)
+    store.save("second", batches)
+    os.utime(tmp_path / "second.batches.npy", (0, 0))
+    store.load("first")
+    store.save("third", batches)
+
+    assert store.load("second") is None
+    assert store.load("first") is not None
+    assert store.load("third") is not None
+    assert store.get_size() <= 1024 * 1024
+
+
+def test_spill_store_skips_entry_over_limit(tmp_path: pathlib.Path) -> None:
+    store = SpillStore(directory=tmp_path, max_entry_mb=1, max_total_mb=10)
+
+    assert store.save("job", make_batches(1, rows=64000)) is None
+    assert store.save("job", []) is None
+    assert store.get_size() == 0
+
+
+def test_spill_store_remove_all(tmp_path: pathlib.Path) -> None:
+    store = SpillStore(directory=tmp_path)
+    store.save("first", make_batches(1))
+    store.save("second", make_batches(1))
+
+    store.remove()
+
+    assert store.get_size() == 0
+    assert store.load("first") is None
@@ -0,0 +1,42 @@
+import pytest
+
+from app import create_app
+from settings.settings import Settings
+
+
+@pytest.fixture
+def client(settings: Settings, make_batch):
+    settings.APP.DELTA_INDEX_ENABLED = True
+    settings.APP.RESPONSE_CACHE_ENABLED = False
+    app = create_app(settings)
+    settings.APP.DELTA_INDEX.replace([make_batch([0, 0, 1, 1, 2, 2])])
+
+    return app.test_client()
+
+
+@pytest.mark.parametrize("query", [
+    "lag=1",
+    "lag=2&limit=2",
+    "lag=1&limit=4",
+    # Последняя неполная страница (`next_after` - `null`)
+    "lag=1&limit=4&after=2020-01-02",
+    # Фильтр отсекает первую дату записей
+    "lag=1&from=2020-01-02",
+])
+def test_streamed_json_matches_buffered(client, query: str) -> None:
+    buffered = client.get(f"/delta?{query}&stream=false")
+    streamed = client.get(f"/delta?{query}&stream=true")
+
+    assert buffered.status_code == streamed.status_code == 200
+    assert streamed.data == buffered.data
+    assert streamed.mimetype == buffered.mimetype
+
+
+def test_date_filter_cuts_streamed_records(client) -> None:
+    unfiltered = client.get("/delta?lag=1&stream=true")
+    filtered = client.get("/delta?lag=1&from=2020-01-02&stream=true")
+
+    assert unfiltered.status_code == filtered.status_code == 200
+    assert 0 < len(filtered.get_json()["records"]["Delta"]) < len(
+        unfiltered.get_json()["records"]["Delta"])
+    assert len(filtered.data) < len(unfiltered.data)